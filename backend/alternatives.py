@@ -0,0 +1,236 @@
+"""
+Generic alternatives graph for the Drug Pricing Transparency API
+
+Groups every cached drug by its generic name: products sharing a generic
+are alternatives to each other, and the generic itself is a member of its
+own group. Each member carries the mean cost of its cached pricing grids,
+and a group's members are kept sorted cheapest first, so a lookup is a
+dict hit plus the first few entries of one list, and savings are
+computed from real cached prices instead of being made up per request.
+
+The graph is persisted in the drug_alternatives table (one row per name
+that resolves to a member) and loaded into memory at startup. Groups are
+refreshed incrementally when a drug is cached or priced.
+"""
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from name_index import normalize_name
+
+QUERY_CHUNK = 500  # names per IN (...) query
+
+# Member: (name, mean cost or None)
+Member = Tuple[str, Optional[float]]
+
+
+def estimated_savings(drug_cost: Optional[float], alternative_cost: Optional[float]) -> Optional[float]:
+    """Percentage saved by switching, or None if either drug was never priced or it saves nothing"""
+    if not drug_cost or alternative_cost is None:
+        return None
+    savings = round((drug_cost - alternative_cost) / drug_cost * 100, 1)
+    return savings if savings > 0 else None
+
+
+def mean_costs(conn: sqlite3.Connection, names: Iterable[str]) -> Dict[str, float]:
+    """Mean cached cost per normalized drug name, matching names case-insensitively"""
+    names = list({normalize_name(n) for n in names if n})
+    totals: Dict[str, List[float]] = {}
+    for i in range(0, len(names), QUERY_CHUNK):
+        chunk = names[i:i + QUERY_CHUNK]
+        marks = ', '.join('?' * len(chunk))
+        cursor = conn.execute(f'''
+            SELECT drug_name, SUM(mean_cost * cells), SUM(cells) FROM pricing_cache
+            WHERE drug_name COLLATE NOCASE IN ({marks}) AND mean_cost IS NOT NULL
+            GROUP BY drug_name
+        ''', chunk)
+        for drug_name, total, count in cursor:
+            entry = totals.setdefault(normalize_name(drug_name), [0.0, 0])
+            entry[0] += total
+            entry[1] += count
+    return {name: total / count for name, (total, count) in totals.items() if count}
+
+
+def _sort_key(member: Member):
+    name, cost = member
+    return (cost is None, cost or 0.0, name)
+
+
+class AlternativesGraph:
+    """Drugs grouped by generic name, with members ranked by cached cost"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._member_of: Dict[str, Tuple[str, str]] = {}   # name key -> (generic key, member)
+        self._group_names: Dict[str, List[str]] = {}       # generic key -> name keys
+        self._groups: Dict[str, List[Member]] = {}         # generic key -> members, cheapest first
+
+    def __len__(self) -> int:
+        return len(self._member_of)
+
+    def __contains__(self, drug_name: str) -> bool:
+        return normalize_name(drug_name) in self._member_of
+
+    def lookup(self, drug_name: str, limit: int = 3) -> Optional[List[Dict]]:
+        """Return up to ``limit`` cheapest alternatives, or None for an unknown drug"""
+        with self._lock:
+            entry = self._member_of.get(normalize_name(drug_name))
+            if entry is None:
+                return None
+            generic_key, member = entry
+            group = self._groups.get(generic_key, [])
+            drug_cost = next((cost for name, cost in group if name == member), None)
+
+            alternatives = []
+            for name, cost in group:
+                if name == member:
+                    continue
+                alternatives.append({
+                    'name': name,
+                    'estimated_savings': estimated_savings(drug_cost, cost),
+                    'availability': 'Available'
+                })
+                if len(alternatives) == limit:
+                    break
+            return alternatives
+
+    def load(self, conn: sqlite3.Connection):
+        """Load the persisted graph into memory"""
+        records = conn.execute(
+            'SELECT name_key, generic_key, member, mean_cost FROM drug_alternatives').fetchall()
+        self._apply(records, replace_all=True)
+
+    def reload(self, conn: sqlite3.Connection, drug_names: Iterable[str]):
+        """Reload the persisted groups containing ``drug_names``, as another process left them"""
+        keys = list({normalize_name(n) for n in drug_names if n})
+        records = []
+        for i in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[i:i + QUERY_CHUNK]
+            records.extend(conn.execute(f'''
+                SELECT name_key, generic_key, member, mean_cost FROM drug_alternatives
+                WHERE generic_key IN (
+                    SELECT generic_key FROM drug_alternatives
+                    WHERE name_key IN ({', '.join('?' * len(chunk))})
+                )
+            ''', chunk))
+        self._apply(records, replace_all=False)
+
+    def rebuild(self, conn: sqlite3.Connection, generic_names: Optional[Iterable[str]] = None) -> int:
+        """Recompute groups from the drugs table, all of them or just ``generic_names``
+
+        Returns the number of names written. Commits on ``conn``.
+        """
+        if generic_names is None:
+            rows = conn.execute('SELECT name, generic_name, brand_name FROM drugs').fetchall()
+        else:
+            generic_names = list({g for g in generic_names if g})
+            rows = []
+            for i in range(0, len(generic_names), QUERY_CHUNK):
+                chunk = generic_names[i:i + QUERY_CHUNK]
+                marks = ', '.join('?' * len(chunk))
+                rows.extend(conn.execute(f'''
+                    SELECT name, generic_name, brand_name FROM drugs
+                    WHERE generic_name COLLATE NOCASE IN ({marks})
+                ''', chunk))
+
+        # generic key -> {name key: member}
+        groups: Dict[str, Dict[str, str]] = {}
+        for name, generic_name, brand_name in rows:
+            generic_key = normalize_name(generic_name)
+            if not generic_key or not normalize_name(name):
+                continue
+            names = groups.setdefault(generic_key, {})
+            names.setdefault(generic_key, generic_name.strip())
+            member = names.setdefault(normalize_name(name), name.strip())
+            for brand in (brand_name or '').split(','):
+                # A brand name resolves to the product it was cached under
+                names.setdefault(normalize_name(brand), member)
+            names.pop('', None)
+
+        costs = mean_costs(conn, (key for names in groups.values() for key in names))
+
+        records = []
+        for generic_key, names in groups.items():
+            member_costs: Dict[str, List[float]] = {}
+            for name_key, member in names.items():
+                if name_key in costs:
+                    member_costs.setdefault(member, []).append(costs[name_key])
+            for name_key, member in names.items():
+                mean_cost = member_costs.get(member)
+                records.append((name_key, generic_key, member,
+                                sum(mean_cost) / len(mean_cost) if mean_cost else None))
+
+        if generic_names is None:
+            conn.execute('DELETE FROM drug_alternatives')
+        else:
+            keys = list(groups) or [normalize_name(g) for g in generic_names]
+            for i in range(0, len(keys), QUERY_CHUNK):
+                chunk = keys[i:i + QUERY_CHUNK]
+                conn.execute(f'''
+                    DELETE FROM drug_alternatives WHERE generic_key IN ({', '.join('?' * len(chunk))})
+                ''', chunk)
+        conn.executemany('''
+            INSERT OR REPLACE INTO drug_alternatives (name_key, generic_key, member, mean_cost)
+            VALUES (?, ?, ?, ?)
+        ''', records)
+        conn.commit()
+
+        self._apply(records, replace_all=generic_names is None)
+        return len(records)
+
+    def refresh_costs(self, conn: sqlite3.Connection, drug_names: Iterable[str]) -> int:
+        """Recompute member costs after ``drug_names`` were priced; commits on ``conn``"""
+        with self._lock:
+            touched = {self._member_of[key] for key in map(normalize_name, drug_names)
+                       if key in self._member_of}
+            if not touched:
+                return 0
+            # Every name resolving to a touched member contributes to its cost
+            aliases: Dict[Tuple[str, str], List[str]] = {}
+            for generic_key, member in touched:
+                aliases[(generic_key, member)] = [
+                    key for key in self._group_names.get(generic_key, [])
+                    if self._member_of.get(key) == (generic_key, member)]
+
+        costs = mean_costs(conn, (key for keys in aliases.values() for key in keys))
+        updates = []
+        for (generic_key, member), keys in aliases.items():
+            found = [costs[key] for key in keys if key in costs]
+            updates.append((sum(found) / len(found) if found else None, generic_key, member))
+
+        conn.executemany('''
+            UPDATE drug_alternatives SET mean_cost = ? WHERE generic_key = ? AND member = ?
+        ''', updates)
+        conn.commit()
+
+        with self._lock:
+            for mean_cost, generic_key, member in updates:
+                group = [(name, mean_cost if name == member else cost)
+                         for name, cost in self._groups.get(generic_key, [])]
+                self._groups[generic_key] = sorted(group, key=_sort_key)
+        return len(updates)
+
+    def _apply(self, records: List[Tuple], replace_all: bool):
+        costs: Dict[str, Dict[str, Optional[float]]] = {}
+        group_names: Dict[str, List[str]] = {}
+        member_of = {}
+        for name_key, generic_key, member, mean_cost in records:
+            member_of[name_key] = (generic_key, member)
+            group_names.setdefault(generic_key, []).append(name_key)
+            costs.setdefault(generic_key, {})[member] = mean_cost
+
+        with self._lock:
+            if replace_all:
+                self._member_of = {}
+                self._group_names = {}
+                self._groups = {}
+            else:
+                for generic_key in costs:
+                    for name_key in self._group_names.get(generic_key, []):
+                        if self._member_of.get(name_key, (None,))[0] == generic_key:
+                            del self._member_of[name_key]
+            self._member_of.update(member_of)
+            self._group_names.update(group_names)
+            for generic_key, members in costs.items():
+                self._groups[generic_key] = sorted(members.items(), key=_sort_key)
@@ -1,247 +1,956 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
+import math
 import os
 from dotenv import load_dotenv
-from typing import Dict, List, Optional
-import json
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import sqlite3
-import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import product
+
+from alternatives import AlternativesGraph, estimated_savings, mean_costs
+from cache_backends import (ALTERNATIVES, DRUG_FIELDS, DRUGS, PRICING, SQLiteCacheBackend,
+                            create_backend)
+from cache_warmer import PricingRefresher
+from db import ConnectionPool
+from export import FORMATS as EXPORT_FORMATS, export_chunks, parquet_available
+from invalidation import InvalidationLog, pricing_key
+from label_ingest import drug_record
+from memory_cache import MISSING, TTLCache
+from metrics import CACHE_LOOKUPS, ERRORS, RATE_LIMITED, REGISTRY, REQUEST_SECONDS, ratio, stage
+from name_index import DrugNameIndex, normalize_name
+from packed_grid import PackedGrid, as_packed
+from rate_limit import BATCH, ClientRateLimiter, UpstreamSaturated, UpstreamScheduler, upstream_priority
+from responses import (accepted_encoding, columnar_pricing, compress_stream, encode_json,
+                       ndjson_chunks, result_status)
+from regions import load_regions
+from schema import migrate
+from write_behind import WriteBehindQueue
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-
 # Configuration
 OPENFDA_API_KEY = os.getenv('OPENFDA_API_KEY', '')
+OPENFDA_BASE_URL = os.getenv('OPENFDA_BASE_URL', 'https://api.fda.gov')
+OPENFDA_TIMEOUT = float(os.getenv('OPENFDA_TIMEOUT', '10'))
+OPENFDA_MAX_RETRIES = int(os.getenv('OPENFDA_MAX_RETRIES', '3'))
 MEDICARE_API_KEY = os.getenv('MEDICARE_API_KEY', '')
+DATABASE_PATH = os.getenv('DRUG_PRICING_DB', 'drug_pricing.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+PRICING_CACHE_TTL = int(os.getenv('PRICING_CACHE_TTL', '86400'))  # seconds
+EVICTION_INTERVAL = int(os.getenv('EVICTION_INTERVAL', '300'))  # seconds
+EVICTION_BATCH_SIZE = 5000
+MEMORY_CACHE_SIZE = int(os.getenv('MEMORY_CACHE_SIZE', '10000'))  # entries per cache
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')  # second tier: sqlite, memory or redis
+CACHE_BACKEND_SIZE = int(os.getenv('CACHE_BACKEND_SIZE', '100000'))  # entries per namespace (memory)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'drug-pricing:')
+NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', '300'))  # seconds
+DRUG_REPORT_TIMEOUT = float(os.getenv('DRUG_REPORT_TIMEOUT', '8'))  # seconds
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '16'))
+PRICING_SEED = int(os.getenv('PRICING_SEED')) if os.getenv('PRICING_SEED') else None
+BULK_BLOCK_PAIRS = 500  # (drug, zip) pairs resolved per query/transaction
+BULK_MAX_PAIRS = int(os.getenv('BULK_MAX_PAIRS', '1000000'))
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+METRICS_ROW_COUNT_TTL = 60  # seconds between COUNT(*) refreshes for the row gauges
+CACHE_REFRESH_ENABLED = os.getenv('CACHE_REFRESH_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+WARMUP_DRUGS = [d.strip() for d in os.getenv('WARMUP_DRUGS', '').split(',') if d.strip()]
+WARMUP_ZIPS = [z.strip() for z in os.getenv('WARMUP_ZIPS', '').split(',') if z.strip()]
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', '1000'))  # most requested pairs preloaded at startup
+REFRESH_AHEAD = int(os.getenv('REFRESH_AHEAD', '3600'))  # seconds before expiry to regenerate
+REFRESH_INTERVAL = int(os.getenv('REFRESH_INTERVAL', '60'))  # seconds between refresh passes
+# Both set by gunicorn.conf.py: caches are shared across worker processes, and
+# background threads start in each worker after fork rather than at import
+CACHE_INVALIDATION = os.getenv('CACHE_INVALIDATION', 'false').lower() in ('1', 'true', 'yes', 'on')
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', '1'))  # seconds
+PREFORK = os.getenv('DRUG_PRICING_PREFORK', 'false').lower() in ('1', 'true', 'yes', 'on')
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'true').lower() not in ('0', 'false', 'no', 'off')
+RESPONSE_MAX_AGE = int(os.getenv('RESPONSE_MAX_AGE', '300'))  # seconds browsers reuse a response
+
+# Upstream quota, per process (divide by the worker count under gunicorn); 0 disables
+OPENFDA_RATE_LIMIT = float(os.getenv('OPENFDA_RATE_LIMIT', '4'))  # calls per second
+OPENFDA_BURST = int(os.getenv('OPENFDA_BURST', '20'))
+OPENFDA_DAILY_QUOTA = int(os.getenv('OPENFDA_DAILY_QUOTA', '0'))  # calls per day; 0 for none
+OPENFDA_QUEUE_TIMEOUT = float(os.getenv('OPENFDA_QUEUE_TIMEOUT', '2'))  # seconds a user request may wait
+BATCH_QUEUE_TIMEOUT = float(os.getenv('BATCH_QUEUE_TIMEOUT', '60'))  # seconds warm-up calls may wait
+UPSTREAM_RETRY_AFTER = int(os.getenv('UPSTREAM_RETRY_AFTER', '5'))  # seconds, after OpenFDA errors
+# Inbound limit on /api/* per client address; 0 disables
+CLIENT_RATE_LIMIT = float(os.getenv('CLIENT_RATE_LIMIT', '20'))  # requests per second
+CLIENT_BURST = int(os.getenv('CLIENT_BURST', '40'))
+TRUST_PROXY = os.getenv('TRUST_PROXY', 'false').lower() in ('1', 'true', 'yes', 'on')
+# Cache writes from the request path are queued and committed in batches
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+WRITE_QUEUE_SIZE = int(os.getenv('WRITE_QUEUE_SIZE', '10000'))  # pending writes before backpressure
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '500'))  # writes per transaction at most
+WRITE_FLUSH_INTERVAL = float(os.getenv('WRITE_FLUSH_INTERVAL', '0.05'))  # seconds writes are gathered
+WRITE_QUEUE_TIMEOUT = float(os.getenv('WRITE_QUEUE_TIMEOUT', '1'))  # seconds to wait on a full queue
+
+REGISTRY.enabled = METRICS_ENABLED
+
+RATE_LIMIT_EXEMPT = ('/api/health', '/api/ready', '/api/metrics')
+UPSTREAM_UNAVAILABLE = 'OpenFDA is temporarily unavailable, please retry'
 
 class DrugPricingService:
-    def __init__(self):
-        self.openfda_base_url = "https://api.fda.gov"
+    def __init__(self, db_path: str = DATABASE_PATH, pool_size: int = DB_POOL_SIZE):
+        # Deferred so importing app (tests, gunicorn's master, CLIs) stays cheap
+        from openfda import OpenFDAClient
+        from pricing_engine import PricingEngine
+        
+        self.openfda_base_url = OPENFDA_BASE_URL
+        self.pricing_engine = PricingEngine(seed=PRICING_SEED)
+        # Pricing is generated and cached per plan region, not per ZIP
+        self.regions = load_regions()
+        self.upstream = UpstreamScheduler(OPENFDA_RATE_LIMIT, OPENFDA_BURST, OPENFDA_DAILY_QUOTA,
+                                          interactive_timeout=OPENFDA_QUEUE_TIMEOUT,
+                                          batch_timeout=BATCH_QUEUE_TIMEOUT)
+        self.openfda = OpenFDAClient(OPENFDA_BASE_URL, api_key=OPENFDA_API_KEY,
+                                     timeout=OPENFDA_TIMEOUT, max_retries=OPENFDA_MAX_RETRIES,
+                                     scheduler=self.upstream)
+        self.client_limiter = ClientRateLimiter(CLIENT_RATE_LIMIT, CLIENT_BURST)
         self.medicare_base_url = "https://data.cms.gov"
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_connections=pool_size)
+        # The local store always holds the catalog and priced rows the
+        # alternatives graph and refresher read; a shared backend is
+        # consulted instead of it and written alongside it
+        self.store = SQLiteCacheBackend(self.pool, PRICING_CACHE_TTL, EVICTION_BATCH_SIZE)
+        self.cache = create_backend(CACHE_BACKEND, self.store, maxsize=CACHE_BACKEND_SIZE,
+                                    redis_url=REDIS_URL, redis_prefix=REDIS_KEY_PREFIX)
+        # Plan/pharmacy codes of every PackedGrid this service holds
+        self.labels = self.store.labels
+        self._last_eviction = 0.0
+        self._eviction_lock = threading.Lock()
+        
+        # First-tier caches; the cache backend is the second tier
+        self.drug_cache = TTLCache(MEMORY_CACHE_SIZE, PRICING_CACHE_TTL)
+        self.pricing_memory_cache = TTLCache(MEMORY_CACHE_SIZE, PRICING_CACHE_TTL)  # PackedGrids
+        self.alternatives_cache = TTLCache(MEMORY_CACHE_SIZE, PRICING_CACHE_TTL)
+        self.alternatives = AlternativesGraph()
+        self.refresher = PricingRefresher(self, PRICING_CACHE_TTL, REFRESH_AHEAD, REFRESH_INTERVAL,
+                                          lock_path=f'{db_path}.refresh.lock')
+        self.invalidation = InvalidationLog(self.pool, enabled=CACHE_INVALIDATION,
+                                            poll_interval=INVALIDATION_POLL_INTERVAL)
+        # Set once startup warm-up has finished; /api/ready waits for it
+        self.warmed = threading.Event()
+        self.writer = WriteBehindQueue(self._apply_writes, maxsize=WRITE_QUEUE_SIZE,
+                                       batch_size=WRITE_BATCH_SIZE, interval=WRITE_FLUSH_INTERVAL,
+                                       put_timeout=WRITE_QUEUE_TIMEOUT, enabled=WRITE_BEHIND_ENABLED)
+        # Normalized names of drugs queued for the catalog but not yet in the alternatives graph
+        self.pending_drugs: Set[str] = set()
+        
+        # Shared by fan-out endpoints such as /api/drug-report
+        self.executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS,
+                                           thread_name_prefix='drug-report')
+        
         self.init_database()
+        self.load_name_index()
+        self.load_alternatives()
+        self.invalidation.mark_current()
     
     def init_database(self):
         """Initialize SQLite database for caching drug data"""
-        self.conn = sqlite3.connect('drug_pricing.db', check_same_thread=False)
-        cursor = self.conn.cursor()
-        
-        # Create tables for caching
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS drugs (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE,
-                generic_name TEXT,
-                brand_name TEXT,
-                ndc TEXT,
-                manufacturer TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pricing_cache (
-                id INTEGER PRIMARY KEY,
-                drug_name TEXT,
-                zip_code TEXT,
-                plan_type TEXT,
-                pharmacy_type TEXT,
-                cost REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        self.conn.commit()
+        with self.pool.connection() as conn:
+            migrate(conn)
     
     def search_drug_by_name(self, drug_name: str) -> Dict:
         """Search for drug information using OpenFDA API"""
         try:
-            # Check cache first
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM drugs WHERE name LIKE ?', (f'%{drug_name}%',))
-            cached_result = cursor.fetchone()
-            
-            if cached_result:
-                return {
-                    'name': cached_result[1],
-                    'generic_name': cached_result[2],
-                    'brand_name': cached_result[3],
-                    'ndc': cached_result[4],
-                    'manufacturer': cached_result[5]
-                }
+            cached_result = self._cached_drug(drug_name)
+            if cached_result is not None:
+                return cached_result
             
             # Query OpenFDA API
-            url = f"{self.openfda_base_url}/drug/label.json"
-            params = {
-                'search': f'openfda.brand_name:"{drug_name}" OR openfda.generic_name:"{drug_name}"',
-                'limit': 1
-            }
-            
-            if OPENFDA_API_KEY:
-                params['api_key'] = OPENFDA_API_KEY
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('results'):
-                    drug_info = data['results'][0]
-                    openfda = drug_info.get('openfda', {})
-                    
-                    result = {
-                        'name': drug_name,
-                        'generic_name': ', '.join(openfda.get('generic_name', [drug_name])),
-                        'brand_name': ', '.join(openfda.get('brand_name', [drug_name])),
-                        'ndc': ', '.join(openfda.get('product_ndc', [])),
-                        'manufacturer': ', '.join(openfda.get('manufacturer_name', []))
-                    }
-                    
-                    # Cache the result
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO drugs 
-                        (name, generic_name, brand_name, ndc, manufacturer)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (drug_name, result['generic_name'], result['brand_name'], 
-                          result['ndc'], result['manufacturer']))
-                    self.conn.commit()
-                    
-                    return result
-            
-            return {'error': 'Drug not found'}
+            with stage('openfda'):
+                response = self.openfda.get('/drug/label.json', self._drug_search_params(drug_name))
+                data = response.json() if response.status_code == 200 else None
+            return self._drug_from_response(drug_name, response.status_code, data)
             
+        except UpstreamSaturated as e:
+            RATE_LIMITED.inc('upstream')
+            return self._upstream_unavailable(e.retry_after)
         except Exception as e:
+            ERRORS.inc('search_drug')
             return {'error': f'Error searching drug: {str(e)}'}
     
+    def _cached_drug(self, drug_name: str) -> Optional[Dict]:
+        """Return the cached drug (or cached miss) without calling OpenFDA"""
+        # Check the memory cache first; it also remembers recent misses
+        self._apply_invalidations()
+        cache_key = normalize_name(drug_name)
+        with stage('memory_cache'):
+            cached_result = self.drug_cache.get(cache_key)
+        if cached_result is not MISSING:
+            return dict(cached_result)
+        
+        # Then the in-memory name index, then the drugs table in case
+        # another process cached the drug since we loaded the index.
+        # The index mirrors the drugs table, so both count as that tier.
+        with stage('sqlite_cache'):
+            cached_result = self.name_index.exact(drug_name)
+            if cached_result is None:
+                cached_result = self._load_cached_drug(drug_name)
+        CACHE_LOOKUPS.inc('drugs', 'hit' if cached_result else 'miss')
+        
+        if cached_result:
+            self.drug_cache.set(cache_key, cached_result)
+            return dict(cached_result)
+        return None
+    
+    @staticmethod
+    def _drug_search_params(drug_name: str) -> Dict:
+        return {
+            'search': f'openfda.brand_name:"{drug_name}" OR openfda.generic_name:"{drug_name}"',
+            'limit': 1
+        }
+    
+    def _drug_from_response(self, drug_name: str, status_code: int, data: Optional[Dict]) -> Dict:
+        """Build, cache and return the drug record from an OpenFDA label response"""
+        cache_key = normalize_name(drug_name)
+        
+        if status_code == 200 and data.get('results'):
+            drug_info = data['results'][0]
+            result = drug_record(drug_name, drug_info.get('openfda', {}))
+            
+            # Cache the result
+            self._catalog_drug(drug_name, result, share=True)
+            self.drug_cache.set(cache_key, dict(result))
+            
+            return result
+        
+        if status_code not in (200, 404):
+            # Never cache transient upstream failures
+            return self._upstream_unavailable(UPSTREAM_RETRY_AFTER)
+        
+        not_found = {'error': 'Drug not found'}
+        suggestions = [match['name'] for match in self.name_index.search(drug_name, limit=5)]
+        if suggestions:
+            not_found['suggestions'] = suggestions
+        self.drug_cache.set(cache_key, not_found, ttl=NEGATIVE_CACHE_TTL)
+        return dict(not_found)
+    
+    def _catalog_drug(self, drug_name: str, record: Dict, share: bool = False):
+        """Add a drug to the name index now, and queue it for the catalog and alternatives graph
+        
+        ``share`` also writes it to a shared cache backend, if one is configured.
+        """
+        self.name_index.add(dict(record))
+        self.pending_drugs.add(normalize_name(drug_name))
+        self.writer.submit('drug', (drug_name, record, share))
+    
+    def _apply_writes(self, writes: List[Tuple[str, tuple]]):
+        """Apply a batch of queued cache writes; runs on the write-behind thread"""
+        drugs, shared, grids = {}, {}, {}
+        for kind, payload in writes:
+            if kind == 'drug':
+                drug_name, record, share = payload
+                drugs[drug_name] = record
+                if share:
+                    shared[drug_name] = record
+            elif kind == 'pricing':
+                drug_name, region, grid = payload
+                grids[(drug_name, region)] = grid
+        
+        if drugs:
+            try:
+                self._store_drugs(drugs, shared)
+            finally:
+                self.pending_drugs.difference_update(normalize_name(name) for name in drugs)
+        if grids:
+            self._store_pricing([(drug_name, region, grid)
+                                 for (drug_name, region), grid in grids.items()])
+    
+    def _store_drugs(self, drugs: Dict[str, Dict], shared: Dict[str, Dict]):
+        """Store drugs in the local catalog (and ``shared`` ones in a shared backend)"""
+        with self.pool.connection() as conn:
+            with stage('sqlite_write'):
+                # Other processes hear of the change in the transaction that makes it
+                self.store.set_many(DRUGS, drugs, conn=conn)
+                self.invalidation.publish(conn, 'drug', drugs)
+                conn.commit()
+            self.alternatives.rebuild(conn, {record['generic_name'] for record in drugs.values()})
+        if shared and self.cache is not self.store:
+            with stage('sqlite_write'):
+                self.cache.set_many(DRUGS, shared)
+    
+    def _load_cached_drug(self, drug_name: str) -> Optional[Dict]:
+        """Look a drug up by its exact cached name, locally and then in a shared backend"""
+        entry = self.store.get(DRUGS, drug_name)
+        if entry is None and self.cache is not self.store:
+            entry = self.cache.get(DRUGS, drug_name)
+            if entry is not None:
+                # Cached by another host; catalog it here too
+                self._catalog_drug(drug_name, entry[0])
+        
+        if entry is None:
+            return None
+        
+        record = dict(entry[0])
+        self.name_index.add(record)
+        return record
+    
+    def load_name_index(self):
+        """Rebuild the in-memory name index from the drugs table"""
+        index = DrugNameIndex()
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                SELECT name, generic_name, brand_name, ndc, manufacturer FROM drugs
+            ''')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                index.add_many(dict(zip(DRUG_FIELDS, row)) for row in rows)
+        index.prepare()
+        self.name_index = index
+    
+    def load_alternatives(self):
+        """Load the alternatives graph, building it on first start"""
+        with self.pool.connection() as conn:
+            self.alternatives.load(conn)
+            if not len(self.alternatives):
+                self.alternatives.rebuild(conn)
+    
+    def suggest_drugs(self, query: str, limit: int = 10) -> Dict:
+        """Return cached drugs matching a query by exact, prefix or fuzzy name match"""
+        return {'suggestions': self.name_index.search(query, limit=limit)}
+    
     def get_pricing_by_zip(self, drug_name: str, zip_code: str) -> Dict:
-        """Get pricing information for a drug by ZIP code"""
+        """Get pricing information for a drug by ZIP code (priced for the ZIP's region)"""
         try:
-            # Check cache first
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM pricing_cache 
-                WHERE drug_name = ? AND zip_code = ?
-                AND created_at > datetime('now', '-1 day')
-            ''', (drug_name, zip_code))
-            cached_results = cursor.fetchall()
+            # One key for every cache tier and the price seed, however the name was typed
+            drug_name = normalize_name(drug_name)
+            region = self.regions.region(zip_code)
+            # Check the memory cache first, then SQLite
+            self.refresher.record(drug_name, region)
+            self._apply_invalidations()
+            cache_key = (drug_name, region)
+            with stage('memory_cache'):
+                cached = self.pricing_memory_cache.get(cache_key)
+            if cached is not MISSING:
+                return {'pricing': cached.records()}
+            
+            with stage('sqlite_cache'):
+                cached = self.cache.get(PRICING, (drug_name, region))
+            CACHE_LOOKUPS.inc('pricing_cache', 'hit' if cached else 'miss')
             
-            if cached_results:
-                pricing_data = []
-                for row in cached_results:
-                    pricing_data.append({
-                        'plan_type': row[3],
-                        'pharmacy_type': row[4],
-                        'cost': row[5]
-                    })
-                return {'pricing': pricing_data}
+            if cached:
+                grid, expires_at = cached
+                grid = as_packed(grid, self.labels)
+                
+                # Expire the memory entry with the backend entry, and
+                # have the refresher regenerate it if that is close
+                self.pricing_memory_cache.set(cache_key, grid, ttl=expires_at - time.time())
+                if self.refresher.due(expires_at):
+                    self.refresher.schedule(drug_name, region)
+                return {'pricing': grid.records()}
             
             # Simulate pricing data (in real implementation, this would query Medicare APIs)
             # Note: Actual Medicare pricing APIs may require special access
-            pricing_data = self._generate_sample_pricing(drug_name, zip_code)
-            
-            # Cache the results
-            for pricing in pricing_data:
-                cursor.execute('''
-                    INSERT INTO pricing_cache 
-                    (drug_name, zip_code, plan_type, pharmacy_type, cost)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (drug_name, zip_code, pricing['plan_type'], 
-                      pricing['pharmacy_type'], pricing['cost']))
+            with stage('pricing'):
+                pricing_data = self._generate_sample_pricing(drug_name, region)
+                grid = PackedGrid.from_records(pricing_data, self.labels)
             
-            self.conn.commit()
+            # Stored by the write-behind thread, batched with other requests' misses
+            self.writer.submit('pricing', (drug_name, region, grid))
             
+            self.pricing_memory_cache.set(cache_key, grid)
             return {'pricing': pricing_data}
             
         except Exception as e:
+            ERRORS.inc('get_pricing')
             return {'error': f'Error getting pricing: {str(e)}'}
     
-    def _generate_sample_pricing(self, drug_name: str, zip_code: str) -> List[Dict]:
-        """Generate sample pricing data (replace with actual API calls)"""
-        import random
+    def _store_pricing(self, grids: List[Tuple[str, str, PackedGrid]], replaced: bool = False):
+        """Store (drug, region, grid) grids locally, and in a shared backend if configured
         
-        # Sample plan types and pharmacy types
-        plan_types = ['Medicare Part D Standard', 'Medicare Advantage PPO', 'Medicare Advantage HMO']
-        pharmacy_types = ['Retail Pharmacy', 'Mail Order', 'Preferred Pharmacy']
+        ``replaced`` marks grids that overwrite fresh rows other processes
+        may still hold in memory, such as refresh-ahead regenerations.
+        """
+        drug_names = {drug_name for drug_name, _, _ in grids}
+        items = {(drug_name, region): as_packed(grid, self.labels) for drug_name, region, grid in grids}
+        with self.pool.connection() as conn:
+            with stage('sqlite_write'):
+                # The rows and their invalidation events commit together
+                self.store.set_many(PRICING, items, conn=conn)
+                if replaced:
+                    self.invalidation.publish(conn, 'pricing', (pricing_key(drug_name, region)
+                                                                for drug_name, region, _ in grids))
+                # Other processes reload the alternatives groups whose costs moved
+                self.invalidation.publish(conn, 'priced',
+                                          (name for name in drug_names if name in self.alternatives))
+                conn.commit()
+            self.alternatives.refresh_costs(conn, drug_names)
+        if self.cache is not self.store:
+            with stage('sqlite_write'):
+                self.cache.set_many(PRICING, items, PRICING_CACHE_TTL)
         
-        pricing_data = []
-        base_cost = random.uniform(50, 300)  # Random base cost
+        self._maybe_evict_expired()
+    
+    def _fetch_pricing_block(self, drug_names: List[str], regions: List[str]) -> Dict:
+        """Fetch fresh cached grids for every (drug, region) pair in one batch get"""
+        cached = self.cache.get_many(PRICING, product(drug_names, regions))
+        return {pair: as_packed(grid, self.labels) for pair, (grid, _) in cached.items()}
+    
+    def _price_block(self, drug_names: List[str], regions: List[str]) -> Tuple[Dict, Set[Tuple[str, str]]]:
+        """PackedGrids for every (drug, region) pair, and the pairs that had to be generated"""
+        with stage('sqlite_cache'):
+            priced = self._fetch_pricing_block(drug_names, regions)
+        CACHE_LOOKUPS.inc('pricing_cache', 'hit', amount=len(priced))
+        if len(priced) == len(drug_names) * len(regions):
+            return priced, set()
         
-        for plan in plan_types:
-            for pharmacy in pharmacy_types:
-                # Simulate cost variations
-                multiplier = random.uniform(0.7, 1.3)
-                cost = round(base_cost * multiplier, 2)
-                
-                pricing_data.append({
-                    'plan_type': plan,
-                    'pharmacy_type': pharmacy,
-                    'cost': cost,
-                    'copay': round(cost * 0.2, 2),  # Assume 20% copay
-                    'deductible': round(cost * 0.8, 2)  # Assume 80% deductible
-                })
+        # Price the whole block in one vectorized pass if anything missed
+        CACHE_LOOKUPS.inc('pricing_cache', 'miss',
+                          amount=len(drug_names) * len(regions) - len(priced))
+        with stage('pricing'):
+            grid = self.pricing_engine.grid(drug_names, regions)
+        misses = []
+        for d, drug_name in enumerate(drug_names):
+            for r, region in enumerate(regions):
+                if (drug_name, region) not in priced:
+                    priced[(drug_name, region)] = packed = grid.packed(d, r, self.labels)
+                    misses.append((drug_name, region, packed))
+        self._store_pricing(misses)
+        return priced, {(drug_name, region) for drug_name, region, _ in misses}
+    
+    def iter_pricing_matrix(self, drug_names: List[str], zip_codes: List[str]) -> Iterator[Dict]:
+        """Yield pricing for every (drug, zip) pair, ending with a summary record
+        
+        ZIPs are priced per region, so each (drug, region) grid is looked up
+        or generated once however many of the requested ZIPs share it. Pairs
+        are resolved in blocks of at most BULK_BLOCK_PAIRS (drug, region)
+        grids: each block resolves cache hits with one query, generates the
+        misses and stores them in one transaction before its rows are
+        yielded. Memory use is bounded by the block size and the number of
+        regions, not by the size of the matrix.
+        """
+        zip_regions = [self.regions.region(zip_code) for zip_code in zip_codes]
+        # Grids are keyed and priced by normalized name, as in get_pricing_by_zip
+        drug_keys = [normalize_name(drug_name) for drug_name in drug_names]
+        regions = list(dict.fromkeys(zip_regions))
+        region_step = max(1, min(len(regions), BULK_BLOCK_PAIRS))
+        drug_step = max(1, BULK_BLOCK_PAIRS // region_step)
+        summary = {'pairs': 0, 'cache_hits': 0, 'generated': 0, 'regions': len(regions)}
+        
+        for i in range(0, len(drug_names), drug_step):
+            drugs = drug_names[i:i + drug_step]
+            keys = drug_keys[i:i + drug_step]
+            unique_keys = list(dict.fromkeys(keys))
+            priced, generated = {}, set()
+            for j in range(0, len(regions), region_step):
+                block, block_generated = self._price_block(unique_keys, regions[j:j + region_step])
+                priced.update(block)
+                generated |= block_generated
+            
+            for drug_name, drug_key in zip(drugs, keys):
+                # Decoded once per region; its ZIPs share the list
+                records = {}
+                for zip_code, region in zip(zip_codes, zip_regions):
+                    summary['pairs'] += 1
+                    if (drug_key, region) in generated:
+                        summary['generated'] += 1
+                    else:
+                        summary['cache_hits'] += 1
+                    pricing_data = records.get(region)
+                    if pricing_data is None:
+                        pricing_data = records[region] = priced[(drug_key, region)].records()
+                    yield {
+                        'drug_name': drug_name,
+                        'zip_code': zip_code,
+                        'pricing': pricing_data
+                    }
         
-        return pricing_data
+        yield {'summary': summary}
+    
+    def cache_stats(self) -> Dict:
+        """Return hit/miss/eviction counters for the in-memory caches"""
+        return {
+            'drugs': self.drug_cache.stats(),
+            'pricing': self.pricing_memory_cache.stats(),
+            'alternatives': self.alternatives_cache.stats(),
+            'openfda': self.openfda.stats(),
+            'refresh': self.refresher.stats(),
+            'invalidation': self.invalidation.stats(),
+            'backend': self.cache.stats(),
+            'upstream_quota': self.upstream.stats(),
+            'client_limits': self.client_limiter.stats(),
+            'write_behind': self.writer.stats(),
+        }
+    
+    def register_metrics(self, registry=REGISTRY):
+        """Expose cache, upstream and database state as scrape-time metrics"""
+        memory_caches = {'drugs': self.drug_cache, 'pricing': self.pricing_memory_cache,
+                         'alternatives': self.alternatives_cache}
+        
+        def memory_events():
+            for name, cache in memory_caches.items():
+                stats = cache.stats()
+                for event in ('hits', 'misses', 'evictions', 'expirations'):
+                    yield {'cache': name, 'event': event}, stats[event]
+        
+        def hit_ratios():
+            for name, cache in memory_caches.items():
+                stats = cache.stats()
+                value = ratio(stats['hits'], stats['misses'])
+                if value is not None:
+                    yield {'tier': 'memory', 'cache': name}, value
+            for table in ('drugs', 'pricing_cache'):
+                value = ratio(CACHE_LOOKUPS.value(table, 'hit'), CACHE_LOOKUPS.value(table, 'miss'))
+                if value is not None:
+                    yield {'tier': 'sqlite', 'cache': table}, value
+        
+        def openfda_events():
+            for event, value in self.openfda.stats().items():
+                yield {'client': 'sync', 'event': event}, value
+        
+        def db_bytes():
+            for suffix in ('', '-wal'):
+                path = self.db_path + suffix
+                if os.path.exists(path):
+                    yield {'file': os.path.basename(path)}, os.path.getsize(path)
+        
+        row_counts = {'at': 0.0, 'rows': {}}
+        
+        def db_rows():
+            # COUNT(*) scans an index, so refresh at most once per METRICS_ROW_COUNT_TTL
+            if time.monotonic() - row_counts['at'] > METRICS_ROW_COUNT_TTL:
+                with self.pool.connection() as conn:
+                    row_counts['rows'] = {
+                        table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                        for table in ('drugs', 'pricing_cache', 'drug_alternatives', 'cache_entries')
+                    }
+                row_counts['at'] = time.monotonic()
+            for table, count in row_counts['rows'].items():
+                yield {'table': table}, count
+        
+        def write_behind_events():
+            for event, value in self.writer.stats().items():
+                if event not in ('running', 'pending', 'max_batch'):
+                    yield {'event': event}, value
+        
+        def write_behind_pending():
+            yield {}, self.writer.stats()['pending']
+        
+        def pool_connections():
+            for state, value in self.pool.stats().items():
+                yield {'state': state}, value
+        
+        registry.collector('drug_pricing_memory_cache_events_total', 'counter',
+                           'In-memory cache hits, misses, evictions and expirations', memory_events)
+        registry.collector('drug_pricing_cache_hit_ratio', 'gauge',
+                           'Cache hit ratio since start by tier and cache', hit_ratios)
+        registry.collector('drug_pricing_openfda_events_total', 'counter',
+                           'OpenFDA requests, retries, failures, timeouts and error responses',
+                           openfda_events)
+        registry.collector('drug_pricing_db_bytes', 'gauge',
+                           'SQLite database and WAL file sizes', db_bytes)
+        registry.collector('drug_pricing_db_rows', 'gauge',
+                           'Row counts of the cache tables', db_rows)
+        registry.collector('drug_pricing_write_behind_total', 'counter',
+                           'Queued cache writes submitted, written, written inline under '
+                           'backpressure, retried and failed, and batches committed',
+                           write_behind_events)
+        registry.collector('drug_pricing_write_behind_pending', 'gauge',
+                           'Cache writes queued or being written', write_behind_pending)
+        registry.collector('drug_pricing_db_pool_connections', 'gauge',
+                           'SQLite connection pool size', pool_connections)
+    
+    def start_cache_refresh(self, warm: bool = True):
+        """Warm configured and popular pricing pairs, then refresh them ahead of expiry"""
+        if warm:
+            drugs = self.executor.submit(self.warm_drugs)
+            
+            def warmed():
+                wait([drugs])  # OpenFDA lookups may still be queued at batch priority
+                self.warmed.set()
+            
+            self.refresher.start(self.warmup_pairs(), top_n=WARMUP_TOP_N, on_warm=warmed)
+        else:
+            self.refresher.start()
+    
+    def warm_caches(self) -> int:
+        """Warm configured drugs and configured and popular pricing pairs in the calling thread"""
+        self.warm_drugs()
+        pairs = self.warmup_pairs() + self.refresher.top_pairs(WARMUP_TOP_N)
+        regenerated = self.refresher.warm(pairs)
+        self.warmed.set()
+        return regenerated
+    
+    def warmup_pairs(self) -> List[Tuple[str, str]]:
+        """The configured (drug, region) pairs to warm: WARMUP_DRUGS in the regions of WARMUP_ZIPS"""
+        regions = dict.fromkeys(self.regions.region(zip_code) for zip_code in WARMUP_ZIPS)
+        return list(product(WARMUP_DRUGS, regions))
+    
+    def warm_drugs(self) -> int:
+        """Look up uncached WARMUP_DRUGS on OpenFDA at batch priority; returns the number found"""
+        found = 0
+        with upstream_priority(BATCH):
+            for drug_name in WARMUP_DRUGS:
+                result = self.search_drug_by_name(drug_name)
+                if 'retry_after' in result:
+                    break  # the quota is saturated; users come first
+                found += 'error' not in result
+        return found
+    
+    def prepare_fork(self):
+        """Flush queued writes and close connections and sockets before forking"""
+        self.writer.stop()
+        self.pool.close_all()
+        self.openfda.close()
+    
+    def after_fork(self):
+        """Start per-process background work in a freshly forked worker"""
+        self.writer.start()
+        if CACHE_REFRESH_ENABLED:
+            self.start_cache_refresh(warm=False)
+    
+    def _apply_invalidations(self):
+        """Drop or reload entries other processes changed since the last poll"""
+        events = self.invalidation.poll()
+        if not events:
+            return
+        
+        for drug_name in events.get('drug', ()):
+            self.drug_cache.invalidate(normalize_name(drug_name))
+            self.alternatives_cache.invalidate(normalize_name(drug_name))
+            self._load_cached_drug(drug_name)
+        for key in events.get('pricing', ()):
+            drug_name, _, region = key.rpartition('|')
+            self.pricing_memory_cache.invalidate((normalize_name(drug_name), region))
+        
+        changed = events.get('drug', set()) | events.get('priced', set())
+        if changed:
+            with self.pool.connection() as conn:
+                self.alternatives.reload(conn, changed)
+    
+    def evict_expired_pricing(self) -> int:
+        """Delete expired pricing rows and cache entries and return how many were removed"""
+        removed = self.store.evict_expired()
+        if self.cache is not self.store:
+            removed += self.cache.evict_expired()
+        
+        if self.invalidation.enabled:
+            with self.pool.connection() as conn:
+                self.invalidation.prune(conn)
+        return removed
+    
+    def _maybe_evict_expired(self):
+        """Run TTL eviction at most once per EVICTION_INTERVAL, amortized over writes"""
+        now = time.monotonic()
+        if now - self._last_eviction < EVICTION_INTERVAL:
+            return
+        if not self._eviction_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_eviction = now
+            self.evict_expired_pricing()
+        finally:
+            self._eviction_lock.release()
+    
+    def _generate_sample_pricing(self, drug_name: str, region: str) -> List[Dict]:
+        """Generate sample pricing data for a pricing region (replace with actual API calls)"""
+        return self.pricing_engine.records(normalize_name(drug_name), region)
+    
+    def _generate_grid(self, drug_name: str, region: str) -> PackedGrid:
+        """Generate sample pricing for a pricing region as a PackedGrid"""
+        return PackedGrid.from_records(self._generate_sample_pricing(drug_name, region), self.labels)
     
     def get_generic_alternatives(self, drug_name: str) -> Dict:
         """Get generic alternatives for a drug"""
         try:
-            # Search for generic alternatives using OpenFDA
-            url = f"{self.openfda_base_url}/drug/label.json"
-            params = {
-                'search': f'openfda.generic_name:"{drug_name}"',
-                'limit': 5
-            }
-            
-            if OPENFDA_API_KEY:
-                params['api_key'] = OPENFDA_API_KEY
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                alternatives = []
-                
-                if data.get('results'):
-                    for result in data['results'][:3]:  # Top 3 alternatives
-                        openfda = result.get('openfda', {})
-                        generic_name = ', '.join(openfda.get('generic_name', []))
-                        
-                        if generic_name and generic_name != drug_name:
-                            alternatives.append({
-                                'name': generic_name,
-                                'estimated_savings': round(random.uniform(20, 70), 1),  # 20-70% savings
-                                'availability': 'Available'
-                            })
-                
-                return {'alternatives': alternatives}
-            
-            return {'alternatives': []}
+            cached_result = self._cached_alternatives(drug_name)
+            if cached_result is not None:
+                return cached_result
             
+            # Search for generic alternatives using OpenFDA
+            with stage('openfda'):
+                response = self.openfda.get('/drug/label.json', self._alternatives_params(drug_name))
+                data = response.json() if response.status_code == 200 else None
+            return self._alternatives_from_response(drug_name, response.status_code, data)
+        
+        except UpstreamSaturated as e:
+            RATE_LIMITED.inc('upstream')
+            return self._upstream_unavailable(e.retry_after)
         except Exception as e:
+            ERRORS.inc('get_alternatives')
             return {'error': f'Error getting alternatives: {str(e)}'}
+    
+    def _cached_alternatives(self, drug_name: str) -> Optional[Dict]:
+        """Return alternatives from the graph or memory cache without calling OpenFDA"""
+        self._apply_invalidations()
+        # Every cached or catalog drug is in the graph, even with no alternatives
+        alternatives = self.alternatives.lookup(drug_name)
+        if alternatives is not None:
+            return {'alternatives': alternatives}
+        
+        cached_result = self.alternatives_cache.get(normalize_name(drug_name))
+        if cached_result is not MISSING:
+            return cached_result
+        
+        cached = self.cache.get(ALTERNATIVES, normalize_name(drug_name))
+        if cached is not None:
+            result, expires_at = cached
+            self.alternatives_cache.set(normalize_name(drug_name), result,
+                                        ttl=None if expires_at is None else expires_at - time.time())
+            return result
+        return None
+    
+    @staticmethod
+    def _upstream_unavailable(retry_after: float) -> Dict:
+        """Error result for an OpenFDA call refused by the quota or failed upstream"""
+        return {'error': UPSTREAM_UNAVAILABLE, 'retry_after': max(1, math.ceil(retry_after))}
+    
+    @staticmethod
+    def _alternatives_params(drug_name: str) -> Dict:
+        return {
+            'search': f'openfda.generic_name:"{drug_name}"',
+            'limit': 5
+        }
+    
+    def _alternatives_from_response(self, drug_name: str, status_code: int,
+                                    data: Optional[Dict]) -> Dict:
+        """Build, cache and return the alternatives list from an OpenFDA label response"""
+        if status_code not in (200, 404):
+            # Never cache transient upstream failures
+            return self._upstream_unavailable(UPSTREAM_RETRY_AFTER)
+        
+        names = []
+        for result in (data or {}).get('results', [])[:3]:  # Top 3 alternatives
+            openfda = result.get('openfda', {})
+            generic_name = ', '.join(openfda.get('generic_name', []))
+            
+            if (generic_name and normalize_name(generic_name) != normalize_name(drug_name)
+                    and generic_name not in names):
+                names.append(generic_name)
+        
+        # Savings come from cached pricing, the same way as for the graph
+        with self.pool.connection() as conn:
+            costs = mean_costs(conn, [drug_name] + names)
+        drug_cost = costs.get(normalize_name(drug_name))
+        
+        alternatives = [{
+            'name': name,
+            'estimated_savings': estimated_savings(drug_cost, costs.get(normalize_name(name))),
+            'availability': 'Available'
+        } for name in names]
+        
+        result = {'alternatives': alternatives}
+        if normalize_name(drug_name) in self.pending_drugs:
+            # The graph will have this drug once its queued write lands; don't
+            # let the OpenFDA answer shadow it for the whole TTL
+            return result
+        ttl = PRICING_CACHE_TTL if alternatives else NEGATIVE_CACHE_TTL
+        self.alternatives_cache.set(normalize_name(drug_name), result, ttl=ttl)
+        self.cache.set(ALTERNATIVES, normalize_name(drug_name), result, ttl=ttl)
+        return result
+    
+    def get_drug_report(self, drug_name: str, zip_code: str,
+                        timeout: float = DRUG_REPORT_TIMEOUT) -> Dict:
+        """Run drug search, pricing and alternatives concurrently and merge the results
+        
+        Legs still running after ``timeout`` seconds are reported in
+        ``timed_out`` and left to finish in the background, so their
+        results still land in the caches for the next request.
+        """
+        legs = {
+            'drug': self.executor.submit(self.search_drug_by_name, drug_name),
+            'pricing': self.executor.submit(self.get_pricing_by_zip, drug_name, zip_code),
+            'alternatives': self.executor.submit(self.get_generic_alternatives, drug_name),
+        }
+        done, _ = wait(legs.values(), timeout=timeout)
+        
+        results = {leg: future.result() for leg, future in legs.items() if future in done}
+        timed_out = [leg for leg, future in legs.items() if future not in done]
+        return self._build_report(results, timed_out)
+    
+    @staticmethod
+    def _build_report(results: Dict[str, Dict], timed_out: List[str]) -> Dict:
+        """Merge per-leg results of a drug report into one response document"""
+        errors = {leg: 'Timed out' for leg in timed_out}
+        for leg, result in results.items():
+            if 'error' in result:
+                errors[leg] = result['error']
+        
+        drug = results.get('drug')
+        report = {
+            'drug': drug if drug and 'error' not in drug else None,
+            'pricing': results.get('pricing', {}).get('pricing'),
+            'alternatives': results.get('alternatives', {}).get('alternatives'),
+            'errors': errors,
+            'timed_out': timed_out,
+            'partial': bool(errors),
+        }
+        if 'drug' in errors:
+            # The widget cannot show a report without the drug itself
+            report['error'] = errors['drug']
+            if drug and drug.get('suggestions'):
+                report['suggestions'] = drug['suggestions']
+            if drug and 'retry_after' in drug:
+                report['retry_after'] = drug['retry_after']
+        return report
+
+# The service opens and migrates the database, loads the name index and
+# alternatives graph and warms caches, so it is built on first use rather
+# than at import: see get_service() and start_service()
+_service: Optional[DrugPricingService] = None
+_service_lock = threading.Lock()
+_service_thread: Optional[threading.Thread] = None
+_service_error: Optional[str] = None
+
+def get_service() -> DrugPricingService:
+    """The process's DrugPricingService, created (and warm-up started) on first call"""
+    global _service, _service_error
+    if _service is not None:
+        return _service
+    with _service_lock:
+        if _service is None:
+            try:
+                service = DrugPricingService()
+            except Exception as e:
+                _service_error = str(e)
+                raise
+            service.register_metrics()
+            if not PREFORK:
+                # Forked workers start their own writer in after_fork()
+                service.writer.start()
+            if not CACHE_REFRESH_ENABLED:
+                service.warmed.set()
+            elif PREFORK:
+                # Warm once in the master; forked workers inherit the memory caches
+                service.warm_caches()
+            else:
+                service.start_cache_refresh()
+            _service, _service_error = service, None
+    return _service
+
+def start_service():
+    """Create the service in a background thread, so a server can accept connections meanwhile"""
+    global _service_thread
+    with _service_lock:
+        if _service is not None or (_service_thread is not None and _service_thread.is_alive()):
+            return
+        _service_thread = threading.Thread(target=_init_service, name='service-init', daemon=True)
+        _service_thread.start()
+
+def _init_service():
+    try:
+        get_service()
+    except Exception:
+        ERRORS.inc('service_init')
+
+def readiness() -> Tuple[Dict, int]:
+    """Readiness report and status code; starts creating the service if nothing has yet
+    
+    Ready (200) once the service exists, its startup warm-up has finished
+    and the database answers; 503 with the current state otherwise.
+    """
+    service = _service
+    if service is None:
+        start_service()
+        if _service_error:
+            return {'status': 'failed', 'error': _service_error}, 503
+        return {'status': 'starting'}, 503
+    if not service.warmed.is_set():
+        return {'status': 'warming'}, 503
+    try:
+        with service.pool.connection() as conn:
+            conn.execute('SELECT 1')
+    except sqlite3.Error as e:
+        return {'status': 'unavailable', 'error': f'Database error: {str(e)}'}, 503
+    return {'status': 'ready', 'timestamp': datetime.now().isoformat()}, 200
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+def _request_json() -> Dict:
+    """Parse the JSON request body (query string for GET), timed as the parse stage"""
+    if request.method == 'GET':
+        return request.args.to_dict()
+    with stage('parse'):
+        return request.get_json()
+
+def _json_response(result: Dict, cacheable: bool = False):
+    """Serialize a result with ETag/304 and compression, timed as the serialize stage
+    
+    Only successful, complete results are ``cacheable``; results that carry
+    ``retry_after`` (OpenFDA saturated or failing) are sent as 503.
+    """
+    with stage('serialize'):
+        status, headers, body = encode_json(
+            result, status=result_status(result), method=request.method,
+            cacheable=cacheable and 'error' not in result and not result.get('partial'),
+            max_age=RESPONSE_MAX_AGE, if_none_match=request.headers.get('If-None-Match'),
+            accept_encoding=request.headers.get('Accept-Encoding'),
+            compression=RESPONSE_COMPRESSION)
+        return Response(body, status=status, headers=headers)
+
+def _client_address() -> str:
+    """The client's address; the first X-Forwarded-For hop when behind a trusted proxy"""
+    if TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+def _start_timer():
+    request.start_time = time.perf_counter()
 
-# Initialize the service
-pricing_service = DrugPricingService()
+def _limit_client():
+    """Refuse /api/* requests over the client's rate with 429 and Retry-After"""
+    if (request.method == 'OPTIONS' or not request.path.startswith('/api/')
+            or request.path in RATE_LIMIT_EXEMPT):
+        return None
+    retry_after = get_service().client_limiter.check(_client_address())
+    if not retry_after:
+        return None
+    RATE_LIMITED.inc('client')
+    status, headers, body = encode_json(
+        {'error': 'Too many requests', 'retry_after': max(1, math.ceil(retry_after))},
+        status=429, compression=False)
+    return Response(body, status=status, headers=headers)
 
-@app.route('/api/search-drug', methods=['POST'])
+def _record_request(response):
+    if METRICS_ENABLED and hasattr(request, 'start_time'):
+        # Labelled by view name without the blueprint, as in the ASGI app
+        endpoint = (request.endpoint or 'unknown').rpartition('.')[2]
+        REQUEST_SECONDS.observe(time.perf_counter() - request.start_time,
+                                endpoint, str(response.status_code))
+    return response
+
+@api.route('/search-drug', methods=['GET', 'POST'])
 def search_drug():
     """Search for a drug by name"""
-    data = request.get_json()
+    data = _request_json()
     drug_name = data.get('drug_name', '').strip()
     
     if not drug_name:
         return jsonify({'error': 'Drug name is required'}), 400
     
-    result = pricing_service.search_drug_by_name(drug_name)
-    return jsonify(result)
+    result = get_service().search_drug_by_name(drug_name)
+    return _json_response(result, cacheable=True)
+
+@api.route('/suggest-drugs', methods=['POST'])
+def suggest_drugs():
+    """Suggest cached drugs by exact, prefix or fuzzy name match"""
+    data = _request_json()
+    query = data.get('query', '').strip()
+    
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    try:
+        limit = max(1, min(int(data.get('limit', 10)), 50))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    result = get_service().suggest_drugs(query, limit)
+    return _json_response(result)
 
-@app.route('/api/get-pricing', methods=['POST'])
+@api.route('/get-pricing', methods=['GET', 'POST'])
 def get_pricing():
-    """Get pricing information for a drug by ZIP code"""
-    data = request.get_json()
+    """Get pricing information for a drug by ZIP code; shape=columnar for arrays"""
+    data = _request_json()
     drug_name = data.get('drug_name', '').strip()
     zip_code = data.get('zip_code', '').strip()
     
@@ -252,25 +961,158 @@ def get_pricing():
     if not zip_code.isdigit() or len(zip_code) != 5:
         return jsonify({'error': 'Invalid ZIP code format'}), 400
     
-    result = pricing_service.get_pricing_by_zip(drug_name, zip_code)
-    return jsonify(result)
+    service = get_service()
+    result = service.get_pricing_by_zip(drug_name, zip_code)
+    if data.get('shape') == 'columnar' and 'pricing' in result:
+        engine = service.pricing_engine
+        result = {'pricing': columnar_pricing(result['pricing'], engine.plan_names,
+                                              engine.pharmacy_names)}
+    return _json_response(result, cacheable=True)
 
-@app.route('/api/get-alternatives', methods=['POST'])
+@api.route('/get-alternatives', methods=['GET', 'POST'])
 def get_alternatives():
     """Get generic alternatives for a drug"""
-    data = request.get_json()
+    data = _request_json()
     drug_name = data.get('drug_name', '').strip()
     
     if not drug_name:
         return jsonify({'error': 'Drug name is required'}), 400
     
-    result = pricing_service.get_generic_alternatives(drug_name)
-    return jsonify(result)
+    result = get_service().get_generic_alternatives(drug_name)
+    return _json_response(result, cacheable=True)
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/drug-report', methods=['GET', 'POST'])
+def drug_report():
+    """Drug information, pricing and generic alternatives in one round trip"""
+    data = _request_json()
+    drug_name = data.get('drug_name', '').strip()
+    zip_code = data.get('zip_code', '').strip()
+    
+    if not drug_name or not zip_code:
+        return jsonify({'error': 'Drug name and ZIP code are required'}), 400
+    
+    if not zip_code.isdigit() or len(zip_code) != 5:
+        return jsonify({'error': 'Invalid ZIP code format'}), 400
+    
+    result = get_service().get_drug_report(drug_name, zip_code)
+    return _json_response(result, cacheable=True)
+
+def parse_pricing_matrix(data: Dict) -> Tuple[List[str], List[str], Optional[Dict]]:
+    """Validated (drug_names, zip_codes, error) from a bulk pricing or export request
+    
+    Names are stripped and de-duplicated in the caller's order; ``error``
+    is the 400 response body when the request is invalid.
+    """
+    drug_names = data.get('drug_names', [])
+    zip_codes = data.get('zip_codes', [])
+    
+    if not isinstance(drug_names, list) or not isinstance(zip_codes, list):
+        return [], [], {'error': 'drug_names and zip_codes must be lists'}
+    
+    # Normalize and de-duplicate while keeping the caller's order
+    drug_names = list(dict.fromkeys(str(d).strip() for d in drug_names if str(d).strip()))
+    zip_codes = list(dict.fromkeys(str(z).strip() for z in zip_codes))
+    
+    if not drug_names or not zip_codes:
+        return [], [], {'error': 'Drug names and ZIP codes are required'}
+    
+    invalid = [z for z in zip_codes if not z.isdigit() or len(z) != 5]
+    if invalid:
+        return [], [], {'error': 'Invalid ZIP code format', 'invalid_zip_codes': invalid[:20]}
+    
+    if len(drug_names) * len(zip_codes) > BULK_MAX_PAIRS:
+        return [], [], {'error': f'At most {BULK_MAX_PAIRS} drug x ZIP pairs per request'}
+    return drug_names, zip_codes, None
+
+@api.route('/bulk-pricing', methods=['POST'])
+def bulk_pricing():
+    """Stream pricing for every drug x ZIP pair as newline-delimited JSON
+    
+    ``"shape": "columnar"`` streams blocks of parallel arrays instead of
+    one record per pair.
+    """
+    data = _request_json()
+    drug_names, zip_codes, error = parse_pricing_matrix(data)
+    if error:
+        return jsonify(error), 400
+    
+    service = get_service()
+    records = service.iter_pricing_matrix(drug_names, zip_codes)
+    engine = service.pricing_engine
+    chunks = ndjson_chunks(records, data.get('shape') == 'columnar',
+                           engine.plan_names, engine.pharmacy_names)
+    headers = {}
+    coding = accepted_encoding(request.headers.get('Accept-Encoding')) if RESPONSE_COMPRESSION else None
+    if coding:
+        chunks = compress_stream(chunks, coding)
+        headers = {'Content-Encoding': coding, 'Vary': 'Accept-Encoding'}
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson', headers=headers)
+
+@api.route('/export-pricing', methods=['POST'])
+def export_pricing():
+    """Stream pricing for every drug x ZIP pair as a CSV or Parquet file
+    
+    One row per drug, ZIP, plan and pharmacy; ``"format"`` is ``csv``
+    (the default) or ``parquet``.
+    """
+    data = _request_json()
+    drug_names, zip_codes, error = parse_pricing_matrix(data)
+    if error:
+        return jsonify(error), 400
+    
+    fmt = str(data.get('format', 'csv')).lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(sorted(EXPORT_FORMATS))}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export is not available on this server'}), 400
+    
+    records = get_service().iter_pricing_matrix(drug_names, zip_codes)
+    chunks = export_chunks(records, fmt)
+    headers = {'Content-Disposition': f'attachment; filename="pricing.{fmt}"'}
+    # Parquet pages are already compressed
+    coding = (accepted_encoding(request.headers.get('Accept-Encoding'))
+              if RESPONSE_COMPRESSION and fmt == 'csv' else None)
+    if coding:
+        chunks = compress_stream(chunks, coding)
+        headers.update({'Content-Encoding': coding, 'Vary': 'Accept-Encoding'})
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+@api.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """In-memory cache hit/miss/eviction counters"""
+    return jsonify(get_service().cache_stats())
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics; 404 when METRICS_ENABLED is off"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is serving requests (it may still be starting up)"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
+@api.route('/ready', methods=['GET'])
+def ready_check():
+    """Readiness: 200 once the service is initialized and its caches are warm, else 503"""
+    result, status = readiness()
+    return jsonify(result), status
+
+def create_app(eager: bool = False) -> Flask:
+    """Build the Flask app; the service is created on first use, or now in the background if ``eager``"""
+    flask_app = Flask(__name__)
+    CORS(flask_app, expose_headers=['ETag', 'Retry-After'])
+    flask_app.before_request(_start_timer)
+    flask_app.before_request(_limit_client)
+    flask_app.after_request(_record_request)
+    flask_app.register_blueprint(api)
+    if eager:
+        start_service()
+    return flask_app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,428 @@
+"""
+Async (ASGI) serving mode for the Drug Pricing Transparency API
+
+Exposes the same /api/* routes as the Flask app, but OpenFDA calls go
+through a non-blocking aiohttp client, so a single process can hold
+thousands of in-flight upstream waits without a thread per request.
+SQLite work is short and runs on the default thread pool via
+asyncio.to_thread, reusing the same DrugPricingService and caches.
+
+Run with:  uvicorn asgi:app --port 5000   (or: python run.py --async)
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from app import (DRUG_REPORT_TIMEOUT, METRICS_ENABLED, OPENFDA_API_KEY, OPENFDA_BASE_URL,
+                 OPENFDA_MAX_RETRIES, OPENFDA_TIMEOUT, RATE_LIMIT_EXEMPT, RESPONSE_COMPRESSION,
+                 RESPONSE_MAX_AGE, TRUST_PROXY, DrugPricingService, get_service,
+                 parse_pricing_matrix, readiness, start_service)
+from export import FORMATS as EXPORT_FORMATS, export_chunks, parquet_available
+from metrics import ERRORS, RATE_LIMITED, REGISTRY, REQUEST_SECONDS, stage
+from openfda import AsyncOpenFDAClient
+from rate_limit import UpstreamSaturated
+from responses import (accepted_encoding, columnar_pricing, compress_stream, encode_json,
+                       ndjson_chunks, result_status)
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Content-Type, If-None-Match'),
+    (b'access-control-expose-headers', b'ETag, Retry-After'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+]
+
+
+class AsyncDrugPricingService:
+    """Awaitable facade over DrugPricingService with non-blocking OpenFDA calls"""
+
+    def __init__(self, service: DrugPricingService, openfda: AsyncOpenFDAClient):
+        self.service = service
+        self.openfda = openfda
+
+    async def search_drug_by_name(self, drug_name: str) -> Dict:
+        try:
+            cached_result = await asyncio.to_thread(self.service._cached_drug, drug_name)
+            if cached_result is not None:
+                return cached_result
+
+            with stage('openfda'):
+                response = await self.openfda.get('/drug/label.json',
+                                                  self.service._drug_search_params(drug_name))
+                data = response.json() if response.status_code == 200 else None
+            return await asyncio.to_thread(self.service._drug_from_response,
+                                           drug_name, response.status_code, data)
+        except UpstreamSaturated as e:
+            RATE_LIMITED.inc('upstream')
+            return self.service._upstream_unavailable(e.retry_after)
+        except Exception as e:
+            ERRORS.inc('search_drug')
+            return {'error': f'Error searching drug: {str(e)}'}
+
+    async def get_generic_alternatives(self, drug_name: str) -> Dict:
+        try:
+            cached_result = await asyncio.to_thread(self.service._cached_alternatives, drug_name)
+            if cached_result is not None:
+                return cached_result
+
+            with stage('openfda'):
+                response = await self.openfda.get('/drug/label.json',
+                                                  self.service._alternatives_params(drug_name))
+                data = response.json() if response.status_code == 200 else None
+            return await asyncio.to_thread(self.service._alternatives_from_response,
+                                           drug_name, response.status_code, data)
+        except UpstreamSaturated as e:
+            RATE_LIMITED.inc('upstream')
+            return self.service._upstream_unavailable(e.retry_after)
+        except Exception as e:
+            ERRORS.inc('get_alternatives')
+            return {'error': f'Error getting alternatives: {str(e)}'}
+
+    async def get_pricing_by_zip(self, drug_name: str, zip_code: str) -> Dict:
+        return await asyncio.to_thread(self.service.get_pricing_by_zip, drug_name, zip_code)
+
+    async def suggest_drugs(self, query: str, limit: int) -> Dict:
+        return self.service.suggest_drugs(query, limit)
+
+    async def get_drug_report(self, drug_name: str, zip_code: str,
+                              timeout: float = DRUG_REPORT_TIMEOUT) -> Dict:
+        legs = {
+            'drug': asyncio.ensure_future(self.search_drug_by_name(drug_name)),
+            'pricing': asyncio.ensure_future(self.get_pricing_by_zip(drug_name, zip_code)),
+            'alternatives': asyncio.ensure_future(self.get_generic_alternatives(drug_name)),
+        }
+        # Legs that miss the deadline keep running so their results are cached
+        done, _ = await asyncio.wait(legs.values(), timeout=timeout)
+
+        results = {leg: task.result() for leg, task in legs.items() if task in done}
+        timed_out = [leg for leg, task in legs.items() if task not in done]
+        return DrugPricingService._build_report(results, timed_out)
+
+
+def _valid_zip(zip_code: str) -> bool:
+    return zip_code.isdigit() and len(zip_code) == 5
+
+
+class Request:
+    def __init__(self, scope: Dict, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = parse_qs(scope.get('query_string', b'').decode())
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1')
+                        for k, v in scope.get('headers', [])}
+        # Behind a trusted proxy the client is the first X-Forwarded-For hop
+        forwarded = self.headers.get('x-forwarded-for')
+        if TRUST_PROXY and forwarded:
+            self.client = forwarded.split(',')[0].strip()
+        else:
+            self.client = scope['client'][0] if scope.get('client') else 'unknown'
+        self.body = body
+        self._json = None
+
+    def json(self) -> Optional[Dict]:
+        if self._json is None:
+            try:
+                with stage('parse'):
+                    self._json = json.loads(self.body or b'null')
+            except ValueError:
+                return None
+        return self._json if isinstance(self._json, dict) else None
+
+    def params(self) -> Optional[Dict]:
+        """Query parameters of a GET, otherwise the JSON body"""
+        if self.method == 'GET':
+            return {key: values[-1] for key, values in self.query.items()}
+        return self.json()
+
+
+class App:
+    """Minimal ASGI application routing the /api/* endpoints"""
+
+    def __init__(self, service_factory: Callable[[], DrugPricingService] = get_service):
+        self._service_factory = service_factory
+        self._start_lock = threading.Lock()
+        self.pricing: Optional[AsyncDrugPricingService] = None
+        self.routes = {
+            ('GET', '/api/search-drug'): self.search_drug,
+            ('POST', '/api/search-drug'): self.search_drug,
+            ('POST', '/api/suggest-drugs'): self.suggest_drugs,
+            ('GET', '/api/get-pricing'): self.get_pricing,
+            ('POST', '/api/get-pricing'): self.get_pricing,
+            ('GET', '/api/get-alternatives'): self.get_alternatives,
+            ('POST', '/api/get-alternatives'): self.get_alternatives,
+            ('GET', '/api/drug-report'): self.drug_report,
+            ('POST', '/api/drug-report'): self.drug_report,
+            ('POST', '/api/bulk-pricing'): self.bulk_pricing,
+            ('POST', '/api/export-pricing'): self.export_pricing,
+            ('GET', '/api/cache-stats'): self.cache_stats,
+            ('GET', '/api/metrics'): self.metrics,
+            ('GET', '/api/health'): self.health_check,
+            ('GET', '/api/ready'): self.ready_check,
+        }
+
+    @property
+    def service(self) -> DrugPricingService:
+        """The shared service, created on first use (blocking; call off the event loop)"""
+        return self._service_factory()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        request = Request(scope, body)
+        if request.method == 'OPTIONS':
+            await self._send(send, 204, b'', [])
+            return
+
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            status = 405 if any(path == request.path for _, path in self.routes) else 404
+            await self._json(send, {'error': 'Not found'}, status)
+            return
+
+        if request.path not in RATE_LIMIT_EXEMPT:
+            if self.pricing is None:
+                # The first request waits for the service instead of blocking the loop
+                await asyncio.to_thread(self._start)
+            retry_after = self.service.client_limiter.check(request.client)
+            if retry_after:
+                RATE_LIMITED.inc('client')
+                await self._json(send, {'error': 'Too many requests',
+                                        'retry_after': max(1, math.ceil(retry_after))}, 429)
+                return
+
+        if request.method == 'POST' and request.json() is None:
+            await self._json(send, {'error': 'Request body must be a JSON object'}, 400)
+            return
+
+        start = time.perf_counter()
+        status = []
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        try:
+            await handler(request, send_and_record)
+        finally:
+            if METRICS_ENABLED:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, handler.__name__,
+                                        str(status[0]) if status else '500')
+
+    def _start(self):
+        with self._start_lock:
+            if self.pricing is None:
+                self._start_pricing()
+
+    def _start_pricing(self):
+        # Shares the sync client's scheduler: one quota per process
+        openfda = AsyncOpenFDAClient(OPENFDA_BASE_URL, api_key=OPENFDA_API_KEY,
+                                     timeout=OPENFDA_TIMEOUT, max_retries=OPENFDA_MAX_RETRIES,
+                                     scheduler=self.service.upstream)
+        self.pricing = AsyncDrugPricingService(self.service, openfda)
+
+        def openfda_events():
+            for event, value in openfda.stats().items():
+                yield {'client': 'async', 'event': event}, value
+
+        REGISTRY.collector('drug_pricing_openfda_async_events_total', 'counter',
+                           'Async OpenFDA requests, retries, failures, timeouts and error responses',
+                           openfda_events)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Accept connections at once; /api/ready reports when the service is up
+                start_service()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.pricing is not None:
+                    await self.pricing.openfda.aclose()
+                    # Commit queued cache writes before the process exits
+                    await asyncio.to_thread(self.pricing.service.writer.stop)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send(self, send, status: int, body: bytes, headers: List):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers + CORS_HEADERS + [(b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _json(self, send, data: Dict, status: int = 200,
+                    request: Optional[Request] = None, cacheable: bool = False):
+        """Send a JSON response with ETag/304 and compression negotiated from ``request``"""
+        headers = request.headers if request is not None else {}
+        if status == 200:
+            status = result_status(data)
+        with stage('serialize'):
+            status, response_headers, body = encode_json(
+                data, status, method=request.method if request is not None else 'GET',
+                cacheable=cacheable and 'error' not in data and not data.get('partial'),
+                max_age=RESPONSE_MAX_AGE, if_none_match=headers.get('if-none-match'),
+                accept_encoding=headers.get('accept-encoding'), compression=RESPONSE_COMPRESSION)
+        await self._send(send, status, body, [(name.lower().encode(), value.encode())
+                                              for name, value in response_headers.items()])
+
+    # Routes
+
+    async def search_drug(self, request: Request, send):
+        drug_name = str(request.params().get('drug_name', '')).strip()
+        if not drug_name:
+            await self._json(send, {'error': 'Drug name is required'}, 400)
+            return
+        await self._json(send, await self.pricing.search_drug_by_name(drug_name), request=request,
+                         cacheable=True)
+
+    async def suggest_drugs(self, request: Request, send):
+        data = request.json()
+        query = str(data.get('query', '')).strip()
+        if not query:
+            await self._json(send, {'error': 'Query is required'}, 400)
+            return
+        try:
+            limit = max(1, min(int(data.get('limit', 10)), 50))
+        except (TypeError, ValueError):
+            await self._json(send, {'error': 'Invalid limit'}, 400)
+            return
+        await self._json(send, await self.pricing.suggest_drugs(query, limit))
+
+    async def get_pricing(self, request: Request, send):
+        data = request.params()
+        drug_name = str(data.get('drug_name', '')).strip()
+        zip_code = str(data.get('zip_code', '')).strip()
+        if not drug_name or not zip_code:
+            await self._json(send, {'error': 'Drug name and ZIP code are required'}, 400)
+            return
+        if not _valid_zip(zip_code):
+            await self._json(send, {'error': 'Invalid ZIP code format'}, 400)
+            return
+        result = await self.pricing.get_pricing_by_zip(drug_name, zip_code)
+        engine = self.service.pricing_engine
+        if data.get('shape') == 'columnar' and 'pricing' in result:
+            result = {'pricing': columnar_pricing(result['pricing'], engine.plan_names,
+                                                          engine.pharmacy_names)}
+        await self._json(send, result, request=request, cacheable=True)
+
+    async def get_alternatives(self, request: Request, send):
+        drug_name = str(request.params().get('drug_name', '')).strip()
+        if not drug_name:
+            await self._json(send, {'error': 'Drug name is required'}, 400)
+            return
+        await self._json(send, await self.pricing.get_generic_alternatives(drug_name),
+                         request=request, cacheable=True)
+
+    async def drug_report(self, request: Request, send):
+        data = request.params()
+        drug_name = str(data.get('drug_name', '')).strip()
+        zip_code = str(data.get('zip_code', '')).strip()
+        if not drug_name or not zip_code:
+            await self._json(send, {'error': 'Drug name and ZIP code are required'}, 400)
+            return
+        if not _valid_zip(zip_code):
+            await self._json(send, {'error': 'Invalid ZIP code format'}, 400)
+            return
+        await self._json(send, await self.pricing.get_drug_report(drug_name, zip_code),
+                         request=request, cacheable=True)
+
+    async def _stream(self, send, chunks, headers: List):
+        """Send a chunked 200 response, producing each chunk off the event loop"""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': headers + CORS_HEADERS,
+        })
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, b'')
+            if not chunk:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def bulk_pricing(self, request: Request, send):
+        data = request.json()
+        drug_names, zip_codes, error = parse_pricing_matrix(data)
+        if error:
+            await self._json(send, error, 400)
+            return
+
+        records = self.service.iter_pricing_matrix(drug_names, zip_codes)
+        engine = self.service.pricing_engine
+        chunks = ndjson_chunks(records, data.get('shape') == 'columnar',
+                               engine.plan_names, engine.pharmacy_names)
+        headers = [(b'content-type', b'application/x-ndjson')]
+        coding = (accepted_encoding(request.headers.get('accept-encoding'))
+                  if RESPONSE_COMPRESSION else None)
+        if coding:
+            chunks = compress_stream(chunks, coding)
+            headers += [(b'content-encoding', coding.encode()), (b'vary', b'Accept-Encoding')]
+        # Each chunk is one block of pricing
+        await self._stream(send, chunks, headers)
+
+    async def export_pricing(self, request: Request, send):
+        data = request.json()
+        drug_names, zip_codes, error = parse_pricing_matrix(data)
+        if error:
+            await self._json(send, error, 400)
+            return
+        fmt = str(data.get('format', 'csv')).lower()
+        if fmt not in EXPORT_FORMATS:
+            await self._json(send, {'error': f"format must be one of: {', '.join(sorted(EXPORT_FORMATS))}"}, 400)
+            return
+        if fmt == 'parquet' and not parquet_available():
+            await self._json(send, {'error': 'Parquet export is not available on this server'}, 400)
+            return
+
+        chunks = export_chunks(self.service.iter_pricing_matrix(drug_names, zip_codes), fmt)
+        headers = [(b'content-type', EXPORT_FORMATS[fmt].encode()),
+                   (b'content-disposition', f'attachment; filename="pricing.{fmt}"'.encode())]
+        coding = (accepted_encoding(request.headers.get('accept-encoding'))
+                  if RESPONSE_COMPRESSION and fmt == 'csv' else None)
+        if coding:
+            chunks = compress_stream(chunks, coding)
+            headers += [(b'content-encoding', coding.encode()), (b'vary', b'Accept-Encoding')]
+        await self._stream(send, chunks, headers)
+
+    async def cache_stats(self, request: Request, send):
+        stats = self.service.cache_stats()
+        stats['openfda_async'] = self.pricing.openfda.stats()
+        await self._json(send, stats)
+
+    async def metrics(self, request: Request, send):
+        if not METRICS_ENABLED:
+            await self._json(send, {'error': 'Metrics are disabled'}, 404)
+            return
+        body = (await asyncio.to_thread(REGISTRY.render)).encode()
+        await self._send(send, 200, body, [(b'content-type', b'text/plain; version=0.0.4')])
+
+    async def health_check(self, request: Request, send):
+        await self._json(send, {'status': 'healthy', 'timestamp': datetime.now().isoformat(),
+                                'mode': 'asgi'})
+
+    async def ready_check(self, request: Request, send):
+        result, status = await asyncio.to_thread(readiness)
+        if status == 200 and self.pricing is None:
+            await asyncio.to_thread(self._start)
+        await self._json(send, result, status)
+
+
+app = App()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Load-test the threaded Flask server against the ASGI serving mode
+
+Starts a latency-injecting OpenFDA stub, then runs each server in its own
+process against a fresh database and fires bursts of concurrent
+/api/search-drug requests for uncached drugs, so every request waits on
+the (slow) upstream. Reports throughput, latency percentiles and the
+server's peak thread count and RSS.
+
+Usage: python backend/benchmarks/bench_async_vs_threaded.py [--latency 0.5] [--concurrency 100,500,1000]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import aiohttp
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+
+from openfda_stub import OpenFDAStub
+
+SERVERS = {
+    'flask-threaded': [sys.executable, '-c',
+                       'import sys; from app import app; '
+                       'app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+             '--log-level', 'warning', '--backlog', '4096', '--port'],
+    # Worker count from WEB_CONCURRENCY
+    'gunicorn': [sys.executable, 'run.py', '--prod', '--host', '127.0.0.1', '--port'],
+}
+
+
+def proc_status(pid):
+    """Return (threads, rss_mb) for a process from /proc"""
+    threads = rss = 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return threads, rss
+
+
+class Sampler(threading.Thread):
+    """Track the peak thread count and RSS of a process"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak_threads = 0
+        self.peak_rss = 0.0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(0.05):
+            threads, rss = proc_status(self.pid)
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss = max(self.peak_rss, rss)
+
+
+def start_server(mode, port, env):
+    cmd = SERVERS[mode] + [str(port)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/ready', timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def burst(base_url, concurrency, tag):
+    """Fire ``concurrency`` simultaneous cache-miss searches"""
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as client:
+        async def one(i):
+            start = time.perf_counter()
+            try:
+                async with client.post(f'{base_url}/api/search-drug',
+                                       json={'drug_name': f'Drug-{tag}-{i}'}) as r:
+                    ok = r.status == 200 and 'error' not in await r.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'elapsed': elapsed,
+        'rps': concurrency / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'errors': sum(1 for r in results if not r[1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', default='100,500,1000')
+    parser.add_argument('--modes', default='flask-threaded,asgi')
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    with OpenFDAStub(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        print(f'OpenFDA stub latency: {args.latency * 1000:.0f} ms')
+        print(f"{'mode':<15} {'conc':>5} {'seconds':>8} {'req/s':>8} {'p50 s':>7} "
+              f"{'p99 s':>7} {'errors':>6} {'threads':>7} {'rss MB':>7}")
+
+        for port, mode in enumerate(args.modes.split(','), start=5601):
+            env = dict(os.environ,
+                       DRUG_PRICING_DB=os.path.join(tmp, f'{mode}.db'),
+                       OPENFDA_BASE_URL=stub.url,
+                       OPENFDA_MAX_RETRIES='0',
+                       OPENFDA_RATE_LIMIT='0',
+                       CLIENT_RATE_LIMIT='0')
+            proc = start_server(mode, port, env)
+            try:
+                for level in levels:
+                    sampler = Sampler(proc.pid)
+                    sampler.start()
+                    stats = asyncio.run(burst(f'http://127.0.0.1:{port}', level, f'{mode}-{level}'))
+                    sampler.stop.set()
+                    sampler.join()
+                    print(f"{mode:<15} {level:>5} {stats['elapsed']:>8.2f} {stats['rps']:>8.0f} "
+                          f"{stats['p50']:>7.2f} {stats['p99']:>7.2f} {stats['errors']:>6} "
+                          f"{sampler.peak_threads:>7} {sampler.peak_rss:>7.0f}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the second-tier cache backends on pricing grids
+
+Stores --pairs (drug, ZIP) pricing grids in each backend, then times
+single gets, 500-pair batch gets and 500-pair batch sets. The Redis
+backend runs against --redis-url when given, otherwise against fakeredis
+if it is installed (an in-process emulation, so its timings show client
+overhead, not network round-trips).
+
+Usage: python backend/benchmarks/bench_cache_backends.py [--pairs 5000] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache_backends import PRICING, MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend
+from db import ConnectionPool
+from pricing_engine import PricingEngine
+from schema import migrate
+
+BATCH = 500
+TTL = 86400
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def bench(backend, grids, rng):
+    pairs = list(grids)
+    for i in range(0, len(pairs), BATCH):
+        backend.set_many(PRICING, {pair: grids[pair] for pair in pairs[i:i + BATCH]}, TTL)
+
+    hit = per_call_us(lambda: backend.get(PRICING, rng.choice(pairs)), 2000)
+    miss = per_call_us(lambda: backend.get(PRICING, ('Missing', '00000')), 2000)
+    batch = [rng.choice(pairs) for _ in range(BATCH)]
+    get_many = per_call_us(lambda: backend.get_many(PRICING, batch), 20) / BATCH
+    set_many = per_call_us(lambda: backend.set_many(PRICING, {p: grids[p] for p in batch}, TTL), 10) / BATCH
+    print(f'{backend.name:<8} {hit:>9.1f} {miss:>9.1f} {get_many:>13.1f} {set_many:>13.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=5000)
+    parser.add_argument('--redis-url', help='Redis server to use instead of fakeredis')
+    args = parser.parse_args()
+
+    engine = PricingEngine(seed=1)
+    drugs = [f'Drug{i}' for i in range(max(1, args.pairs // 50))]
+    zips = [f'{10001 + i:05d}' for i in range(50)]
+    grid = engine.grid(drugs, zips)
+    grids = {(d, z): grid.records(i, j) for i, d in enumerate(drugs) for j, z in enumerate(zips)}
+    rng = random.Random(0)
+
+    print(f'{len(grids)} grids; microseconds per pair')
+    print(f"{'backend':<8} {'get hit':>9} {'get miss':>9} {'get_many/pair':>13} {'set_many/pair':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, 'bench.db'), max_connections=2)
+        with pool.connection() as conn:
+            migrate(conn)
+        bench(SQLiteCacheBackend(pool, TTL), grids, rng)
+        pool.close_all()
+
+    bench(MemoryCacheBackend(len(grids) * 2), grids, rng)
+
+    if args.redis_url:
+        redis_backend = RedisCacheBackend(args.redis_url, prefix='bench-cache-backends:')
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print('redis    skipped: pass --redis-url or install fakeredis')
+            return
+        redis_backend = RedisCacheBackend(client=fakeredis.FakeRedis(), prefix='bench-cache-backends:')
+    bench(redis_backend, grids, rng)
+    redis_backend.invalidate(PRICING, grids)
+    redis_backend.close()
+
+
+if __name__ == '__main__':
+    main()
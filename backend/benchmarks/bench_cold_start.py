@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark process cold start
+
+Times how long a fresh interpreter takes to import app and asgi (what a
+test process or a preloading master pays), then starts each server mode
+against a fresh database and times how long it takes to answer
+/api/health (accepting connections) and /api/ready (service created and
+caches warm). With WARMUP_DRUGS/WARMUP_ZIPS set in the environment the
+ready time includes warming them.
+
+Usage: python backend/benchmarks/bench_cold_start.py [--runs 5] [--servers flask-threaded,asgi,gunicorn]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+
+from bench_async_vs_threaded import SERVERS
+
+
+def import_ms(module, env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], cwd=BACKEND, env=env, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def wait_for(url, deadline):
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter()
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f'{url} did not answer')
+
+
+def start_times(mode, port, env):
+    """Seconds from spawning the server until /api/health and /api/ready answer 200"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(SERVERS[mode] + [str(port)], cwd=BACKEND, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 60
+        healthy = wait_for(f'http://127.0.0.1:{port}/api/health', deadline)
+        ready = wait_for(f'http://127.0.0.1:{port}/api/ready', deadline)
+        return (healthy - start) * 1000, (ready - start) * 1000
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--servers', default='flask-threaded,asgi,gunicorn')
+    parser.add_argument('--port', type=int, default=5091)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DRUG_PRICING_DB=os.path.join(tmp, 'bench.db'),
+                   OPENFDA_BASE_URL='http://127.0.0.1:9', WEB_CONCURRENCY='2')
+
+        baseline = import_ms('sys', env, args.runs)
+        print(f'interpreter start:  {baseline:7.1f} ms')
+        for module in ('app', 'asgi'):
+            print(f'import {module:<11} {import_ms(module, env, args.runs) - baseline:7.1f} ms '
+                  f'(median of {args.runs}, interpreter excluded)')
+
+        print(f"\n{'server':<16} {'health ms':>10} {'ready ms':>10}")
+        for n, mode in enumerate(args.servers.split(',')):
+            env['DRUG_PRICING_DB'] = os.path.join(tmp, f'{mode}.db')
+            healthy, ready = start_times(mode, args.port + n, env)
+            print(f'{mode:<16} {healthy:>10.0f} {ready:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
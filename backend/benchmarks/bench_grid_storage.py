@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark pricing grid storage: one row per cell vs packed grids
+
+Stores --grids (drug, region) grids of 3 plans x 3 pharmacies in two fresh
+databases: the schema as of version 9 (one pricing_cache row per cell and
+its four indexes, read back with that version's queries) and the current
+one (one PackedGrid blob per grid, through SQLiteCacheBackend). Reports the
+database size and insert time, then the time to fetch --lookups random
+grids as the API's list of dicts, one get at a time and in --batch sized
+get_many calls. Then one subprocess per layout holds --memory-grids grids
+the way the memory cache does (lists of dicts before, PackedGrids now) and
+reports the RSS they take.
+
+Usage: python backend/benchmarks/bench_grid_storage.py [--grids 1000000] [--memory-grids 200000] [--lookups 20000] [--batch 500]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+
+from cache_backends import PRICING, SQLiteCacheBackend
+from db import ConnectionPool
+from pricing_engine import PricingEngine
+from regions import load_regions
+from schema import MIGRATIONS
+
+ROW_LAYOUT_VERSION = 9  # last schema version with one pricing_cache row per cell
+DRUGS_PER_BLOCK = 500
+TTL = 86400
+
+
+def blocks(grids: int):
+    """PricingGrids of DRUGS_PER_BLOCK drugs x every region, up to ``grids`` grids in all"""
+    engine = PricingEngine(seed=1)
+    regions = load_regions().names[1:]
+    drugs = [f'Drug{i}' for i in range(-(-grids // len(regions)))]
+    remaining = grids
+    for start in range(0, len(drugs), DRUGS_PER_BLOCK):
+        grid = engine.grid(drugs[start:start + DRUGS_PER_BLOCK], regions)
+        pairs = [(d, r) for d in range(len(grid.drug_names)) for r in range(len(regions))]
+        yield grid, pairs[:remaining]
+        remaining -= len(pairs)
+        if remaining <= 0:
+            return
+
+
+def open_db(path: str, version: int) -> ConnectionPool:
+    pool = ConnectionPool(path, max_connections=2)
+    with pool.connection() as conn:
+        for step, _, upgrade in MIGRATIONS:
+            if step <= version:
+                upgrade(conn)
+        conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    return pool
+
+
+class RowLayout:
+    """pricing_cache as of ROW_LAYOUT_VERSION, with that version's queries"""
+
+    name = 'rows'
+
+    def __init__(self, path: str):
+        self.pool = open_db(path, ROW_LAYOUT_VERSION)
+
+    def store(self, grid, pairs):
+        rows = [(grid.drug_names[d], grid.zip_codes[r], record['plan_type'], record['pharmacy_type'],
+                 record['cost'], record['copay'], record['deductible'])
+                for d, r in pairs for record in grid.records(d, r)]
+        with self.pool.connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO pricing_cache
+                (drug_name, region, plan_type, pharmacy_type, cost, copay, deductible)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
+    @staticmethod
+    def _records(rows):
+        return [{'plan_type': plan_type, 'pharmacy_type': pharmacy_type, 'cost': cost,
+                 'copay': copay, 'deductible': deductible}
+                for plan_type, pharmacy_type, cost, copay, deductible, *_ in rows]
+
+    def get(self, key):
+        with self.pool.connection() as conn:
+            rows = conn.execute('''
+                SELECT plan_type, pharmacy_type, cost, copay, deductible, strftime('%s', created_at)
+                FROM pricing_cache
+                WHERE drug_name = ? AND region = ?
+                AND created_at > datetime('now', ?)
+            ''', (*key, f'-{TTL} seconds')).fetchall()
+        return self._records(rows)
+
+    def get_many(self, keys):
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'''
+                WITH wanted (drug_name, region) AS (VALUES {', '.join(['(?, ?)'] * len(keys))})
+                SELECT p.drug_name, p.region, plan_type, pharmacy_type, cost, copay, deductible,
+                       strftime('%s', created_at)
+                FROM wanted CROSS JOIN pricing_cache p
+                ON p.drug_name = wanted.drug_name AND p.region = wanted.region
+                AND created_at > datetime('now', ?)
+            ''', (*(key for pair in keys for key in pair), f'-{TTL} seconds')).fetchall()
+        grids = {}
+        for row in rows:
+            grids.setdefault(row[:2], []).append(row[2:])
+        return {pair: self._records(grid) for pair, grid in grids.items()}
+
+
+class PackedLayout:
+    """The current pricing_cache, through SQLiteCacheBackend"""
+
+    name = 'packed'
+
+    def __init__(self, path: str):
+        self.pool = open_db(path, MIGRATIONS[-1][0])
+        self.backend = SQLiteCacheBackend(self.pool, TTL)
+
+    def store(self, grid, pairs):
+        labels = self.backend.labels
+        self.backend.set_many(PRICING, {(grid.drug_names[d], grid.zip_codes[r]): grid.packed(d, r, labels)
+                                        for d, r in pairs})
+
+    def get(self, key):
+        packed, _ = self.backend.get(PRICING, key)
+        return packed.records()
+
+    def get_many(self, keys):
+        return {pair: packed.records()
+                for pair, (packed, _) in self.backend.get_many(PRICING, keys).items()}
+
+
+def db_mb(pool: ConnectionPool, path: str) -> float:
+    with pool.connection() as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(path) / 1e6
+
+
+def rss_kb() -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def hold(layout: str, grids: int):
+    """Subprocess body: keep ``grids`` grids in a dict and print the RSS they added, in KB"""
+    from packed_grid import LabelCodes
+
+    labels = LabelCodes()
+    held = {}
+    before = rss_kb()
+    for grid, pairs in blocks(grids):
+        for d, r in pairs:
+            key = (grid.drug_names[d], grid.zip_codes[r])
+            held[key] = grid.records(d, r) if layout == 'rows' else grid.packed(d, r, labels)
+    print(rss_kb() - before)
+
+
+def held_mb(layout: str, grids: int) -> float:
+    out = subprocess.run([sys.executable, __file__, '--hold', layout, '--memory-grids', str(grids)],
+                         check=True, capture_output=True, text=True).stdout
+    return int(out.split()[-1]) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grids', type=int, default=1000000)
+    parser.add_argument('--memory-grids', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--hold', choices=('rows', 'packed'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hold:
+        hold(args.hold, args.memory_grids)
+        return
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'{args.grids} grids; lookups are microseconds per grid, records built')
+        print(f"{'layout':<8} {'DB MB':>8} {'B/grid':>7} {'insert s':>9} {'get':>7} "
+              f"{f'get_many({args.batch})':>14}")
+        for layout_class in (RowLayout, PackedLayout):
+            path = os.path.join(tmp, f'{layout_class.name}.db')
+            layout = layout_class(path)
+            keys = []
+            start = time.perf_counter()
+            for grid, pairs in blocks(args.grids):
+                layout.store(grid, pairs)
+                keys.extend((grid.drug_names[d], grid.zip_codes[r]) for d, r in rng.sample(pairs, 20))
+            insert = time.perf_counter() - start
+            size = db_mb(layout.pool, path)
+
+            lookups = [rng.choice(keys) for _ in range(args.lookups)]
+            start = time.perf_counter()
+            for key in lookups:
+                layout.get(key)
+            get_us = (time.perf_counter() - start) / len(lookups) * 1e6
+
+            start = time.perf_counter()
+            found = 0
+            for i in range(0, len(lookups), args.batch):
+                found += len(layout.get_many(lookups[i:i + args.batch]))
+            batch_us = (time.perf_counter() - start) / len(lookups) * 1e6
+            assert found, 'no grids found'
+
+            layout.pool.close_all()
+            print(f'{layout.name:<8} {size:>8.1f} {size * 1e6 / args.grids:>7.0f} {insert:>9.1f} '
+                  f'{get_us:>7.1f} {batch_us:>14.1f}')
+
+    print(f'\n{args.memory_grids} grids held in memory')
+    print(f"{'layout':<8} {'RSS MB':>8} {'B/grid':>7}")
+    for layout in ('rows', 'packed'):
+        mb = held_mb(layout, args.memory_grids)
+        print(f'{layout:<8} {mb:>8.1f} {mb * 1024 * 1024 / args.memory_grids:>7.0f}')
+
+
+if __name__ == '__main__':
+    main()
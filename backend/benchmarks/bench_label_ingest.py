@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline OpenFDA label ingestion and catalog-first lookups
+
+Writes a synthetic drug-label-*.json.zip shaped like the OpenFDA download
+(each label padded with label text, as the real ones are), ingests it into
+a fresh database while tracking peak Python memory, then times drug search
+and generic alternatives against the local catalog. The upstream points at
+an unroutable address, so any lookup that fell through to OpenFDA would
+show up as an error.
+
+Usage: python backend/benchmarks/bench_label_ingest.py [--labels 50000] [--queries 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_name_index import synthetic_catalog
+
+LABEL_TEXT = 'Indications and usage: for the treatment of synthetic conditions. ' * 60
+
+
+def write_label_zip(path, catalog):
+    """Write catalog records as an OpenFDA-style zipped label download"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('drug-label-0001-of-0001.json', 'w') as raw:
+            raw.write(b'{"meta": {"results": {"total": %d}}, "results": [' % len(catalog))
+            for i, drug in enumerate(catalog):
+                label = {
+                    'id': f'label-{i}',
+                    'indications_and_usage': [LABEL_TEXT],
+                    'openfda': {
+                        'brand_name': [drug['brand_name']],
+                        'generic_name': [drug['generic_name']],
+                        'product_ndc': [drug['ndc']],
+                        'manufacturer_name': [drug['manufacturer']],
+                    },
+                }
+                raw.write((',' if i else '').encode() + json.dumps(label).encode())
+            raw.write(b']}')
+
+
+def time_calls(fn, args):
+    timings = []
+    errors = 0
+    for a in args:
+        start = time.perf_counter()
+        result = fn(a)
+        timings.append(time.perf_counter() - start)
+        errors += 'error' in result
+    timings.sort()
+    return sum(timings) / len(timings) * 1e6, timings[int(len(timings) * 0.99)] * 1e6, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--labels', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DRUG_PRICING_DB'] = os.path.join(tmp, 'bench.db')
+        os.environ['OPENFDA_BASE_URL'] = 'http://127.0.0.1:9'
+        os.environ['OPENFDA_MAX_RETRIES'] = '0'
+        from app import DrugPricingService
+        from db import ConnectionPool
+        from label_ingest import ingest_labels, iter_labels
+        from schema import migrate
+
+        catalog = synthetic_catalog(args.labels)
+        zip_path = os.path.join(tmp, 'drug-label-0001-of-0001.json.zip')
+        write_label_zip(zip_path, catalog)
+        with zipfile.ZipFile(zip_path) as archive:
+            unzipped = archive.infolist()[0].file_size
+        print(f'{args.labels} labels: {os.path.getsize(zip_path) / 1e6:.1f} MB zipped, '
+              f'{unzipped / 1e6:.1f} MB of JSON')
+
+        pool = ConnectionPool(os.environ['DRUG_PRICING_DB'], max_connections=1)
+        with pool.connection() as conn:
+            migrate(conn)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        stats = ingest_labels(pool, iter_labels(zip_path))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        pool.close_all()
+        print(f"ingest: {stats['drugs']} drugs in {elapsed:.2f}s "
+              f"({stats['labels'] / elapsed:.0f} labels/s), peak Python memory {peak / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        service = DrugPricingService()
+        print(f'service start with catalog: {time.perf_counter() - start:.2f}s '
+              f'({len(service.name_index)} drugs, {len(service.alternatives)} alternative names)')
+
+        rng = random.Random(7)
+        sample = rng.sample(catalog, min(args.queries, len(catalog)))
+        queries = [d['brand_name'] if i % 2 else d['generic_name'].lower()
+                   for i, d in enumerate(sample)]
+
+        # Clear the memory tier so every search resolves through the catalog
+        service.drug_cache.clear()
+        mean, p99, errors = time_calls(service.search_drug_by_name, queries)
+        print(f'search_drug_by_name:      mean {mean:7.1f} us  p99 {p99:7.1f} us  errors {errors}')
+        mean, p99, errors = time_calls(service.get_generic_alternatives, queries)
+        print(f'get_generic_alternatives: mean {mean:7.1f} us  p99 {p99:7.1f} us  errors {errors}')
+        print(f"upstream requests: {service.openfda.stats()['requests_sent']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Measure the per-request cost of metrics instrumentation
+
+Runs the same request loop through Flask's test client in two fresh
+processes, one with METRICS_ENABLED on and one with it off, and compares
+the mean time per request. The loop replays memory-cache pricing hits,
+the cheapest request the API serves, so instrumentation overhead is as
+large a share of the total as it will ever be.
+
+Usage: python backend/benchmarks/bench_metrics_overhead.py [--requests 20000]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+WORKER = '''
+import sys, time
+from app import app
+client = app.test_client()
+n = int(sys.argv[1])
+payloads = [{'drug_name': f'Drug-{i % 100}', 'zip_code': f'{10000 + i % 10}'} for i in range(n)]
+for payload in payloads[:1000]:
+    client.post('/api/get-pricing', json=payload)
+start = time.perf_counter()
+for payload in payloads:
+    client.post('/api/get-pricing', json=payload)
+print((time.perf_counter() - start) / n * 1e6)
+'''
+
+
+def run(enabled, requests, tmp):
+    env = dict(os.environ,
+               METRICS_ENABLED='true' if enabled else 'false',
+               DRUG_PRICING_DB=os.path.join(tmp, f'metrics-{enabled}.db'),
+               CLIENT_RATE_LIMIT='0')
+    out = subprocess.run([sys.executable, '-c', WORKER, str(requests)], cwd=BACKEND, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Best of several rounds to damp noise
+        off = min(run(False, args.requests, tmp) for _ in range(args.rounds))
+        on = min(run(True, args.requests, tmp) for _ in range(args.rounds))
+
+    print(f'metrics off: {off:7.1f} us/request')
+    print(f'metrics on:  {on:7.1f} us/request  (+{on - off:.1f} us, {(on - off) / off * 100:+.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
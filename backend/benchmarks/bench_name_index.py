@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark DrugNameIndex against the old ``LIKE '%name%'`` lookup
+
+Builds a synthetic catalog of drugs with brand and generic names, loads it
+into both an in-memory DrugNameIndex and a SQLite drugs table, then times
+exact, prefix and fuzzy lookups against a full-scan LIKE query.
+
+Usage: python backend/benchmarks/bench_name_index.py [--drugs 100000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from name_index import DrugNameIndex
+
+SYLLABLES = ['ab', 'ac', 'al', 'am', 'an', 'ar', 'at', 'ba', 'ce', 'ci', 'da', 'de',
+             'do', 'el', 'en', 'er', 'fa', 'fo', 'ga', 'in', 'ir', 'is', 'la', 'li',
+             'lo', 'ma', 'me', 'mi', 'mo', 'na', 'ne', 'no', 'ol', 'or', 'pa', 'pi',
+             'pro', 'ra', 're', 'ri', 'ro', 'sa', 'se', 'si', 'ta', 'te', 'ti', 'to',
+             'tra', 'va', 'vi', 'xa', 'za', 'zo']
+SUFFIXES = ['statin', 'pril', 'sartan', 'olol', 'formin', 'azole', 'cillin',
+            'mycin', 'dipine', 'tidine', 'vir', 'mab', 'prazole', 'oxetine']
+
+
+def synthetic_catalog(n, seed=42):
+    """Generate n unique drug records with brand and generic names"""
+    rng = random.Random(seed)
+    seen = set()
+    catalog = []
+    while len(catalog) < n:
+        generic = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(SUFFIXES)
+        brand = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        if brand in seen:
+            continue
+        seen.add(brand)
+        catalog.append({
+            'name': brand,
+            'generic_name': f'{generic.upper()} CALCIUM' if rng.random() < 0.3 else generic.upper(),
+            'brand_name': brand.upper(),
+            'ndc': f'{rng.randint(0, 99999):05d}-{rng.randint(0, 999):03d}',
+            'manufacturer': 'Synthetic Labs',
+        })
+    return catalog
+
+
+def typo(name, rng):
+    """Introduce a single-character deletion or substitution"""
+    i = rng.randrange(1, len(name) - 1)
+    if rng.random() < 0.5:
+        return name[:i] + name[i + 1:]
+    return name[:i] + rng.choice('aeiou') + name[i + 1:]
+
+
+def time_queries(fn, queries):
+    timings = []
+    hits = 0
+    for q in queries:
+        start = time.perf_counter()
+        result = fn(q)
+        timings.append(time.perf_counter() - start)
+        hits += bool(result)
+    timings.sort()
+    return {
+        'mean_us': sum(timings) / len(timings) * 1e6,
+        'p99_us': timings[int(len(timings) * 0.99)] * 1e6,
+        'hit_rate': hits / len(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--drugs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--like-queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    catalog = synthetic_catalog(args.drugs)
+
+    start = time.perf_counter()
+    index = DrugNameIndex()
+    index.add_many(catalog)
+    index.prepare()
+    print(f'Indexed {len(index)} drugs in {time.perf_counter() - start:.2f}s')
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE drugs (id INTEGER PRIMARY KEY, name TEXT UNIQUE, '
+                 'generic_name TEXT, brand_name TEXT, ndc TEXT, manufacturer TEXT)')
+    conn.executemany('INSERT INTO drugs (name, generic_name, brand_name, ndc, manufacturer) '
+                     'VALUES (:name, :generic_name, :brand_name, :ndc, :manufacturer)', catalog)
+
+    sample = [rng.choice(catalog) for _ in range(args.queries)]
+    exact_queries = [d['name'] if rng.random() < 0.5 else d['generic_name'].lower() for d in sample]
+    prefix_queries = [d['name'][:4] for d in sample]
+    fuzzy_queries = [typo(d['name'].lower(), rng) for d in sample]
+
+    def like(q):
+        return conn.execute('SELECT * FROM drugs WHERE name LIKE ?', (f'%{q}%',)).fetchone()
+
+    results = [
+        ('exact', time_queries(index.exact, exact_queries)),
+        ('prefix', time_queries(lambda q: index.prefix(q, 10), prefix_queries)),
+        ('fuzzy', time_queries(lambda q: index.fuzzy(q, 10), fuzzy_queries)),
+        ('search', time_queries(lambda q: index.search(q, 10), fuzzy_queries)),
+        ('sqlite LIKE', time_queries(like, exact_queries[:args.like_queries])),
+    ]
+
+    print(f"{'lookup':<12} {'mean us':>10} {'p99 us':>10} {'hit rate':>9}")
+    for name, stats in results:
+        print(f"{name:<12} {stats['mean_us']:>10.1f} {stats['p99_us']:>10.1f} {stats['hit_rate']:>9.2%}")
+
+
+if __name__ == '__main__':
+    main()
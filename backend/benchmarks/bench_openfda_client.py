@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Exercise OpenFDAClient against the local OpenFDA stub
+
+Four scenarios, each against a fresh stub:
+
+1. keep-alive: sequential calls through the pooled session vs bare requests.get
+2. coalescing: N threads miss on the same drug at once; the stub should see one call
+3. retries: the stub fails the first calls with 503/429; the client should recover
+4. quota: a batch job saturates the scheduler while interactive calls keep
+   arriving; interactive calls should wait little, and a burst beyond the
+   queue timeout should be refused rather than queued
+
+Usage: python backend/benchmarks/bench_openfda_client.py [--calls 200] [--threads 50]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from openfda import OpenFDAClient
+from openfda_stub import OpenFDAStub
+from rate_limit import BATCH, UpstreamSaturated, UpstreamScheduler, upstream_priority
+
+PATH = '/drug/label.json'
+
+
+def params_for(name):
+    return {'search': f'openfda.generic_name:"{name}"', 'limit': 1}
+
+
+def bench_keep_alive(calls):
+    with OpenFDAStub() as stub:
+        start = time.perf_counter()
+        for i in range(calls):
+            requests.get(f'{stub.url}{PATH}', params=params_for(f'drug{i}'), timeout=10)
+        bare = (time.perf_counter() - start) / calls
+
+        client = OpenFDAClient(stub.url)
+        start = time.perf_counter()
+        for i in range(calls):
+            client.get(PATH, params_for(f'drug{i}'))
+        pooled = (time.perf_counter() - start) / calls
+        client.close()
+
+    print(f'keep-alive:  requests.get {bare * 1000:.2f} ms/call, '
+          f'pooled session {pooled * 1000:.2f} ms/call ({bare / pooled:.1f}x)')
+
+
+def bench_coalescing(threads):
+    with OpenFDAStub(latency=0.2) as stub:
+        client = OpenFDAClient(stub.url)
+        barrier = threading.Barrier(threads)
+        statuses = []
+
+        def worker():
+            barrier.wait()
+            statuses.append(client.get(PATH, params_for('Lipitor')).status_code)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        print(f'coalescing:  {threads} concurrent misses -> {stub.total} upstream call(s), '
+              f'{statuses.count(200)}/{threads} callers got 200, '
+              f'{client.stats()["coalesced"]} coalesced')
+        client.close()
+
+
+def bench_retries():
+    for status in (503, 429):
+        with OpenFDAStub(fail_first=2, error_status=status) as stub:
+            client = OpenFDAClient(stub.url, backoff=0.05)
+            start = time.perf_counter()
+            response = client.get(PATH, params_for('Metformin'))
+            elapsed = time.perf_counter() - start
+            print(f'retries:     first 2 calls fail with {status} -> final status '
+                  f'{response.status_code} after {client.stats()["retries"]} retries '
+                  f'in {elapsed * 1000:.0f} ms')
+            client.close()
+
+    with OpenFDAStub(error_rate=1.0) as stub:
+        client = OpenFDAClient(stub.url, backoff=0.05, max_retries=3)
+        response = client.get(PATH, params_for('Metformin'))
+        print(f'retries:     upstream always failing -> status {response.status_code} '
+              f'after {stub.total} attempts, {client.stats()["failures"]} failure(s) recorded')
+        client.close()
+
+
+def bench_quota(rate, seconds=3.0):
+    with OpenFDAStub() as stub:
+        scheduler = UpstreamScheduler(rate, burst=int(rate), interactive_timeout=1.0)
+        client = OpenFDAClient(stub.url, scheduler=scheduler)
+        stop = threading.Event()
+        batch_calls = []
+
+        def batch():
+            with upstream_priority(BATCH):
+                i = 0
+                while not stop.is_set():
+                    client.get(PATH, params_for(f'batch{i}'))
+                    batch_calls.append(i)
+                    i += 1
+
+        batch_thread = threading.Thread(target=batch)
+        batch_thread.start()
+        waits = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get(PATH, params_for(f'user{len(waits)}'))
+            waits.append(time.perf_counter() - start)
+            time.sleep(0.25)
+        stop.set()
+        batch_thread.join()
+
+        waits.sort()
+        print(f'quota:       {rate:g}/s, batch job running: {len(batch_calls)} batch calls, '
+              f'{len(waits)} interactive calls, wait p50 {waits[len(waits) // 2] * 1000:.0f} ms '
+              f'max {waits[-1] * 1000:.0f} ms')
+
+        burst = int(rate * 3)
+        refused = []
+
+        def user(i):
+            try:
+                client.get(PATH, params_for(f'burst{i}'))
+            except UpstreamSaturated:
+                refused.append(i)
+
+        users = [threading.Thread(target=user, args=(i,)) for i in range(burst)]
+        for u in users:
+            u.start()
+        for u in users:
+            u.join()
+        refused = len(refused)
+        print(f'quota:       {burst} concurrent interactive calls -> {burst - refused} admitted, '
+              f'{refused} refused with UpstreamSaturated; stub saw {stub.total} calls '
+              f'in total ({scheduler.stats()})')
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10, help='scheduler calls per second')
+    args = parser.parse_args()
+
+    bench_keep_alive(args.calls)
+    bench_coalescing(args.threads)
+    bench_retries()
+    bench_quota(args.rate)
+
+
+if __name__ == '__main__':
+    main()
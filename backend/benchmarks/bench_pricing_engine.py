@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized PricingEngine against the per-dict pricing loop
+
+The baseline is the original _generate_sample_pricing: nested Python loops
+over plans and pharmacies with a random.uniform call per cell. The engine
+prices the same drug x ZIP grid in array operations, both as raw arrays
+and converted back to the API's list-of-dicts shape.
+
+Usage: python backend/benchmarks/bench_pricing_engine.py [--drugs 10000] [--zips 1,10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pricing_engine import PricingEngine
+
+
+def legacy_pricing(drug_name, zip_code):
+    """The original per-dict implementation, kept here as the baseline"""
+    plan_types = ['Medicare Part D Standard', 'Medicare Advantage PPO', 'Medicare Advantage HMO']
+    pharmacy_types = ['Retail Pharmacy', 'Mail Order', 'Preferred Pharmacy']
+
+    pricing_data = []
+    base_cost = random.uniform(50, 300)
+
+    for plan in plan_types:
+        for pharmacy in pharmacy_types:
+            multiplier = random.uniform(0.7, 1.3)
+            cost = round(base_cost * multiplier, 2)
+
+            pricing_data.append({
+                'plan_type': plan,
+                'pharmacy_type': pharmacy,
+                'cost': cost,
+                'copay': round(cost * 0.2, 2),
+                'deductible': round(cost * 0.8, 2)
+            })
+
+    return pricing_data
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--drugs', type=int, default=10000)
+    parser.add_argument('--zips', default='1,10')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    drugs = [f'Drug{i:06d}' for i in range(args.drugs)]
+    engine = PricingEngine(seed=args.seed)
+
+    # Same seed, same inputs -> identical prices
+    check = PricingEngine(seed=args.seed).grid(drugs[:100], ['10001'])
+    assert (check.cost == engine.grid(drugs[:100], ['10001']).cost).all()
+
+    print(f"{'grid':>14} {'path':<18} {'seconds':>9} {'grids/s':>12} {'speedup':>8}")
+    for n_zips in (int(z) for z in args.zips.split(',')):
+        zips = [f'{10000 + z:05d}' for z in range(n_zips)]
+        n_grids = len(drugs) * len(zips)
+
+        legacy_s, _ = timed(lambda: [legacy_pricing(d, z) for d in drugs for z in zips])
+        arrays_s, grid = timed(lambda: engine.grid(drugs, zips))
+
+        def as_dicts():
+            g = engine.grid(drugs, zips)
+            return [g.records(d, z) for d in range(len(drugs)) for z in range(len(zips))]
+        dicts_s, _ = timed(as_dicts)
+
+        label = f'{len(drugs)}x{len(zips)}'
+        for path, seconds in (('legacy per-dict', legacy_s),
+                              ('engine arrays', arrays_s),
+                              ('engine + dicts', dicts_s)):
+            print(f'{label:>14} {path:<18} {seconds:>9.3f} {n_grids / seconds:>12.0f} '
+                  f'{legacy_s / seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
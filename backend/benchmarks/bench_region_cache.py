@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark pricing cache hit rate and size keyed by region vs by ZIP
+
+Replays --requests get_pricing_by_zip calls, drugs drawn Zipf-like from
+--drugs names and ZIPs uniformly from those the region table covers,
+through two services on fresh databases: one keyed by pricing region (the
+default) and one with an empty region table, which keys every ZIP
+separately as before. Reports the hit rate over all requests and over the
+--top most requested drugs, the grids stored and the database size.
+
+Usage: python backend/benchmarks/bench_region_cache.py [--requests 20000] [--drugs 200] [--top 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def replay(service, requests):
+    """Hit rates (all requests, per drug) of a request stream; a miss submits a pricing write"""
+    misses = Counter()
+    start = time.perf_counter()
+    for drug, zip_code in requests:
+        submitted = service.writer.submitted
+        service.get_pricing_by_zip(drug, zip_code)
+        if service.writer.submitted != submitted:
+            misses[drug] += 1
+    return misses, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--drugs', type=int, default=200)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['CACHE_REFRESH_ENABLED'] = 'false'
+        os.environ['PRICING_SEED'] = '1'
+        from app import DrugPricingService
+        from regions import RegionIndex, load_regions
+
+        rng = random.Random(1)
+        table = load_regions()
+        covered = [z for z in range(100000) if table.region(f'{z:05d}') != f'{z:05d}']
+        drugs = [f'Drug{i}' for i in range(args.drugs)]
+        weights = [1 / (rank + 1) for rank in range(args.drugs)]
+        requests = [(rng.choices(drugs, weights)[0], f'{rng.choice(covered):05d}')
+                    for _ in range(args.requests)]
+        counts = Counter(drug for drug, _ in requests)
+        top = {drug for drug, _ in counts.most_common(args.top)}
+        top_requests = sum(counts[drug] for drug in top)
+
+        print(f"{'keyed by':<9} {'hit %':>7} {f'top-{args.top} hit %':>12} {'grids':>8} "
+              f"{'DB MB':>7} {'req/s':>8}")
+        for label, regions in (('zip', RegionIndex()), ('region', table)):
+            db_path = os.path.join(tmp, f'{label}.db')
+            service = DrugPricingService(db_path=db_path)
+            service.regions = regions
+            misses, elapsed = replay(service, requests)
+            with service.pool.connection() as conn:
+                grids = conn.execute('SELECT COUNT(*) FROM (SELECT DISTINCT drug_name, region '
+                                     'FROM pricing_cache)').fetchone()[0]
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            service.pool.close_all()
+            hit = 1 - sum(misses.values()) / len(requests)
+            top_hit = 1 - sum(misses[drug] for drug in top) / top_requests
+            print(f'{label:<9} {hit * 100:>7.2f} {top_hit * 100:>12.2f} {grids:>8} '
+                  f'{os.path.getsize(db_path) / 1e6:>7.2f} {len(requests) / elapsed:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark response serialization, shapes and compression
+
+Times encoding one /api/get-pricing result with Flask's jsonify against
+responses.encode_json (orjson when installed, else compact json), and
+compares payload bytes for the record and columnar shapes with and
+without gzip, for a single pricing grid and for a bulk-pricing stream.
+
+Usage: python backend/benchmarks/bench_response_encoding.py [--calls 20000] [--pairs 10000]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, jsonify
+
+from pricing_engine import PricingEngine
+from responses import columnar_pricing, encode_json, ndjson_chunks, orjson
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--pairs', type=int, default=10000)
+    args = parser.parse_args()
+
+    engine = PricingEngine(seed=1)
+    result = {'pricing': engine.records('Lipitor', '10001')}
+    columnar = {'pricing': columnar_pricing(result['pricing'], engine.plan_names,
+                                            engine.pharmacy_names)}
+
+    app = Flask(__name__)
+    with app.test_request_context():
+        jsonify_us = per_call_us(lambda: jsonify(result).get_data(), args.calls)
+    encode_us = per_call_us(lambda: encode_json(result, cacheable=True), args.calls)
+    print(f"jsonify:      {jsonify_us:6.1f} us/response")
+    print(f"encode_json:  {encode_us:6.1f} us/response  ({'orjson' if orjson else 'json'}, with ETag)")
+
+    print('\nget-pricing bytes:     raw   gzip')
+    for name, data in (('records', result), ('columnar', columnar)):
+        _, _, body = encode_json(data, compression=False)
+        print(f'  {name:<10} {len(body):>10} {len(gzip.compress(body)):>6}')
+
+    drugs = [f'Drug{i}' for i in range(max(1, args.pairs // 100))]
+    zips = [f'{10001 + i:05d}' for i in range(100)]
+    grid = engine.grid(drugs, zips)
+    records = [{'drug_name': d, 'zip_code': z, 'pricing': grid.records(i, j)}
+               for i, d in enumerate(drugs) for j, z in enumerate(zips)]
+
+    print(f'\nbulk-pricing, {len(records)} pairs:  MB raw  MB gzip  encode s')
+    for name, is_columnar in (('records', False), ('columnar', True)):
+        start = time.perf_counter()
+        body = b''.join(ndjson_chunks(records, is_columnar, engine.plan_names, engine.pharmacy_names))
+        elapsed = time.perf_counter() - start
+        print(f'  {name:<10} {len(body) / 1e6:>16.2f} {len(gzip.compress(body)) / 1e6:>8.2f} '
+              f'{elapsed:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the DrugPricingService hot paths
+
+Times search_drug_by_name, get_pricing_by_zip and _generate_sample_pricing
+directly on a service backed by a fresh database and a local OpenFDA stub,
+one case per cache tier each call can be served from. Each case reports
+the mean and p50/p99 per call (best of --rounds) and the results are
+saved as JSON next to the load-suite results, so both can be compared
+across releases.
+
+Usage: python backend/benchmarks/bench_service_micro.py [--calls 5000] [--rounds 3]
+           [--output results/micro.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from load_suite import environment, percentile, save_results
+from openfda_stub import OpenFDAStub
+
+
+def measure(fn, args, rounds):
+    """Per-call timings of fn over args; the fastest round wins"""
+    best = None
+    for _ in range(rounds):
+        timings = []
+        for a in args:
+            start = time.perf_counter()
+            fn(*a)
+            timings.append(time.perf_counter() - start)
+        if best is None or sum(timings) < sum(best):
+            best = timings
+    return {
+        'calls': len(best),
+        'mean_us': round(sum(best) / len(best) * 1e6, 2),
+        'p50_us': round(percentile(best, 50) * 1e6, 2),
+        'p99_us': round(percentile(best, 99) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output', help='result file (default: results/micro-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    with OpenFDAStub() as stub, tempfile.TemporaryDirectory() as tmp:
+        os.environ['DRUG_PRICING_DB'] = os.path.join(tmp, 'micro.db')
+        os.environ['OPENFDA_BASE_URL'] = stub.url
+        os.environ['PRICING_SEED'] = '1'
+        os.environ['OPENFDA_RATE_LIMIT'] = '0'
+        from app import DrugPricingService
+        service = DrugPricingService()
+        service.writer.start()  # as get_service() does; misses queue their writes
+
+        drugs = [f'Microdrug{i}' for i in range(100)]
+        pairs = [(drugs[i % len(drugs)], f'{10001 + i:05d}') for i in range(args.calls)]
+        for drug in drugs:
+            service.search_drug_by_name(drug)
+        for drug, zip_code in pairs:
+            service.get_pricing_by_zip(drug, zip_code)
+        service.writer.flush()
+
+        def sqlite_pricing(drug, zip_code):
+            service.pricing_memory_cache.clear()
+            return service.get_pricing_by_zip(drug, zip_code)
+
+        def index_search(drug):
+            service.drug_cache.clear()
+            return service.search_drug_by_name(drug)
+
+        cases = {
+            # Both tiers are cleared per call in the cold cases, which adds
+            # a dict clear (well under a microsecond) to each timing
+            'search_drug_by_name/memory_hit': (service.search_drug_by_name,
+                                               [(drugs[i % len(drugs)],) for i in range(args.calls)]),
+            'search_drug_by_name/index_hit': (index_search,
+                                              [(drugs[i % len(drugs)],) for i in range(args.calls)]),
+            'get_pricing_by_zip/memory_hit': (service.get_pricing_by_zip, pairs),
+            'get_pricing_by_zip/sqlite_hit': (sqlite_pricing, pairs),
+            # Pricing is cached per region, so only a new drug is sure to miss
+            'get_pricing_by_zip/miss': (service.get_pricing_by_zip,
+                                        [(f'{drug}-{i}', zip_code) for i, (drug, zip_code) in enumerate(pairs)]),
+            '_generate_sample_pricing': (service._generate_sample_pricing, pairs),
+        }
+
+        results = {'environment': environment(),
+                   'config': {'calls': args.calls, 'rounds': args.rounds},
+                   'cases': {}}
+        for name, (fn, calls) in cases.items():
+            # A miss only misses once, so it gets a single round
+            rounds = 1 if name.endswith('/miss') else args.rounds
+            results['cases'][name] = stats = measure(fn, calls, rounds)
+            service.writer.flush()  # so queued writes don't run under the next case
+            print(f"{name:<34} mean {stats['mean_us']:8.1f} us  p50 {stats['p50_us']:8.1f} us  "
+                  f"p99 {stats['p99_us']:8.1f} us")
+        service.writer.stop()
+        service.pool.close_all()
+
+    save_results(results, args.output, 'micro')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['cases']
+        print(f'\nCompared with {args.compare}:')
+        for name, stats in results['cases'].items():
+            if name in baseline:
+                change = (stats['mean_us'] - baseline[name]['mean_us']) / baseline[name]['mean_us'] * 100
+                print(f'  {name:<34} mean {change:+6.1f}%')
+
+
+if __name__ == '__main__':
+    main()
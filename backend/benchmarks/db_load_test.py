@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Multi-threaded SQLite load test for DrugPricingService
+
+Seeds a scratch database with cached pricing for ZIPs in SEED_ZIPS
+different pricing regions, then hammers SQLite reads of those grids from
+1..N reader threads while a writer thread keeps inserting fresh cache
+entries. Readers go through service.store, the SQLite tier, so the memory
+cache in front of it doesn't absorb them. Each thread count is run twice:
+once with a single pooled connection (the old shared-connection behaviour)
+and once with one connection per thread.
+
+Usage: python backend/benchmarks/db_load_test.py [--duration 3] [--threads 1,2,4,8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SEED_DRUGS = 50
+SEED_ZIPS = 20
+WRITE_INTERVAL = 0.01
+
+
+def make_service(db_path, pool_size):
+    from app import DrugPricingService
+    return DrugPricingService(db_path=db_path, pool_size=pool_size)
+
+
+def seed_zips(service):
+    """The first ZIP of each of the first SEED_ZIPS pricing regions"""
+    zips = {}
+    for z in range(100000):
+        zip_code = f'{z:05d}'
+        region = service.regions.region(zip_code)
+        if region != zip_code:
+            zips.setdefault(region, zip_code)
+            if len(zips) == SEED_ZIPS:
+                break
+    return list(zips.values())
+
+
+def seed(service):
+    """Populate the pricing cache with SEED_DRUGS x SEED_ZIPS grids; returns their (drug, region) keys"""
+    from name_index import normalize_name
+
+    keys = []
+    for d in range(SEED_DRUGS):
+        for zip_code in seed_zips(service):
+            drug = f'Drug{d:04d}'
+            # The writer isn't started, so each miss is stored before returning
+            service.get_pricing_by_zip(drug, zip_code)
+            keys.append((normalize_name(drug), service.regions.region(zip_code)))
+    return keys
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(service, keys, threads, duration, with_writer=True):
+    """Run reader threads (plus an optional writer) for ``duration`` seconds"""
+    from cache_backends import PRICING
+
+    stop = threading.Event()
+    latencies = [[] for _ in range(threads)]
+    errors = []
+
+    def reader(idx):
+        rng = random.Random(idx)
+        bucket = latencies[idx]
+        while not stop.is_set():
+            key = rng.choice(keys)
+            start = time.perf_counter()
+            entry = service.store.get(PRICING, key)
+            bucket.append(time.perf_counter() - start)
+            if entry is None:
+                errors.append(key)
+
+    writes = [0]
+
+    def writer():
+        # Each miss generates and commits a full pricing grid; pace the
+        # bursts so both pool sizes see the same write load.
+        while not stop.wait(WRITE_INTERVAL):
+            service.get_pricing_by_zip(f'WriteDrug{writes[0]}', '99999')
+            writes[0] += 1
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    if with_writer:
+        workers.append(threading.Thread(target=writer))
+
+    for w in workers:
+        w.start()
+    time.sleep(duration)
+    stop.set()
+    for w in workers:
+        w.join()
+
+    all_latencies = [x for bucket in latencies for x in bucket]
+    return {
+        'reads': len(all_latencies),
+        'reads_per_sec': len(all_latencies) / duration,
+        'p50_ms': percentile(all_latencies, 50) * 1000,
+        'p99_ms': percentile(all_latencies, 99) * 1000,
+        'writes': writes[0],
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--no-writer', action='store_true')
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'load_test.db')
+        keys = seed(make_service(db_path, pool_size=1))
+
+        print(f"{'threads':>7} {'pool':>5} {'reads/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'writes':>6} {'errors':>6}")
+        for threads in thread_counts:
+            for pool_size in (1, threads + 1):
+                service = make_service(db_path, pool_size=pool_size)
+                stats = run(service, keys, threads, args.duration,
+                            with_writer=not args.no_writer)
+                service.pool.close_all()
+                print(f"{threads:>7} {pool_size:>5} {stats['reads_per_sec']:>10.0f} "
+                      f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['writes']:>6} {stats['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Reproducible load test for the Drug Pricing Transparency API
+
+Replays a seeded traffic mix against the API with a stubbed OpenFDA and
+reports throughput, p50/p95/p99 latency and errors per endpoint at each
+concurrency level, plus process memory. Results are written as JSON so
+runs can be compared across releases (``--compare baseline.json``).
+
+Targets:
+  inprocess  Flask test client in this process (no HTTP stack)
+  flask      threaded Flask server in a subprocess
+  asgi       uvicorn ASGI server in a subprocess
+  gunicorn   production gunicorn server with --workers processes
+
+Traffic mixes (built in, or ``--mix-file`` with the same keys):
+  default    80% of drug lookups hit 20 hot drugs, Zipf-distributed ZIPs
+  hot        almost every request is a cache hit
+  cold       every drug is new, so every lookup misses every cache
+
+The hot drugs and the busiest ZIPs of the mix are warmed before the
+first level, so the hit ratio follows from the mix rather than from the
+order in which levels run. Cold drug names include a per-run nonce.
+
+Usage: python backend/benchmarks/load_suite.py [--target inprocess] [--mix default]
+           [--concurrency 1,8,32] [--duration 10] [--output results/load.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(BENCHMARKS, '..')
+RESULTS_DIR = os.path.join(BENCHMARKS, 'results')
+sys.path.insert(0, BACKEND)
+
+from bench_async_vs_threaded import proc_status, start_server
+from openfda_stub import OpenFDAStub
+
+MIXES = {
+    'default': {
+        'endpoints': {'get-pricing': 0.5, 'search-drug': 0.2, 'get-alternatives': 0.1,
+                      'drug-report': 0.1, 'suggest-drugs': 0.1},
+        'hot_drugs': 20,
+        'hot_fraction': 0.8,    # share of requests for one of the hot drugs
+        'zips': 500,
+        'zip_skew': 1.1,        # Zipf exponent; 0 for uniform
+        'warm_zips': 50,        # busiest ZIPs priced for every hot drug before the run
+    },
+    'hot': {
+        'endpoints': {'get-pricing': 0.6, 'search-drug': 0.2, 'get-alternatives': 0.1,
+                      'drug-report': 0.1},
+        'hot_drugs': 20,
+        'hot_fraction': 1.0,
+        'zips': 20,
+        'zip_skew': 0.0,
+        'warm_zips': 20,
+    },
+    'cold': {
+        'endpoints': {'get-pricing': 0.5, 'search-drug': 0.3, 'get-alternatives': 0.2},
+        'hot_drugs': 0,
+        'hot_fraction': 0.0,
+        'zips': 40000,
+        'zip_skew': 0.0,
+        'warm_zips': 0,
+    },
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def rss_mb(pid):
+    """RSS of a process plus its direct children, e.g. gunicorn workers
+
+    Pages a forked worker still shares with its parent count once per process.
+    """
+    total = proc_status(pid)[1]
+    if pid != 'self':
+        try:
+            with open(f'/proc/{pid}/task/{pid}/children') as f:
+                total += sum(proc_status(child)[1] for child in f.read().split())
+        except OSError:
+            pass
+    return total
+
+
+def environment():
+    """Identify the code and machine a result came from"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_results(results, output, prefix):
+    """Write results as JSON, by default to results/<prefix>-<timestamp>.json"""
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{prefix}-{stamp}.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nResults written to {output}')
+    return output
+
+
+class TrafficMix:
+    """Seeded generator of (endpoint, payload) requests for a mix"""
+
+    def __init__(self, mix, nonce):
+        self.mix = mix
+        self.nonce = nonce
+        self.endpoints = list(mix['endpoints'])
+        self.endpoint_weights = [mix['endpoints'][e] for e in self.endpoints]
+        self.hot_drugs = [f'Hotdrug{i:03d}' for i in range(mix['hot_drugs'])]
+        self.zips = [f'{10001 + i:05d}' for i in range(mix['zips'])]
+        skew = mix['zip_skew']
+        self.zip_weights = [1 / (rank + 1) ** skew for rank in range(len(self.zips))]
+
+    def drug(self, rng):
+        if self.hot_drugs and rng.random() < self.mix['hot_fraction']:
+            return rng.choice(self.hot_drugs)
+        return f'Colddrug{self.nonce}x{rng.randrange(1 << 30)}'
+
+    def request(self, rng):
+        endpoint = rng.choices(self.endpoints, self.endpoint_weights)[0]
+        drug = self.drug(rng)
+        zip_code = rng.choices(self.zips, self.zip_weights)[0]
+        if endpoint in ('get-pricing', 'drug-report'):
+            return endpoint, {'drug_name': drug, 'zip_code': zip_code}
+        if endpoint == 'suggest-drugs':
+            return endpoint, {'query': drug[:rng.randint(3, len(drug))], 'limit': 10}
+        return endpoint, {'drug_name': drug}
+
+    def warm_requests(self):
+        for drug in self.hot_drugs:
+            yield 'search-drug', {'drug_name': drug}
+            yield 'get-alternatives', {'drug_name': drug}
+            for zip_code in self.zips[:self.mix['warm_zips']]:
+                yield 'get-pricing', {'drug_name': drug, 'zip_code': zip_code}
+
+
+class InProcessTarget:
+    """Calls the Flask app through its test client, one client per worker"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self.pid = 'self'
+
+    def client(self):
+        test_client = self.app.test_client()
+
+        def call(method, endpoint, payload=None):
+            if method == 'GET':
+                response = test_client.get(f'/api/{endpoint}')
+            else:
+                response = test_client.post(f'/api/{endpoint}', json=payload)
+            return response.status_code, response.get_json(silent=True)
+        return call
+
+    def close(self):
+        pass
+
+
+class ServerTarget:
+    """Starts the API in a subprocess and calls it over HTTP, one session per worker"""
+
+    def __init__(self, name, env, port=5651):
+        self.name = name
+        self.url = f'http://127.0.0.1:{port}/api'
+        self.proc = start_server('flask-threaded' if name == 'flask' else name, port, env)
+        self.pid = self.proc.pid
+
+    def client(self):
+        import requests
+        session = requests.Session()
+
+        def call(method, endpoint, payload=None):
+            response = session.request(method, f'{self.url}/{endpoint}', json=payload, timeout=60)
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, None
+        return call
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def run_level(target, mix, concurrency, duration, seed):
+    """Closed-loop load: ``concurrency`` workers issue requests back to back"""
+    stop = threading.Event()
+    samples = [[] for _ in range(concurrency)]   # (endpoint, seconds, ok)
+    peak_rss = [rss_mb(target.pid)]
+
+    def worker(idx):
+        rng = random.Random(seed * 1000003 + idx)
+        call = target.client()
+        bucket = samples[idx]
+        while not stop.is_set():
+            endpoint, payload = mix.request(rng)
+            start = time.perf_counter()
+            try:
+                status, body = call('POST', endpoint, payload)
+                ok = status == 200 and not (isinstance(body, dict) and 'error' in body
+                                            and endpoint != 'search-drug')
+            except Exception:
+                ok = False
+            bucket.append((endpoint, time.perf_counter() - start, ok))
+
+    def sample_memory():
+        while not stop.wait(0.1):
+            peak_rss[0] = max(peak_rss[0], rss_mb(target.pid))
+
+    rss_start = rss_mb(target.pid)
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    threads.append(threading.Thread(target=sample_memory, daemon=True))
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    by_endpoint = {}
+    for bucket in samples:
+        for endpoint, seconds, ok in bucket:
+            entry = by_endpoint.setdefault(endpoint, {'latencies': [], 'errors': 0})
+            entry['latencies'].append(seconds)
+            entry['errors'] += not ok
+
+    def summarize(latencies, errors):
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        }
+
+    all_latencies = [s for e in by_endpoint.values() for s in e['latencies']]
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'total': summarize(all_latencies, sum(e['errors'] for e in by_endpoint.values())),
+        'endpoints': {name: summarize(e['latencies'], e['errors'])
+                      for name, e in sorted(by_endpoint.items())},
+        'memory': {'rss_start_mb': round(rss_start, 1), 'rss_peak_mb': round(peak_rss[0], 1)},
+    }
+
+
+def memory_per_request(target, mix, seed, samples=200):
+    """Peak Python allocation per request, by endpoint (in-process target only)"""
+    rng = random.Random(seed)
+    call = target.client()
+    results = {}
+    tracemalloc.start()
+    try:
+        for endpoint in mix.endpoints:
+            peaks = []
+            while len(peaks) < samples:
+                name, payload = mix.request(rng)
+                if name != endpoint:
+                    continue
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                call('POST', name, payload)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            results[endpoint] = {'mean_kb': round(sum(peaks) / len(peaks) / 1024, 1),
+                                 'p99_kb': round(percentile(peaks, 99) / 1024, 1)}
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def cache_counters(call):
+    """Memory-cache (hits, misses) and upstream requests from /api/cache-stats"""
+    status, stats = call('GET', 'cache-stats')
+    if status != 200 or not stats:
+        return {}
+    counters = {name: (stats[name]['hits'], stats[name]['misses'])
+                for name in ('drugs', 'pricing', 'alternatives') if name in stats}
+    # The ASGI app reports its async upstream client separately
+    counters['openfda'] = sum(stats[name]['requests_sent'] for name in ('openfda', 'openfda_async')
+                              if name in stats)
+    return counters
+
+
+def counter_delta(before, after):
+    """Hit ratio per memory cache and upstream requests between two snapshots"""
+    delta = {}
+    for name, value in after.items():
+        if name == 'openfda':
+            delta['openfda_requests'] = value - before.get(name, 0)
+            continue
+        hits = value[0] - before.get(name, (0, 0))[0]
+        misses = value[1] - before.get(name, (0, 0))[1]
+        delta[f'{name}_hit_ratio'] = round(hits / (hits + misses), 4) if hits + misses else None
+    return delta
+
+
+def print_level(level):
+    caches = ', '.join(f'{k} {v}' for k, v in level['caches'].items())
+    print(f"\nconcurrency {level['concurrency']}: {level['total']['rps']:.0f} req/s, "
+          f"peak RSS {level['memory']['rss_peak_mb']:.0f} MB\n  {caches}")
+    print(f"  {'endpoint':<18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, s in list(level['endpoints'].items()) + [('TOTAL', level['total'])]:
+        print(f"  {name:<18} {s['rps']:>8.1f} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+              f"{s['p99_ms']:>8.2f} {s['errors']:>7}")
+
+
+def compare(results, baseline_path):
+    """Print throughput and p99 changes against a saved result"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old_levels = {level['concurrency']: level for level in baseline['levels']}
+    print(f"\nCompared with {baseline_path} ({baseline['environment'].get('commit')}):")
+    for level in results['levels']:
+        old = old_levels.get(level['concurrency'])
+        if old is None:
+            continue
+        for name, s in level['endpoints'].items():
+            o = old['endpoints'].get(name)
+            if not o or not o['rps'] or not o['p99_ms']:
+                continue
+            rps_change = (s['rps'] - o['rps']) / o['rps'] * 100
+            p99_change = (s['p99_ms'] - o['p99_ms']) / o['p99_ms'] * 100
+            print(f"  c={level['concurrency']:<4} {name:<18} rps {rps_change:+6.1f}%  p99 {p99_change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=['inprocess', 'flask', 'asgi', 'gunicorn'],
+                        default='inprocess')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes for --target gunicorn')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--mix-file', help='JSON file overriding the keys of --mix')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--upstream-latency', type=float, default=0.05,
+                        help='seconds the OpenFDA stub waits before answering')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='result file (default: results/load-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    mix_config = dict(MIXES[args.mix])
+    if args.mix_file:
+        with open(args.mix_file) as f:
+            mix_config.update(json.load(f))
+    mix = TrafficMix(mix_config, nonce=random.Random().randrange(1 << 20))
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    with OpenFDAStub(latency=args.upstream_latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DRUG_PRICING_DB=os.path.join(tmp, 'load.db'),
+                   OPENFDA_BASE_URL=stub.url,
+                   PRICING_SEED=str(args.seed),
+                   WEB_CONCURRENCY=str(args.workers),
+                   # Measure the service, not its rate limits
+                   OPENFDA_RATE_LIMIT='0',
+                   CLIENT_RATE_LIMIT='0')
+        if args.target == 'inprocess':
+            os.environ.update(env)
+            target = InProcessTarget()
+        else:
+            target = ServerTarget(args.target, env)
+
+        try:
+            call = target.client()
+            start = time.perf_counter()
+            for endpoint, payload in mix.warm_requests():
+                call('POST', endpoint, payload)
+            print(f'{args.target} / {args.mix}: warmed in {time.perf_counter() - start:.1f}s')
+
+            results = {
+                'environment': environment(),
+                'config': {'target': args.target, 'workers': args.workers if args.target == 'gunicorn' else 1,
+                           'mix': args.mix, 'mix_config': mix_config,
+                           'duration': args.duration, 'upstream_latency': args.upstream_latency,
+                           'seed': args.seed},
+                'levels': [],
+            }
+            for concurrency in levels:
+                before = cache_counters(call)
+                level = run_level(target, mix, concurrency, args.duration, args.seed)
+                level['caches'] = counter_delta(before, cache_counters(call))
+                results['levels'].append(level)
+                print_level(level)
+
+            if args.target == 'inprocess':
+                results['memory_per_request'] = memory_per_request(target, mix, args.seed)
+                print('\npeak Python allocation per request:')
+                for name, m in results['memory_per_request'].items():
+                    print(f"  {name:<18} mean {m['mean_kb']:8.1f} KB  p99 {m['p99_kb']:8.1f} KB")
+            results['upstream_requests'] = stub.total
+        finally:
+            target.close()
+
+    save_results(results, args.output, 'load')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
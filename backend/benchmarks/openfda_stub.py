@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenFDA drug label API
+
+Serves ``/drug/label.json`` with synthetic label results, counts every
+request it receives and can inject latency and errors, so the client and
+the API can be exercised without touching api.fda.gov.
+
+Any quoted name in the ``search`` parameter is "found" unless it starts
+with ``unknown``, which returns OpenFDA's 404 NOT_FOUND response.
+
+Usage: python backend/benchmarks/openfda_stub.py [--port 8089] [--latency 0.2] [--error-rate 0.1]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_QUOTED = re.compile(r'"([^"]+)"')
+
+
+def label_result(name: str, index: int = 0) -> dict:
+    """Build one synthetic OpenFDA label result for a drug name"""
+    generic = name.upper() if index == 0 else f'{name.upper()} {index}'
+    return {
+        'openfda': {
+            'generic_name': [generic],
+            'brand_name': [name.capitalize()],
+            'product_ndc': [f'{zlib.crc32(generic.encode()) % 100000:05d}-{index:03d}'],
+            'manufacturer_name': ['Stub Pharmaceuticals'],
+        }
+    }
+
+
+class OpenFDAStub:
+    """Threaded HTTP server emulating OpenFDA with request counting and fault injection"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, fail_first: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+
+        self.requests = Counter()   # search term -> request count
+        self.total = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, like the real API
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024  # accept bursts of concurrent connections
+
+        self.server = Server((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'OpenFDAStub':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.total = 0
+            self.errors = 0
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+        search = query.get('search', [''])[0]
+        limit = int(query.get('limit', ['1'])[0])
+        names = _QUOTED.findall(search)
+        name = names[0] if names else ''
+
+        with self._lock:
+            self.total += 1
+            self.requests[search] += 1
+            seq = self.total
+            inject = seq <= self.fail_first or self._rng.random() < self.error_rate
+            if inject:
+                self.errors += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if parsed.path != '/drug/label.json':
+            status, body = 404, {'error': {'code': 'NOT_FOUND', 'message': 'Not found'}}
+        elif inject:
+            status, body = self.error_status, {'error': {'code': 'SERVER_ERROR'}}
+        elif not name or name.lower().startswith('unknown'):
+            status, body = 404, {'error': {'code': 'NOT_FOUND', 'message': 'No matches found!'}}
+        else:
+            status = 200
+            body = {
+                'meta': {'results': {'skip': 0, 'limit': limit, 'total': limit}},
+                'results': [label_result(name, i) for i in range(limit)],
+            }
+
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    stub = OpenFDAStub(args.host, args.port, args.latency, args.error_rate, args.error_status)
+    print(f'OpenFDA stub listening on {stub.url}')
+    print(f'Point the API at it with OPENFDA_BASE_URL={stub.url}')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f'Served {stub.total} requests ({stub.errors} injected errors)')
+
+
+if __name__ == '__main__':
+    main()
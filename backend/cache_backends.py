@@ -0,0 +1,408 @@
+"""
+Second-tier cache backends for the Drug Pricing Transparency API
+
+DrugPricingService keeps hot entries in per-process memory (memory_cache)
+and looks everything else up in a CacheBackend before calling OpenFDA or
+generating prices. A backend stores three namespaces:
+
+* DRUGS: drug records keyed by the exact name they were searched under
+* PRICING: pricing grids keyed by (drug name, pricing region), as
+  PackedGrids or the API's list of dicts (see packed_grid.py)
+* ALTERNATIVES: alternatives results keyed by normalized drug name
+
+Every backend offers the same get/set, batch get/set, TTL and invalidate
+operations; ``get_many`` returns ``(value, expires_at)`` pairs, with
+``expires_at`` in epoch seconds (None for entries that never expire).
+
+* SQLiteCacheBackend: the local database, and always the system of record
+  for the drug catalog and cost data behind the alternatives graph. Its
+  pricing grids come back as PackedGrids sharing its ``labels``.
+* MemoryCacheBackend: per-process LRU dictionaries, for tests and
+  deployments that need no persistence.
+* RedisCacheBackend: any Redis-protocol server, so several hosts share one
+  warm cache; needs the optional ``redis`` package (or a fakeredis client).
+  Grids are stored as lists of dicts, since label codes are per database.
+"""
+
+import abc
+import json
+import math
+import sqlite3
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from db import ConnectionPool
+from memory_cache import MISSING, TTLCache
+from packed_grid import LabelCodes, PackedGrid, as_packed
+
+DRUGS = 'drugs'
+PRICING = 'pricing'
+ALTERNATIVES = 'alternatives'
+
+QUERY_CHUNK = 500  # keys per IN (...) query
+DRUG_FIELDS = ('name', 'generic_name', 'brand_name', 'ndc', 'manufacturer')
+
+# (value, expires_at in epoch seconds or None)
+Entry = Tuple[Any, Optional[float]]
+
+
+def _encode(value) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _key_str(key: Hashable) -> str:
+    """Flatten a (drug, region) pricing key the way invalidation.pricing_key does"""
+    return '|'.join(key) if isinstance(key, tuple) else str(key)
+
+
+def _chunks(items: List, size: int = QUERY_CHUNK) -> Iterable[List]:
+    if len(items) <= size:
+        return (items,)
+    return (items[i:i + size] for i in range(0, len(items), size))
+
+
+class CacheBackend(abc.ABC):
+    """Interface shared by every second-tier cache backend"""
+
+    name = 'base'
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Entry]:
+        """Return ``(value, expires_at)`` or None on a miss"""
+        return self.get_many(namespace, [key]).get(key)
+
+    @abc.abstractmethod
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, Entry]:
+        """Return the fresh entries among ``keys``; misses are left out"""
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: Hashable, value, ttl: Optional[float] = None):
+        self.set_many(namespace, {key: value}, ttl)
+
+    @abc.abstractmethod
+    def set_many(self, namespace: str, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        """Store values that expire after ``ttl`` seconds (never when None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def invalidate(self, namespace: str, keys: Iterable[Hashable]):
+        """Drop entries so the next lookup misses"""
+        raise NotImplementedError
+
+    def evict_expired(self) -> int:
+        """Delete expired entries that are not dropped automatically; returns how many"""
+        return 0
+
+    def stats(self) -> Dict:
+        return {'backend': self.name}
+
+    def close(self):
+        pass
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """The local drugs and pricing_cache tables, plus cache_entries for other namespaces
+
+    Each pricing grid is one pricing_cache row holding a PackedGrid blob.
+    Rows carry their creation time rather than an expiry, so PRICING
+    entries always live for the ``pricing_ttl`` given here; the ``ttl``
+    passed to set_many is ignored for DRUGS and PRICING.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, pool: ConnectionPool, pricing_ttl: float, eviction_batch: int = 5000):
+        self.pool = pool
+        self.pricing_ttl = pricing_ttl
+        self.eviction_batch = eviction_batch
+        self._cutoff = f'-{pricing_ttl} seconds'
+        # Codes are assigned by the pricing_labels table, so every process agrees
+        self.labels = LabelCodes(self._assign_label, self._fetch_labels)
+
+    def _assign_label(self, name: str) -> int:
+        with self.pool.connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO pricing_labels (name) VALUES (?)', (name,))
+            conn.commit()
+            return conn.execute('SELECT code FROM pricing_labels WHERE name = ?', (name,)).fetchone()[0]
+
+    def _fetch_labels(self) -> List[Tuple[int, str]]:
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT code, name FROM pricing_labels').fetchall()
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Entry]:
+        if namespace != PRICING:
+            return super().get(namespace, key)
+        # The per-request lookup: one row by primary key, without batch bookkeeping
+        with self.pool.connection() as conn:
+            row = conn.execute('''
+                SELECT grid, strftime('%s', created_at) FROM pricing_cache
+                WHERE drug_name = ? AND region = ?
+                AND created_at > datetime('now', ?)
+            ''', (*key, self._cutoff)).fetchone()
+        if row is None:
+            return None
+        return PackedGrid(row[0], self.labels), int(row[1]) + self.pricing_ttl
+
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, Entry]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self.pool.connection() as conn:
+            if namespace == DRUGS:
+                return self._get_drugs(conn, keys)
+            if namespace == PRICING:
+                return self._get_pricing(conn, keys)
+            return self._get_entries(conn, namespace, keys)
+
+    def _get_drugs(self, conn: sqlite3.Connection, names: List[str]) -> Dict[Hashable, Entry]:
+        found = {}
+        for chunk in _chunks(names):
+            cursor = conn.execute(f'''
+                SELECT name, generic_name, brand_name, ndc, manufacturer
+                FROM drugs WHERE name IN ({', '.join('?' * len(chunk))})
+            ''', chunk)
+            for row in cursor:
+                found[row[0]] = (dict(zip(DRUG_FIELDS, row)), None)
+        return found
+
+    def _get_pricing(self, conn: sqlite3.Connection, pairs: List[Tuple[str, str]]) -> Dict[Hashable, Entry]:
+        wanted = set(pairs)
+        drug_names = list({drug_name for drug_name, _ in wanted})
+        regions = list({region for _, region in wanted})
+
+        if len(wanted) == len(drug_names) * len(regions):
+            # A full drugs x regions block (bulk pricing): one IN x IN query per chunk of drugs
+            queries = [(f'''
+                SELECT drug_name, region, grid, strftime('%s', created_at)
+                FROM pricing_cache
+                WHERE drug_name IN ({', '.join('?' * len(chunk))})
+                AND region IN ({', '.join('?' * len(regions))})
+                AND created_at > datetime('now', ?)
+            ''', (*chunk, *regions, self._cutoff))
+                for chunk in _chunks(drug_names, max(1, QUERY_CHUNK - len(regions)))]
+        else:
+            # Scattered pairs: join the pairs to the primary key instead of
+            # fetching every requested drug in every requested region
+            queries = [(f'''
+                WITH wanted (drug_name, region) AS (VALUES {', '.join(['(?, ?)'] * len(chunk))})
+                SELECT p.drug_name, p.region, grid, strftime('%s', created_at)
+                FROM wanted CROSS JOIN pricing_cache p
+                ON p.drug_name = wanted.drug_name AND p.region = wanted.region
+                AND created_at > datetime('now', ?)
+            ''', (*(key for pair in chunk for key in pair), self._cutoff))
+                for chunk in _chunks(list(wanted))]
+
+        found = {}
+        for sql, params in queries:
+            for drug_name, region, grid, created_at in conn.execute(sql, params):
+                found[(drug_name, region)] = (PackedGrid(grid, self.labels),
+                                              int(created_at) + self.pricing_ttl)
+        return found
+
+    def _get_entries(self, conn: sqlite3.Connection, namespace: str,
+                     keys: List[Hashable]) -> Dict[Hashable, Entry]:
+        by_str = {_key_str(key): key for key in keys}
+        found = {}
+        for chunk in _chunks(list(by_str)):
+            cursor = conn.execute(f'''
+                SELECT key, value, strftime('%s', expires_at) FROM cache_entries
+                WHERE namespace = ? AND key IN ({', '.join('?' * len(chunk))})
+                AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+            ''', (namespace, *chunk))
+            for key, value, expires_at in cursor:
+                found[by_str[key]] = (json.loads(value), int(expires_at) if expires_at else None)
+        return found
+
+    def set_many(self, namespace: str, items: Dict[Hashable, Any], ttl: Optional[float] = None,
+                 conn: Optional[sqlite3.Connection] = None):
+        """Store values; with ``conn``, in the caller's transaction, which the caller commits
+
+        New plan/pharmacy labels are interned on a connection of their own
+        before anything is written, so ``conn`` must not hold uncommitted
+        writes when it is passed grids that aren't yet packed with ``labels``.
+        """
+        if not items:
+            return
+        if namespace == PRICING:
+            # Packed first: interning a new label leases a connection of its own
+            items = {key: as_packed(pricing, self.labels) for key, pricing in items.items()}
+        if conn is not None:
+            self._write_many(conn, namespace, items, ttl)
+            return
+        with self.pool.connection() as conn:
+            self._write_many(conn, namespace, items, ttl)
+            conn.commit()
+
+    def _write_many(self, conn: sqlite3.Connection, namespace: str, items: Dict[Hashable, Any],
+                    ttl: Optional[float]):
+        if namespace == DRUGS:
+            conn.executemany('''
+                INSERT OR REPLACE INTO drugs
+                (name, generic_name, brand_name, ndc, manufacturer)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(name, record['generic_name'], record['brand_name'],
+                   record['ndc'], record['manufacturer']) for name, record in items.items()])
+        elif namespace == PRICING:
+            # One upsert per grid, all in a single transaction
+            conn.executemany('''
+                INSERT INTO pricing_cache (drug_name, region, grid, cells, mean_cost)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (drug_name, region)
+                DO UPDATE SET grid = excluded.grid, cells = excluded.cells,
+                mean_cost = excluded.mean_cost, created_at = CURRENT_TIMESTAMP
+            ''', [(drug_name, region, grid.blob, len(grid), grid.mean_cost())
+                  for (drug_name, region), grid in items.items()])
+        else:
+            expires = None if ttl is None else f'+{ttl} seconds'
+            conn.executemany('''
+                INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at)
+                VALUES (?, ?, ?, CASE WHEN ? IS NULL THEN NULL ELSE datetime('now', ?) END)
+            ''', [(namespace, _key_str(key), _encode(value), expires, expires)
+                  for key, value in items.items()])
+
+    def invalidate(self, namespace: str, keys: Iterable[Hashable]):
+        keys = list(keys)
+        if not keys:
+            return
+        with self.pool.connection() as conn:
+            if namespace == DRUGS:
+                conn.executemany('DELETE FROM drugs WHERE name = ?', [(key,) for key in keys])
+            elif namespace == PRICING:
+                conn.executemany('DELETE FROM pricing_cache WHERE drug_name = ? AND region = ?',
+                                 keys)
+            else:
+                conn.executemany('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                                 [(namespace, _key_str(key)) for key in keys])
+            conn.commit()
+
+    def evict_expired(self) -> int:
+        """Delete pricing rows older than the TTL and expired cache_entries"""
+        removed = 0
+
+        # Delete in bounded batches so a large backlog never holds the
+        # write lock long enough to stall request-path inserts
+        while True:
+            with self.pool.connection() as conn:
+                cursor = conn.execute('''
+                    DELETE FROM pricing_cache WHERE (drug_name, region) IN (
+                        SELECT drug_name, region FROM pricing_cache
+                        WHERE created_at <= datetime('now', ?)
+                        LIMIT ?
+                    )
+                ''', (self._cutoff, self.eviction_batch))
+                conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < self.eviction_batch:
+                break
+
+        with self.pool.connection() as conn:
+            cursor = conn.execute('DELETE FROM cache_entries WHERE expires_at <= CURRENT_TIMESTAMP')
+            conn.commit()
+        return removed + cursor.rowcount
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process LRU dictionaries; nothing survives a restart or is shared"""
+
+    name = 'memory'
+
+    def __init__(self, maxsize: int = 100000, clock=time.time):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._caches: Dict[str, TTLCache] = {}
+
+    def _cache(self, namespace: str) -> TTLCache:
+        cache = self._caches.get(namespace)
+        if cache is None:
+            cache = self._caches.setdefault(namespace, TTLCache(self.maxsize, math.inf, clock=self._clock))
+        return cache
+
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, Entry]:
+        cache = self._cache(namespace)
+        found = {}
+        for key in keys:
+            entry = cache.get(key)
+            if entry is not MISSING:
+                found[key] = entry
+        return found
+
+    def set_many(self, namespace: str, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        cache = self._cache(namespace)
+        expires_at = None if ttl is None else self._clock() + ttl
+        for key, value in items.items():
+            cache.set(key, (value, expires_at), ttl)
+
+    def invalidate(self, namespace: str, keys: Iterable[Hashable]):
+        cache = self._cache(namespace)
+        for key in keys:
+            cache.invalidate(key)
+
+    def stats(self) -> Dict:
+        return {'backend': self.name,
+                **{namespace: cache.stats() for namespace, cache in self._caches.items()}}
+
+
+class RedisCacheBackend(CacheBackend):
+    """Entries as JSON strings in a Redis-protocol server, expired by the server itself
+
+    Each value is stored as ``[value, expires_at]`` so a batch get is one
+    MGET; writes are pipelined.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', prefix: str = 'drug-pricing:',
+                 client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _name(self, namespace: str, key: Hashable) -> str:
+        return f'{self.prefix}{namespace}:{_key_str(key)}'
+
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, Entry]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {}
+        for key, raw in zip(keys, self.client.mget([self._name(namespace, key) for key in keys])):
+            if raw is not None:
+                value, expires_at = json.loads(raw)
+                found[key] = (value, expires_at)
+        return found
+
+    def set_many(self, namespace: str, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        if not items:
+            return
+        expires_at = None if ttl is None else time.time() + ttl
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            if isinstance(value, PackedGrid):
+                value = value.records()
+            pipe.set(self._name(namespace, key), _encode([value, expires_at]),
+                     ex=None if ttl is None else max(1, math.ceil(ttl)))
+        pipe.execute()
+
+    def invalidate(self, namespace: str, keys: Iterable[Hashable]):
+        names = [self._name(namespace, key) for key in keys]
+        if names:
+            self.client.delete(*names)
+
+    def stats(self) -> Dict:
+        return {'backend': self.name, 'prefix': self.prefix}
+
+    def close(self):
+        self.client.close()
+
+
+def create_backend(kind: str, local: SQLiteCacheBackend, maxsize: int = 100000,
+                   redis_url: str = '', redis_prefix: str = 'drug-pricing:') -> CacheBackend:
+    """The backend named by ``kind``; 'sqlite' is the ``local`` store itself"""
+    if kind == 'sqlite':
+        return local
+    if kind == 'memory':
+        return MemoryCacheBackend(maxsize)
+    if kind == 'redis':
+        return RedisCacheBackend(redis_url, prefix=redis_prefix)
+    raise ValueError(f'Unknown cache backend: {kind}')
@@ -0,0 +1,259 @@
+"""
+Pricing cache warm-up and refresh-ahead for the Drug Pricing Transparency API
+
+Without it, the first request for a (drug, region) pair after a restart, and
+the first one after its pricing_cache row passes the TTL, pays for pricing
+generation and a SQLite write on the request path. The refresher moves
+that work to a background thread:
+
+* Warm-up: at startup, the configured drugs in the configured ZIPs'
+  regions and the most requested pairs of the last ACCESS_WINDOW_DAYS are
+  loaded into the memory cache, and any that are missing or about to
+  expire are regenerated first.
+* Refresh-ahead: pairs requested within the TTL are regenerated once their
+  rows come within ``refresh_ahead`` seconds of expiry. A request that is
+  served rows this close to expiry also queues its pair for the next pass
+  (stale-while-revalidate), so pairs too new to have access counts are
+  covered as well.
+
+With several worker processes on one database, only the process holding
+an flock on ``lock_path`` regenerates expiring pairs, stale hits included;
+the others flush their request counts so the leader's next pass picks
+those pairs up, and serve the fresh rows from SQLite once their memory
+entries expire.
+
+Request counts are kept in memory and flushed to the pricing_access table
+on each pass, so recording an access costs one dict update.
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache_backends import PRICING
+from metrics import CACHE_REFRESHES, ERRORS
+from name_index import normalize_name
+from packed_grid import as_packed
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process refreshes
+    fcntl = None
+
+ACCESS_WINDOW_DAYS = 7  # request counts older than this are pruned
+BLOCK_PAIRS = 500  # (drug, region) pairs per query/transaction
+MAX_PENDING = 10000  # refresh-ahead hints queued between passes
+
+# Pair: (drug name, pricing region; see regions.py)
+Pair = Tuple[str, str]
+
+
+class PricingRefresher:
+    """Keeps popular (drug, region) pricing in the caches ahead of requests"""
+
+    def __init__(self, service, ttl: float, refresh_ahead: float, interval: float,
+                 batch_size: int = 1000, lock_path: Optional[str] = None):
+        self.service = service
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_path = lock_path
+        self._lock_file = None
+
+        self._access: Counter = Counter()
+        self._pending: Dict[Pair, None] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+        self.loaded = 0
+        self.regenerated = 0
+        self.passes = 0
+
+    # -- request path -------------------------------------------------------
+
+    def record(self, drug_name: str, region: str):
+        """Count a pricing request towards the warm-up ranking"""
+        with self._lock:
+            self._access[(drug_name, region)] += 1
+
+    def schedule(self, drug_name: str, region: str):
+        """Queue a pair whose cached rows are about to expire"""
+        with self._lock:
+            if len(self._pending) < MAX_PENDING:
+                self._pending[(drug_name, region)] = None
+        self._wake.set()
+
+    def due(self, expires_at: float) -> bool:
+        """Whether an entry expiring at ``expires_at`` (epoch seconds) needs refreshing"""
+        return self._thread is not None and expires_at - time.time() < self.refresh_ahead
+
+    # -- background work ----------------------------------------------------
+
+    def flush_access_counts(self):
+        """Persist request counts gathered since the last flush"""
+        with self._lock:
+            counts, self._access = self._access, Counter()
+        with self.service.pool.connection() as conn:
+            if counts:
+                conn.executemany('''
+                    INSERT INTO pricing_access (drug_name, region, hits)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (drug_name, region)
+                    DO UPDATE SET hits = hits + excluded.hits, last_access = CURRENT_TIMESTAMP
+                ''', [(drug_name, region, hits) for (drug_name, region), hits in counts.items()])
+            conn.execute("DELETE FROM pricing_access WHERE last_access < datetime('now', ?)",
+                         (f'-{ACCESS_WINDOW_DAYS} days',))
+            conn.commit()
+
+    def top_pairs(self, limit: int) -> List[Pair]:
+        """The most requested pairs within ACCESS_WINDOW_DAYS"""
+        if limit <= 0:
+            return []
+        with self.service.pool.connection() as conn:
+            return conn.execute('''
+                SELECT drug_name, region FROM pricing_access
+                WHERE last_access >= datetime('now', ?)
+                ORDER BY hits DESC LIMIT ?
+            ''', (f'-{ACCESS_WINDOW_DAYS} days', limit)).fetchall()
+
+    def expiring_pairs(self) -> List[Pair]:
+        """Pairs requested within the TTL whose rows expire within refresh_ahead"""
+        with self.service.pool.connection() as conn:
+            return conn.execute('''
+                SELECT a.drug_name, a.region FROM pricing_access a
+                LEFT JOIN pricing_cache p
+                ON p.drug_name = a.drug_name AND p.region = a.region
+                WHERE a.last_access >= datetime('now', ?)
+                AND (p.created_at IS NULL OR p.created_at <= datetime('now', ?))
+                ORDER BY a.hits DESC LIMIT ?
+            ''', (f'-{self.ttl} seconds', f'-{max(0, self.ttl - self.refresh_ahead)} seconds',
+                  self.batch_size)).fetchall()
+
+    def warm(self, pairs: Iterable[Pair], reason: str = 'warmup') -> int:
+        """Load pairs into the memory cache, regenerating missing or expiring ones
+
+        Returns the number of pairs regenerated.
+        """
+        pairs = list(dict.fromkeys((normalize_name(drug_name), region) for drug_name, region in pairs))
+        regenerated = 0
+        for i in range(0, len(pairs), BLOCK_PAIRS):
+            regenerated += self._warm_block(pairs[i:i + BLOCK_PAIRS], reason)
+        return regenerated
+
+    def _warm_block(self, pairs: List[Pair], reason: str) -> int:
+        cached = self.service.cache.get_many(PRICING, pairs)
+
+        now = time.time()
+        stale = []
+        for pair in pairs:
+            grid, expires = cached.get(pair, (None, now))
+            if expires - now > self.refresh_ahead:
+                self.service.pricing_memory_cache.set(pair, as_packed(grid, self.service.labels),
+                                                      ttl=expires - now)
+            else:
+                stale.append((*pair, self.service._generate_grid(*pair)))
+
+        if stale:
+            self.service._store_pricing(stale, replaced=True)
+            for drug_name, region, grid in stale:
+                self.service.pricing_memory_cache.set((drug_name, region), grid)
+
+        loaded = len(pairs) - len(stale)
+        CACHE_REFRESHES.inc(reason, 'loaded', amount=loaded)
+        CACHE_REFRESHES.inc(reason, 'regenerated', amount=len(stale))
+        self.loaded += loaded
+        self.regenerated += len(stale)
+        return len(stale)
+
+    def refresh_expiring(self) -> int:
+        """Flush request counts and regenerate popular pairs close to expiry"""
+        self.flush_access_counts()
+        if not self._is_leader():
+            return 0
+        return self.warm(self.expiring_pairs(), reason='refresh_ahead')
+
+    def _is_leader(self) -> bool:
+        """Take, or confirm we hold, the per-database refresh lock"""
+        if fcntl is None or self.lock_path is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            # Held until the process exits, then another worker takes over
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    # -- thread -------------------------------------------------------------
+
+    def start(self, warm_pairs: Iterable[Pair] = (), top_n: int = 0,
+              on_warm: Optional[Callable[[], Any]] = None):
+        """Warm the caches and start refreshing in a daemon thread
+
+        ``on_warm`` is called from that thread once the warm-up has finished
+        (or failed).
+        """
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, args=(list(warm_pairs), top_n, on_warm),
+                                        name='pricing-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, warm_pairs: List[Pair], top_n: int, on_warm: Optional[Callable[[], Any]]):
+        try:
+            self.warm(warm_pairs + self.top_pairs(top_n))
+        except Exception:
+            ERRORS.inc('cache_warmup')
+        if on_warm is not None:
+            on_warm()
+
+        next_sweep = time.monotonic() + self.interval
+        while not self._stopped:
+            self._wake.wait(max(0.0, next_sweep - time.monotonic()))
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                with self._lock:
+                    pending, self._pending = list(self._pending), {}
+                if pending:
+                    if self._is_leader():
+                        self.warm(pending, reason='stale_hit')
+                    else:
+                        # Their requests are counted; the leader's pass regenerates them
+                        self.flush_access_counts()
+                if time.monotonic() >= next_sweep:
+                    self.refresh_expiring()
+                    self.passes += 1
+                    next_sweep = time.monotonic() + self.interval
+            except Exception:
+                # A failed pass is retried on the next one
+                ERRORS.inc('cache_refresh')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+            tracked = len(self._access)
+        return {
+            'running': self._thread is not None,
+            'leader': self._lock_file is not None,
+            'loaded': self.loaded,
+            'regenerated': self.regenerated,
+            'passes': self.passes,
+            'pending': pending,
+            'unflushed_pairs': tracked,
+        }
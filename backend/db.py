@@ -0,0 +1,102 @@
+"""
+SQLite connection pooling for the Drug Pricing Transparency API
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while a
+# writer holds the lock, and NORMAL synchronous is durable enough in WAL mode
+# (a crash can lose the last commit but never corrupts the database).
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,       # negative means KiB, so ~20 MB per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,     # 256 MB
+    'busy_timeout': 5000,       # ms to wait on a locked database before failing
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections leased to one thread at a time"""
+
+    def __init__(self, db_path: str, max_connections: int = 8,
+                 timeout: float = 30.0, pragmas: Dict = None):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+        self._idle = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the configured pragmas"""
+        # check_same_thread is off because a connection may be leased by
+        # different threads over its lifetime, never by two at once.
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.max_connections:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f'No SQLite connection available after {self.timeout}s '
+                f'(pool size {self.max_connections})'
+            )
+
+    def _release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Lease a connection for the duration of a ``with`` block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            # Never hand a connection with an open transaction back to the pool
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def stats(self) -> Dict:
+        """Return the number of open and idle connections"""
+        return {
+            'open': len(self._all),
+            'idle': self._idle.qsize(),
+            'max': self.max_connections,
+        }
+
+    def close_all(self):
+        """Close every connection opened by this pool"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._idle = queue.LifoQueue()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV and Parquet export of pricing comparisons
+
+Flattens DrugPricingService.iter_pricing_matrix() into one row per
+(drug, ZIP, plan, pharmacy) and encodes it in pandas DataFrames of at most
+EXPORT_BATCH_ROWS rows. The matrix is read from the cache one bounded
+block at a time (misses are generated and stored on the way), and each
+DataFrame is encoded and handed on before the next is built, so memory use
+stays flat however many drugs and ZIPs are exported.
+
+CSV is written with one header line; Parquet with one row group per
+batch. Parquet needs pyarrow (``pip install pyarrow``), imported only when
+that format is requested, and pandas only when an export starts, so
+importing this module (as app.py does) stays cheap.
+
+Usage: python export.py --drugs Lipitor,Metformin --zips 10001,94105 [--format parquet] [-o pricing.parquet]
+"""
+
+import argparse
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+EXPORT_BATCH_ROWS = 50000  # rows per DataFrame, and per Parquet row group
+KEY_COLUMNS = ('drug_name', 'zip_code', 'plan_type', 'pharmacy_type')
+VALUE_COLUMNS = ('cost', 'copay', 'deductible')
+EXPORT_COLUMNS = KEY_COLUMNS + VALUE_COLUMNS
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_frames(records: Iterable[Dict], batch_rows: int = EXPORT_BATCH_ROWS,
+                summary: Optional[Dict] = None) -> Iterator['pd.DataFrame']:
+    """Flatten bulk pricing records into DataFrames of at most ``batch_rows`` rows
+
+    Values missing from a record (cached rows may carry cost only) are NaN.
+    The matrix's summary record, if any, is copied into ``summary``.
+    """
+    import pandas as pd
+
+    columns: Dict[str, List] = {name: [] for name in EXPORT_COLUMNS}
+    drug_names, zip_codes = columns['drug_name'], columns['zip_code']
+    plan_types, pharmacy_types = columns['plan_type'], columns['pharmacy_type']
+    values = [(name, columns[name]) for name in VALUE_COLUMNS]
+
+    def flush() -> 'pd.DataFrame':
+        frame = pd.DataFrame({name: pd.Series(column, dtype='float64' if name in VALUE_COLUMNS
+                                              else 'object')
+                              for name, column in columns.items()})
+        for column in columns.values():
+            column.clear()
+        return frame
+
+    for record in records:
+        if 'summary' in record:
+            if summary is not None:
+                summary.update(record['summary'])
+            continue
+        for row in record['pricing']:
+            drug_names.append(record['drug_name'])
+            zip_codes.append(record['zip_code'])
+            plan_types.append(row['plan_type'])
+            pharmacy_types.append(row['pharmacy_type'])
+            for name, column in values:
+                column.append(row.get(name))
+        if len(drug_names) >= batch_rows:
+            yield flush()
+    if drug_names:
+        yield flush()
+
+
+def csv_chunks(frames: Iterable['pd.DataFrame']) -> Iterator[bytes]:
+    """Encode DataFrames as one CSV document, one chunk per frame"""
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+    if header:
+        yield (','.join(EXPORT_COLUMNS) + '\n').encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_chunks(frames: Iterable['pd.DataFrame']) -> Iterator[bytes]:
+    """Encode DataFrames as one Parquet file, one row group (and chunk) per frame"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.string()) for name in KEY_COLUMNS]
+                       + [(name, pa.float64()) for name in VALUE_COLUMNS])
+    sink = _ChunkSink()
+    # Dictionary encoding stores each drug, ZIP, plan and pharmacy name once per row group
+    writer = pq.ParquetWriter(sink, schema, compression='snappy', use_dictionary=True)
+    try:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(records: Iterable[Dict], fmt: str, batch_rows: int = EXPORT_BATCH_ROWS,
+                  summary: Optional[Dict] = None) -> Iterator[bytes]:
+    """Encode bulk pricing records as a ``fmt`` ('csv' or 'parquet') byte stream"""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format: {fmt!r}')
+    frames = iter_frames(records, batch_rows, summary)
+    return csv_chunks(frames) if fmt == 'csv' else parquet_chunks(frames)
+
+
+def _names(value: str) -> List[str]:
+    """Comma-separated names, or one per line from @file"""
+    if value.startswith('@'):
+        with open(value[1:]) as f:
+            items = f.read().splitlines()
+    else:
+        items = value.split(',')
+    return list(dict.fromkeys(item.strip() for item in items if item.strip()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export pricing comparisons as CSV or Parquet')
+    parser.add_argument('--drugs', required=True, help='comma-separated drug names, or @file with one per line')
+    parser.add_argument('--zips', required=True, help='comma-separated ZIP codes, or @file with one per line')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--batch-rows', type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    drug_names, zip_codes = _names(args.drugs), _names(args.zips)
+    invalid = [z for z in zip_codes if not z.isdigit() or len(z) != 5]
+    if invalid:
+        parser.error(f"invalid ZIP codes: {', '.join(invalid[:20])}")
+    if args.format == 'parquet' and not parquet_available():
+        parser.error('Parquet export requires pyarrow (pip install pyarrow)')
+
+    from app import DrugPricingService  # app imports this module
+
+    # Built directly rather than with get_service(): a one-shot export needs
+    # no warm-up, refresher or write-behind threads (its writes are inline)
+    service = DrugPricingService()
+    summary = {}
+    start = time.perf_counter()
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_chunks(service.iter_pricing_matrix(drug_names, zip_codes),
+                                   args.format, args.batch_rows, summary):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+        service.pool.close_all()
+    print(f"{summary.get('pairs', 0)} pairs ({summary.get('cache_hits', 0)} cached, "
+          f"{summary.get('generated', 0)} generated) in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
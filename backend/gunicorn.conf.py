@@ -0,0 +1,65 @@
+"""
+Gunicorn configuration for running the API in production
+
+    cd backend && gunicorn -c gunicorn.conf.py app:app
+    python run.py --prod                  # the same, via the entry point
+
+The app is imported once in the master (preload_app), and the service is
+created there before the first fork: it migrates the database, loads the
+name index and alternatives graph and warms the pricing cache; workers are
+forked from it and share those pages copy-on-write. SQLite connections and HTTP sessions are closed before each
+fork so no worker inherits a parent's file locks or sockets, and the
+pricing refresher starts in every worker after fork (only one of them, the
+holder of the refresh lock, regenerates expiring rows). Each worker also
+starts its own write-behind thread, and flushes it when it exits.
+
+Each worker keeps its own memory caches; CACHE_INVALIDATION makes them
+follow writes from other workers via the cache_events table.
+
+Signals: HUP replaces workers gracefully (code changes need a restart or
+USR2 because the app is preloaded), TTIN/TTOU add or remove a worker, TERM
+drains in-flight requests for up to graceful_timeout seconds.
+"""
+
+import multiprocessing
+import os
+
+# Read by app.py at import, which happens after this file runs
+os.environ.setdefault('CACHE_INVALIDATION', 'true')
+os.environ['DRUG_PRICING_PREFORK'] = 'true'
+
+bind = f"{os.getenv('HOST') or '0.0.0.0'}:{os.getenv('PORT') or '5000'}"
+workers = int(os.getenv('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+# Threads per worker overlap OpenFDA round-trips; pricing is CPU-bound
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS') or 4)
+preload_app = True
+
+# Recycle workers to bound memory growth; jitter keeps them from all
+# restarting at once
+max_requests = int(os.getenv('MAX_REQUESTS') or 10000)
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER') or 1000)
+timeout = int(os.getenv('WORKER_TIMEOUT') or 30)
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT') or 30)
+keepalive = 5
+
+accesslog = os.getenv('ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def pre_fork(server, worker):
+    # The first call builds and warms the service in the master
+    from app import get_service
+    get_service().prepare_fork()
+
+
+def post_fork(server, worker):
+    from app import get_service
+    get_service().after_fork()
+
+
+def worker_exit(server, worker):
+    # Commit cache writes still queued in this worker
+    from app import get_service
+    get_service().writer.stop()
@@ -0,0 +1,104 @@
+"""
+Cross-process cache invalidation for the Drug Pricing Transparency API
+
+When the API runs as several worker processes (see gunicorn.conf.py) they
+share the SQLite database but each has its own in-memory caches, name
+index and alternatives graph. A process that changes the local database
+appends an event to the cache_events table in the same transaction as the
+change (a shared cache backend is written after that commit); every other
+process polls the table at most once per ``poll_interval`` and drops or
+reloads the affected entries, so a worker never serves data more than
+about a poll interval older than what another worker wrote.
+
+Event kinds:
+  drug     a drug was cached under ``key`` (its name as searched)
+  priced   pricing for drug ``key`` was stored, moving its mean cost
+  pricing  fresh pricing for ``drug|region`` was replaced ahead of expiry
+
+Disabled (the default for a single process), publish and poll do nothing.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Set
+
+RETENTION = 3600  # seconds events are kept; far longer than any poll interval
+
+# kind -> keys
+Events = Dict[str, Set[str]]
+
+
+def pricing_key(drug_name: str, region: str) -> str:
+    return f'{drug_name}|{region}'
+
+
+class InvalidationLog:
+    """Publishes cache changes to, and polls changes from, other processes"""
+
+    def __init__(self, pool, enabled: bool = False, poll_interval: float = 1.0):
+        self.pool = pool
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self._last_id = 0
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.received = 0
+
+    def mark_current(self):
+        """Skip events older than the caches this process has just loaded"""
+        if not self.enabled:
+            return
+        with self.pool.connection() as conn:
+            self._last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM cache_events').fetchone()[0]
+
+    def publish(self, conn: sqlite3.Connection, kind: str, keys: Iterable[str]):
+        """Record changed keys on ``conn``; the caller's commit makes them visible"""
+        if not self.enabled:
+            return
+        origin = os.getpid()
+        rows = [(kind, key, origin) for key in keys]
+        conn.executemany('INSERT INTO cache_events (kind, key, origin) VALUES (?, ?, ?)', rows)
+        self.published += len(rows)
+
+    def poll(self) -> Events:
+        """Events from other processes since the last poll, at most once per interval"""
+        if not self.enabled:
+            return {}
+        now = time.monotonic()
+        if now < self._next_poll or not self._lock.acquire(blocking=False):
+            return {}
+        try:
+            self._next_poll = now + self.poll_interval
+            with self.pool.connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, kind, key, origin FROM cache_events WHERE id > ? ORDER BY id
+                ''', (self._last_id,)).fetchall()
+            events: Events = {}
+            pid = os.getpid()
+            for event_id, kind, key, origin in rows:
+                self._last_id = event_id
+                if origin != pid:
+                    events.setdefault(kind, set()).add(key)
+            self.received += sum(len(keys) for keys in events.values())
+            return events
+        finally:
+            self._lock.release()
+
+    def prune(self, conn: sqlite3.Connection) -> int:
+        """Delete events older than RETENTION; commits on ``conn``"""
+        cursor = conn.execute("DELETE FROM cache_events WHERE created_at < datetime('now', ?)",
+                              (f'-{RETENTION} seconds',))
+        conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'published': self.published,
+            'received': self.received,
+            'last_id': self._last_id,
+        }
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Offline OpenFDA drug label ingestion for the Drug Pricing Transparency API
+
+Loads the OpenFDA drug label bulk download (drug-label-*.json.zip from
+https://open.fda.gov/data/downloads/) into the ``drugs`` table, so drug
+searches and generic alternatives can be answered from a local catalog
+instead of the rate-limited live API.
+
+Each download is one JSON document, ``{"meta": {...}, "results": [...]}``,
+of several hundred MB once unzipped. It is decoded one label at a time from
+the zip stream, so memory use is bounded by a single label plus one write
+batch, not by the size of the file.
+
+Usage: python label_ingest.py drug-label-0001-of-0013.json.zip [...] [--db drug_pricing.db]
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+import zipfile
+from typing import Dict, Iterable, Iterator, Optional, TextIO
+
+from alternatives import AlternativesGraph
+from db import ConnectionPool
+from schema import migrate
+
+READ_CHUNK = 1 << 20  # characters read from the decompressed stream at a time
+BATCH_SIZE = 1000  # labels upserted per transaction
+
+_WHITESPACE = ' \t\n\r'
+
+
+def drug_record(name: str, openfda: Dict) -> Dict:
+    """Build a drugs-table record from a label's ``openfda`` section"""
+    return {
+        'name': name,
+        'generic_name': ', '.join(openfda.get('generic_name', [name])),
+        'brand_name': ', '.join(openfda.get('brand_name', [name])),
+        'ndc': ', '.join(openfda.get('product_ndc', [])),
+        'manufacturer': ', '.join(openfda.get('manufacturer_name', []))
+    }
+
+
+def label_record(label: Dict) -> Optional[Dict]:
+    """Return the catalog record for one label, or None if it has no drug names"""
+    openfda = label.get('openfda') or {}
+    names = openfda.get('brand_name') or openfda.get('generic_name')
+    if not names or not names[0].strip():
+        return None
+    return drug_record(names[0].strip(), openfda)
+
+
+class _Reader:
+    """Incremental JSON value reader over a text stream"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.stream.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of label file')
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at offset {self.pos} of the current buffer')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Usually a value split across reads; give up only at EOF
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next read
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_label_stream(stream: TextIO) -> Iterator[Dict]:
+    """Yield each label in the ``results`` array of an OpenFDA download"""
+    reader = _Reader(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'results':
+            reader.expect('[')
+            if reader.peek() != ']':
+                while True:
+                    yield reader.value()
+                    if reader.peek() == ']':
+                        break
+                    reader.expect(',')
+            reader.expect(']')
+        else:
+            reader.value()  # meta and any other top-level keys are skipped
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
+
+
+def iter_labels(path: str) -> Iterator[Dict]:
+    """Yield labels from a zipped (or plain) OpenFDA drug label download"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if not member.endswith('.json'):
+                    continue
+                with archive.open(member) as raw:
+                    yield from iter_label_stream(io.TextIOWrapper(raw, encoding='utf-8'))
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield from iter_label_stream(f)
+
+
+def ingest_labels(pool: ConnectionPool, labels: Iterable[Dict],
+                  batch_size: int = BATCH_SIZE) -> Dict:
+    """Upsert labels into the drugs table in batches and return counts"""
+    stats = {'labels': 0, 'drugs': 0, 'skipped': 0}
+    batch = []
+
+    def flush():
+        with pool.connection() as conn:
+            conn.executemany('''
+                INSERT INTO drugs (name, generic_name, brand_name, ndc, manufacturer, source)
+                VALUES (?, ?, ?, ?, ?, 'bulk')
+                ON CONFLICT (name) DO UPDATE SET
+                    generic_name = excluded.generic_name,
+                    brand_name = excluded.brand_name,
+                    ndc = excluded.ndc,
+                    manufacturer = excluded.manufacturer,
+                    source = 'bulk',
+                    created_at = CURRENT_TIMESTAMP
+            ''', batch)
+            conn.commit()
+        stats['drugs'] += len(batch)
+        batch.clear()
+
+    for label in labels:
+        stats['labels'] += 1
+        record = label_record(label)
+        if record is None:
+            stats['skipped'] += 1
+            continue
+        batch.append((record['name'], record['generic_name'], record['brand_name'],
+                      record['ndc'], record['manufacturer']))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load OpenFDA drug label downloads into the local drug catalog')
+    parser.add_argument('paths', nargs='+', help='drug-label-*.json.zip files')
+    parser.add_argument('--db', default=os.getenv('DRUG_PRICING_DB', 'drug_pricing.db'))
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db, max_connections=1)
+    with pool.connection() as conn:
+        migrate(conn)
+
+    for path in args.paths:
+        start = time.perf_counter()
+        stats = ingest_labels(pool, iter_labels(path))
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {stats['labels']} labels, {stats['drugs']} drugs upserted, "
+              f"{stats['skipped']} without names ({stats['labels'] / max(elapsed, 1e-9):.0f} labels/s)")
+
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        names = AlternativesGraph().rebuild(conn)
+    print(f'alternatives graph: {names} names in {time.perf_counter() - start:.1f}s')
+
+    pool.close_all()
+    print('Restart the API server to load the new catalog into its name index.')
+
+
+if __name__ == '__main__':
+    main()
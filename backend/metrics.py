@@ -0,0 +1,213 @@
+"""
+Prometheus-style metrics for the Drug Pricing Transparency API
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format (version 0.0.4) for
+/api/metrics. Recording is a lock, a bisect and two additions, cheap enough
+to leave on in production. With ``REGISTRY.enabled = False`` (see
+METRICS_ENABLED in app.py) stage timers become a shared no-op context
+manager and counters return immediately.
+
+Values that already live elsewhere (cache counters, upstream client stats,
+database size) are pulled at scrape time by collector callbacks rather than
+being double-counted on the hot path.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond memory hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (suffix, labels, value) samples produced by a metric or collector
+Sample = Tuple[str, Dict[str, str], float]
+
+_NOOP = nullcontext()
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry: 'Registry', name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [('_total', self._labels(k), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts..., sum]
+
+    def observe(self, value: float, *labelvalues):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labelvalues):
+        """Context manager observing the duration of its block"""
+        if not self.registry.enabled:
+            return _NOOP
+        return _Timer(self, labelvalues)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+
+        samples = []
+        for labelvalues, counts in sorted(series.items()):
+            labels = self._labels(labelvalues)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append(('_sum', labels, counts[-1]))
+            samples.append(('_count', labels, cumulative))
+        return samples
+
+
+class _Timer:
+    # A plain class rather than @contextmanager: about 3x cheaper per use
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+class Registry:
+    """Named metrics plus scrape-time collectors, rendered as Prometheus text"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+        # (name, kind, help, callback returning [(labels, value)])
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict, float]]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, documentation, labelnames, buckets=buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, kind: str, documentation: str,
+                  callback: Callable[[], Iterable[Tuple[Dict, float]]]):
+        """Register a metric whose samples are computed when scraped"""
+        self._collectors.append((name, kind, documentation, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+
+        for name, kind, documentation, callback in self._collectors:
+            try:
+                samples = list(callback())
+            except Exception:
+                # One failing collector must not break the whole scrape
+                continue
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'drug_pricing_stage_seconds', 'Time spent in each request-handling stage', ['stage'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'drug_pricing_request_seconds', 'End-to-end API request latency', ['endpoint', 'status'])
+CACHE_LOOKUPS = REGISTRY.counter(
+    'drug_pricing_cache_lookups', 'SQLite-tier cache lookups by table and result', ['table', 'result'])
+CACHE_REFRESHES = REGISTRY.counter(
+    'drug_pricing_cache_refreshes', 'Pricing pairs warmed or refreshed ahead of requests by reason and result',
+    ['reason', 'result'])
+RATE_LIMITED = REGISTRY.counter(
+    'drug_pricing_rate_limited', 'Requests refused by a rate limit: client (429) or upstream quota (503)',
+    ['scope'])
+ERRORS = REGISTRY.counter(
+    'drug_pricing_errors', 'Exceptions caught and returned as error responses', ['operation'])
+
+
+def stage(name: str):
+    """Time a request-handling stage: parse, memory_cache, sqlite_cache, openfda, pricing, serialize"""
+    return STAGE_SECONDS.time(name)
+
+
+def ratio(hits: float, misses: float) -> Optional[float]:
+    total = hits + misses
+    return hits / total if total else None
@@ -0,0 +1,281 @@
+"""
+In-memory drug name index for the Drug Pricing Transparency API
+
+Indexes every cached drug under its name, generic name(s) and brand name(s)
+and answers three kinds of lookups without touching SQLite:
+
+- exact:  normalized term equality (dict lookup)
+- prefix: binary search over a sorted term array
+- fuzzy:  trigram overlap ranked by Dice coefficient, for typos
+
+Fuzzy matching counts shared trigrams with ``numpy.bincount`` over
+per-trigram posting arrays, so it stays well under a millisecond at 100k+
+drugs. NumPy is imported on first fuzzy lookup, not at import time.
+"""
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Field priority when the same term matches several records: a hit on the
+# name the drug was cached under beats a hit on one of its brand names,
+# which beats a hit on its generic name.
+FIELD_RANK = {'name': 0, 'brand_name': 1, 'generic_name': 2}
+
+# Minimum Dice similarity for a fuzzy match to be returned
+FUZZY_THRESHOLD = 0.5
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase and collapse whitespace so lookups are case-insensitive"""
+    return _WHITESPACE.sub(' ', name or '').strip().lower()
+
+
+def _trigrams(term: str) -> List[str]:
+    padded = f'  {term} '
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def _record_terms(record: Dict) -> Set[Tuple[str, int]]:
+    """(term, field rank) for every name a record can be found by"""
+    terms = set()
+    for field, rank in FIELD_RANK.items():
+        # generic_name and brand_name hold comma-joined OpenFDA lists
+        for value in (record.get(field) or '').split(','):
+            term = normalize_name(value)
+            if term:
+                terms.add((term, rank))
+    return terms
+
+
+class DrugNameIndex:
+    """Exact, prefix and fuzzy lookups over cached drug records"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records: List[Dict] = []
+        self._record_ids: Dict[str, int] = {}       # normalized name -> record id
+
+        self._terms: List[str] = []                 # term id -> term
+        self._term_ids: Dict[str, int] = {}
+        self._term_postings: List[List[Tuple[int, int]]] = []  # term id -> [(field rank, record id)]
+        self._term_trigram_counts: List[int] = []
+
+        self._sorted_terms: List[str] = []          # for prefix search
+        self._sorted_term_ids: List[int] = []
+        self._unsorted_term_ids: List[int] = []     # added since the last sort
+
+        self._trigram_postings: Dict[str, List[int]] = {}
+        self._trigram_arrays: Dict = {}             # trigram -> numpy posting array
+        self._trigram_count_array = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: Dict):
+        """Index a drug record, replacing any record cached under the same name"""
+        key = normalize_name(record.get('name'))
+        if not key:
+            return
+
+        with self._lock:
+            terms = _record_terms(record)
+            record_id = self._record_ids.get(key)
+            if record_id is None:
+                record_id = len(self._records)
+                self._records.append(record)
+                self._record_ids[key] = record_id
+            else:
+                # Names the updated record no longer has stop resolving to it
+                for term, rank in _record_terms(self._records[record_id]) - terms:
+                    self._remove_term(term, rank, record_id)
+                self._records[record_id] = record
+
+            for term, rank in terms:
+                self._add_term(term, rank, record_id)
+
+    def add_many(self, records):
+        """Index an iterable of drug records"""
+        with self._lock:
+            for record in records:
+                self.add(record)
+
+    def _add_term(self, term: str, rank: int, record_id: int):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._term_ids[term] = term_id
+            self._term_postings.append([])
+
+            trigrams = _trigrams(term)
+            self._term_trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self._trigram_postings.setdefault(trigram, []).append(term_id)
+                self._trigram_arrays.pop(trigram, None)
+            self._trigram_count_array = None
+            self._unsorted_term_ids.append(term_id)
+
+        postings = self._term_postings[term_id]
+        entry = (rank, record_id)
+        if entry not in postings:
+            postings.append(entry)
+            postings.sort()
+
+    def _remove_term(self, term: str, rank: int, record_id: int):
+        term_id = self._term_ids.get(term)
+        if term_id is not None:
+            postings = self._term_postings[term_id]
+            if (rank, record_id) in postings:
+                # A term left without postings stays indexed but matches nothing
+                postings.remove((rank, record_id))
+
+    def prepare(self):
+        """Build the sorted term array and posting arrays ahead of the first lookup"""
+        import numpy as np
+
+        with self._lock:
+            self._sort_terms()
+            for trigram in self._trigram_postings:
+                self._posting_array(trigram)
+            self._trigram_count_array = np.array(self._term_trigram_counts, dtype=np.int32)
+
+    def _sort_terms(self):
+        """Fold terms added since the last prefix lookup into the sorted array"""
+        pending = self._unsorted_term_ids
+        if not pending:
+            return
+        if len(pending) < 1000:
+            for term_id in pending:
+                term = self._terms[term_id]
+                pos = bisect.bisect_left(self._sorted_terms, term)
+                self._sorted_terms.insert(pos, term)
+                self._sorted_term_ids.insert(pos, term_id)
+        else:
+            # Bulk loads are cheaper to re-sort than to insert one by one
+            self._sorted_term_ids = sorted(self._sorted_term_ids + pending,
+                                           key=self._terms.__getitem__)
+            self._sorted_terms = [self._terms[t] for t in self._sorted_term_ids]
+        self._unsorted_term_ids = []
+
+    def _posting_array(self, trigram: str):
+        array = self._trigram_arrays.get(trigram)
+        if array is None:
+            import numpy as np
+            array = np.array(self._trigram_postings[trigram], dtype=np.int32)
+            self._trigram_arrays[trigram] = array
+        return array
+
+    def _best_record(self, term_id: int) -> Optional[Dict]:
+        postings = self._term_postings[term_id]
+        return self._records[postings[0][1]] if postings else None
+
+    def exact(self, query: str) -> Optional[Dict]:
+        """Return the best record whose name, brand or generic name equals the query"""
+        term_id = self._term_ids.get(normalize_name(query))
+        if term_id is None:
+            return None
+        with self._lock:
+            return self._best_record(term_id)
+
+    def prefix(self, query: str, limit: int = 10) -> List[Dict]:
+        """Return records with a term starting with the query, shortest term first"""
+        term = normalize_name(query)
+        if not term:
+            return []
+
+        with self._lock:
+            self._sort_terms()
+            lo = bisect.bisect_left(self._sorted_terms, term)
+            hi = bisect.bisect_left(self._sorted_terms, term + '\uffff', lo)
+            terms = self._sorted_terms[lo:hi]
+            # Shortest terms over the whole range, then cap the candidates so
+            # a one-letter prefix doesn't sort thousands of them
+            ranked = heapq.nsmallest(limit * 10, zip(map(len, terms), terms,
+                                                     self._sorted_term_ids[lo:hi]))
+            return self._collect([term_id for _, _, term_id in ranked], limit)
+
+    def fuzzy(self, query: str, limit: int = 10,
+              threshold: float = FUZZY_THRESHOLD) -> List[Tuple[Dict, float]]:
+        """Return (record, similarity) pairs ranked by trigram similarity"""
+        term = normalize_name(query)
+        if not term:
+            return []
+
+        import numpy as np
+
+        query_trigrams = _trigrams(term)
+        q = len(query_trigrams)
+        with self._lock:
+            postings = [self._posting_array(t) for t in query_trigrams
+                        if t in self._trigram_postings]
+            if not postings:
+                return []
+
+            if self._trigram_count_array is None:
+                self._trigram_count_array = np.array(self._term_trigram_counts, dtype=np.int32)
+
+            shared = np.bincount(np.concatenate(postings), minlength=len(self._terms))
+            # Dice >= t needs at least t*q/(2-t) shared trigrams, whatever
+            # the candidate's length, so most terms are dropped before scoring
+            min_shared = max(1, math.ceil(threshold * q / (2 - threshold)))
+            candidates = np.flatnonzero(shared >= min_shared)
+            scores = 2.0 * shared[candidates] / (q + self._trigram_count_array[candidates])
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+            order = np.argsort(-scores, kind='stable')[:limit * 2]
+
+            results, seen = [], set()
+            for i in order:
+                postings = self._term_postings[candidates[i]]
+                if not postings:
+                    continue
+                record_id = postings[0][1]
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                results.append((self._records[record_id], round(float(scores[i]), 3)))
+                if len(results) == limit:
+                    break
+            return results
+
+    def _collect(self, term_ids: List[int], limit: int) -> List[Dict]:
+        results, seen = [], set()
+        for term_id in term_ids:
+            postings = self._term_postings[term_id]
+            if not postings:
+                continue
+            record_id = postings[0][1]
+            if record_id not in seen:
+                seen.add(record_id)
+                results.append(self._records[record_id])
+                if len(results) == limit:
+                    break
+        return results
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Ranked suggestions: exact match, then prefix matches, then fuzzy matches"""
+        results: List[Dict] = []
+        seen = set()
+
+        def take(record, match, score):
+            key = normalize_name(record.get('name'))
+            if key not in seen and len(results) < limit:
+                seen.add(key)
+                results.append({**record, 'match': match, 'score': score})
+
+        exact = self.exact(query)
+        if exact:
+            take(exact, 'exact', 1.0)
+        for record in self.prefix(query, limit):
+            take(record, 'prefix', 1.0)
+        if len(results) < limit:
+            for record, score in self.fuzzy(query, limit):
+                take(record, 'fuzzy', score)
+
+        return results
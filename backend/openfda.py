@@ -0,0 +1,336 @@
+"""
+OpenFDA HTTP client for the Drug Pricing Transparency API
+
+One shared requests.Session keeps TLS connections to api.fda.gov alive
+between calls. Failed calls (connection errors, timeouts, 429 and 5xx) are
+retried with jittered exponential backoff, and identical concurrent calls
+are coalesced so N simultaneous cache misses make one upstream request.
+Interactive callers are never coalesced onto a batch call, which may wait
+in the scheduler's batch queue far longer than a user request should.
+
+Every attempt, retries included, is first admitted by an optional
+rate_limit.UpstreamScheduler so the service stays within its OpenFDA
+quota; a 429 from OpenFDA pauses the scheduler for the Retry-After.
+
+AsyncOpenFDAClient offers the same behaviour on asyncio for the ASGI
+serving mode; it needs the optional ``aiohttp`` package.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import BATCH, INTERACTIVE, UpstreamScheduler, current_priority
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_AFTER = 10.0  # seconds; never honour a longer Retry-After
+
+
+def _backoff_delay(attempt: int, backoff: float, max_backoff: float) -> float:
+    # "Full jitter": spread retries uniformly so synchronized clients
+    # do not hammer the upstream in lockstep
+    return random.uniform(0, min(max_backoff, backoff * (2 ** attempt)))
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get('Retry-After')
+    try:
+        return min(float(value), MAX_RETRY_AFTER) if value else None
+    except ValueError:
+        return None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+def _joinable(key: Hashable, priority: str):
+    """Flight keys a caller at ``priority`` may join: batch callers also ride interactive calls"""
+    return [(key, INTERACTIVE)] if priority != BATCH else [(key, INTERACTIVE), (key, BATCH)]
+
+
+class SingleFlight:
+    """Run at most one in-flight call per key and priority; concurrent callers share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, priority: str = INTERACTIVE):
+        with self._lock:
+            call = next((self._calls[k] for k in _joinable(key, priority) if k in self._calls), None)
+            leader = call is None
+            if leader:
+                key = (key, BATCH if priority == BATCH else INTERACTIVE)
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class OpenFDAClient:
+    """Pooled, retrying, request-coalescing client for the OpenFDA API"""
+
+    def __init__(self, base_url: str = 'https://api.fda.gov', api_key: str = '',
+                 timeout: float = 10.0, pool_size: int = 20,
+                 max_retries: int = 3, backoff: float = 0.25, max_backoff: float = 4.0,
+                 scheduler: Optional[UpstreamScheduler] = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.scheduler = scheduler
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._single_flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self.requests_sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.connection_errors = 0
+        self.error_responses = 0  # 429 and 5xx
+        self.throttled = 0  # 429s from OpenFDA
+
+    def get(self, path: str, params: Dict) -> requests.Response:
+        """GET ``path`` with retries; identical concurrent calls share one request"""
+        params = dict(params)
+        if self.api_key:
+            params['api_key'] = self.api_key
+
+        key = (path, tuple(sorted(params.items())))
+        return self._single_flight.do(key, lambda: self._get_with_retries(path, params),
+                                      current_priority())
+
+    def _get_with_retries(self, path: str, params: Dict) -> requests.Response:
+        url = f'{self.base_url}{path}'
+        attempt = 0
+        while True:
+            if self.scheduler is not None:
+                self.scheduler.acquire()
+            try:
+                self._count('requests_sent')
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count('timeouts' if isinstance(e, requests.Timeout) else 'connection_errors')
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                delay = _backoff_delay(attempt, self.backoff, self.max_backoff)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                self._count('error_responses')
+                retry_after = _retry_after(response.headers)
+                if response.status_code == 429:
+                    self._count('throttled')
+                    if self.scheduler is not None:
+                        self.scheduler.pause(retry_after or self.max_backoff)
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    return response
+                delay = retry_after or _backoff_delay(attempt, self.backoff, self.max_backoff)
+
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict:
+        """Return upstream request, retry, failure and coalescing counters"""
+        return {
+            'requests_sent': self.requests_sent,
+            'retries': self.retries,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'connection_errors': self.connection_errors,
+            'error_responses': self.error_responses,
+            'throttled': self.throttled,
+            'coalesced': self._single_flight.coalesced,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight; callers must share one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable, priority: str = INTERACTIVE):
+        future = next((self._calls[k] for k in _joinable(key, priority) if k in self._calls), None)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one cancelled follower must not cancel the shared call
+            return await asyncio.shield(future)
+
+        key = (key, BATCH if priority == BATCH else INTERACTIVE)
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a call nobody else awaited does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+class AsyncResponse:
+    """Fully-read upstream response, safe to share between coalesced callers"""
+
+    def __init__(self, status_code: int, headers, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncOpenFDAClient:
+    """Non-blocking OpenFDA client with the same retry and coalescing rules"""
+
+    def __init__(self, base_url: str = 'https://api.fda.gov', api_key: str = '',
+                 timeout: float = 10.0, max_connections: int = 500,
+                 max_retries: int = 3, backoff: float = 0.25, max_backoff: float = 4.0,
+                 scheduler: Optional[UpstreamScheduler] = None):
+        import aiohttp
+
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.scheduler = scheduler
+        self._errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        self._session = None  # created on first use, inside the running loop
+
+        self._single_flight = AsyncSingleFlight()
+        self.requests_sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.connection_errors = 0
+        self.error_responses = 0  # 429 and 5xx
+        self.throttled = 0  # 429s from OpenFDA
+
+    def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def get(self, path: str, params: Dict) -> AsyncResponse:
+        """GET ``path`` with retries; identical concurrent calls share one request"""
+        params = {k: str(v) for k, v in params.items()}
+        if self.api_key:
+            params['api_key'] = self.api_key
+
+        key = (path, tuple(sorted(params.items())))
+        return await self._single_flight.do(key, lambda: self._get_with_retries(path, params),
+                                            current_priority())
+
+    async def _get_with_retries(self, path: str, params: Dict) -> AsyncResponse:
+        url = f'{self.base_url}{path}'
+        session = self._get_session()
+        attempt = 0
+        while True:
+            if self.scheduler is not None:
+                await self.scheduler.acquire_async()
+            try:
+                self.requests_sent += 1
+                async with session.get(url, params=params) as raw:
+                    response = AsyncResponse(raw.status, raw.headers, await raw.read())
+            except self._errors as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                else:
+                    self.connection_errors += 1
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = _backoff_delay(attempt, self.backoff, self.max_backoff)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                self.error_responses += 1
+                retry_after = _retry_after(response.headers)
+                if response.status_code == 429:
+                    self.throttled += 1
+                    if self.scheduler is not None:
+                        self.scheduler.pause(retry_after or self.max_backoff)
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    return response
+                delay = retry_after or _backoff_delay(attempt, self.backoff, self.max_backoff)
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Return upstream request, retry, failure and coalescing counters"""
+        return {
+            'requests_sent': self.requests_sent,
+            'retries': self.retries,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'connection_errors': self.connection_errors,
+            'error_responses': self.error_responses,
+            'throttled': self.throttled,
+            'coalesced': self._single_flight.coalesced,
+        }
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
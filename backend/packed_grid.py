@@ -0,0 +1,207 @@
+"""
+Packed pricing grids for the Drug Pricing Transparency API
+
+A (drug, region) pricing grid used to be nine pricing_cache rows, each
+repeating the drug, region, plan and pharmacy names, and nine dicts in
+memory. A PackedGrid is one bytes object instead, stored as one BLOB
+column and kept as-is in the memory cache:
+
+    offset 0   format version (uint8), flags (uint8), cell count n (uint16)
+    offset 4   n plan codes, then n pharmacy codes (uint8)
+    padding    to a multiple of 8 bytes
+    values     n costs, n copays, n deductibles (float64, NaN where unknown)
+
+All integers and floats are little-endian. Plan and pharmacy names are
+interned as one-byte codes by a LabelCodes table; SQLiteCacheBackend
+persists it (pricing_labels) so every process sharing a database reads
+the same names. ``values`` and ``column()`` are memoryviews of the blob,
+so reading them copies nothing (NumPy callers can wrap the same buffer
+with ``np.frombuffer``); records() builds the API's list of dicts with one
+struct unpack, since grids share a handful of plan/pharmacy layouts whose
+decoded names are cached.
+"""
+
+import math
+import struct
+import sys
+import threading
+from array import array
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+FORMAT_VERSION = 1
+VALUE_FIELDS = ('cost', 'copay', 'deductible')
+MAX_LABELS = 255
+MAX_LAYOUTS = 1024  # decoded plan/pharmacy layouts cached per LabelCodes
+
+_HEADER = struct.Struct('<BBH')
+_HAS_MISSING = 0x01  # flag: some values are NaN (unknown)
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _values_offset(cells: int) -> int:
+    return (_HEADER.size + 2 * cells + 7) & ~7
+
+
+@lru_cache(maxsize=64)
+def _values_struct(cells: int) -> struct.Struct:
+    return struct.Struct(f'<{3 * cells}d')
+
+
+def _pack_doubles(values) -> bytes:
+    data = array('d', values)
+    if not _LITTLE_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+
+class LabelCodes:
+    """Plan and pharmacy type names interned as one-byte codes
+
+    ``assign`` gives a new name its code (by default the next free one) and
+    ``fetch`` returns every known (code, name), to pick up codes another
+    process assigned.
+    """
+
+    def __init__(self, assign: Optional[Callable[[str], int]] = None,
+                 fetch: Optional[Callable[[], Iterable[Tuple[int, str]]]] = None):
+        self._assign = assign
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._codes: Dict[str, int] = {}
+        # Indexed by code; None for codes not (yet) known here
+        self.names: List[Optional[str]] = [None]
+        self._layouts: Dict[bytes, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+
+    def _add(self, code: int, name: str):
+        if not 0 < code <= MAX_LABELS:
+            raise ValueError(f'Label code {code} for {name!r} is out of range')
+        if code >= len(self.names):
+            self.names.extend([None] * (code + 1 - len(self.names)))
+        self.names[code] = name
+        self._codes[name] = code
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is not None:
+            return code
+        with self._lock:
+            code = self._codes.get(name)
+            if code is None:
+                code = self._assign(name) if self._assign else len(self._codes) + 1
+                self._add(code, name)
+            return code
+
+    def name(self, code: int) -> str:
+        """The name for ``code``, reloading the table once if it is unknown here"""
+        name = self.names[code] if code < len(self.names) else None
+        if name is None:
+            self.reload()
+            name = self.names[code] if code < len(self.names) else None
+            if name is None:
+                raise KeyError(f'Unknown label code {code}')
+        return name
+
+    def decode(self, codes: bytes) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """Plan and pharmacy names for a grid's 2n label codes"""
+        layout = self._layouts.get(codes)
+        if layout is None:
+            cells = len(codes) // 2
+            names = tuple(self.name(code) for code in codes)
+            layout = names[:cells], names[cells:]
+            if len(self._layouts) < MAX_LAYOUTS:
+                self._layouts[codes] = layout
+        return layout
+
+    def reload(self):
+        if self._fetch is None:
+            return
+        with self._lock:
+            for code, name in self._fetch():
+                self._add(code, name)
+
+
+class PackedGrid:
+    """One pricing grid as a single bytes object (see the module docstring)"""
+
+    __slots__ = ('blob', 'labels')
+
+    def __init__(self, blob: bytes, labels: LabelCodes):
+        version, _, _ = _HEADER.unpack_from(blob)
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported packed grid version {version}')
+        self.blob = blob
+        self.labels = labels
+
+    @classmethod
+    def pack(cls, codes: bytes, values: bytes, labels: LabelCodes,
+             missing: bool = False) -> 'PackedGrid':
+        """Build a grid from 2n label codes and 3n little-endian float64 values
+
+        ``missing`` marks grids with NaN (unknown) values.
+        """
+        cells = len(codes) // 2
+        header = _HEADER.pack(FORMAT_VERSION, _HAS_MISSING if missing else 0, cells) + codes
+        padding = b'\0' * (_values_offset(cells) - len(header))
+        return cls(header + padding + values, labels)
+
+    @classmethod
+    def from_records(cls, records: List[Dict], labels: LabelCodes) -> 'PackedGrid':
+        """Pack the API's list of per-plan/pharmacy dicts"""
+        code = labels.code
+        codes = bytes([code(r['plan_type']) for r in records]
+                      + [code(r['pharmacy_type']) for r in records])
+        values = [r.get(field) for field in VALUE_FIELDS for r in records]
+        missing = None in values
+        if missing:
+            values = [math.nan if value is None else value for value in values]
+        return cls.pack(codes, _pack_doubles(values), labels, missing)
+
+    def __len__(self) -> int:
+        return _HEADER.unpack_from(self.blob)[2]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PackedGrid) and self.records() == other.records()
+
+    def __repr__(self) -> str:
+        return f'PackedGrid({len(self)} cells, {len(self.blob)} bytes)'
+
+    @property
+    def values(self):
+        """The 3n values (costs, copays, deductibles) as a float64 view of the blob"""
+        view = memoryview(self.blob)[_values_offset(len(self)):]
+        if _LITTLE_ENDIAN:
+            return view.cast('d')
+        data = array('d', view.tobytes())
+        data.byteswap()
+        return data
+
+    def column(self, field: str):
+        """One value field for every cell, without copying"""
+        cells = len(self)
+        start = VALUE_FIELDS.index(field) * cells
+        return self.values[start:start + cells]
+
+    def mean_cost(self) -> Optional[float]:
+        costs = [cost for cost in self.column('cost') if cost == cost]
+        return sum(costs) / len(costs) if costs else None
+
+    def records(self) -> List[Dict]:
+        """The grid as the API's list of per-plan/pharmacy dicts"""
+        blob = self.blob
+        _, flags, cells = _HEADER.unpack_from(blob)
+        plans, pharmacies = self.labels.decode(blob[_HEADER.size:_HEADER.size + 2 * cells])
+        values = _values_struct(cells).unpack_from(blob, _values_offset(cells))
+        if flags & _HAS_MISSING:
+            values = [None if value != value else value for value in values]
+        return [{'plan_type': plan, 'pharmacy_type': pharmacy, 'cost': cost, 'copay': copay,
+                 'deductible': deductible}
+                for plan, pharmacy, cost, copay, deductible
+                in zip(plans, pharmacies, values[:cells], values[cells:2 * cells], values[2 * cells:])]
+
+
+def as_packed(pricing, labels: LabelCodes) -> PackedGrid:
+    """A PackedGrid from either a PackedGrid or the API's list of dicts"""
+    if isinstance(pricing, PackedGrid) and pricing.labels is labels:
+        return pricing
+    return PackedGrid.from_records(pricing if isinstance(pricing, list) else pricing.records(), labels)
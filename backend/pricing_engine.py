@@ -0,0 +1,212 @@
+"""
+Vectorized pricing engine for the Drug Pricing Transparency API
+
+Computes cost, copay and deductible for whole drug x ZIP x plan x pharmacy
+grids as NumPy array operations instead of one dict at a time.
+
+Prices are simulated (real Medicare pricing APIs need special access). Each
+cell is derived from a counter-based hash of (seed, drug, ZIP, plan,
+pharmacy), so a given engine prices the same drug and ZIP identically no
+matter how requests are batched, and two engines with the same seed agree.
+"""
+
+import os
+import zlib
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from packed_grid import LabelCodes, PackedGrid
+
+# cost_factor scales the simulated cost for every cell in that row/column;
+# copay_rate and deductible_rate are fractions of the cost.
+PlanType = namedtuple('PlanType', ['name', 'cost_factor', 'copay_rate', 'deductible_rate'],
+                      defaults=[1.0, 0.2, 0.8])
+PharmacyType = namedtuple('PharmacyType', ['name', 'cost_factor'], defaults=[1.0])
+
+DEFAULT_PLAN_TYPES = (
+    PlanType('Medicare Part D Standard'),
+    PlanType('Medicare Advantage PPO'),
+    PlanType('Medicare Advantage HMO'),
+)
+DEFAULT_PHARMACY_TYPES = (
+    PharmacyType('Retail Pharmacy'),
+    PharmacyType('Mail Order'),
+    PharmacyType('Preferred Pharmacy'),
+)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_ZIP_STRIDE = np.uint64(0xD6E8FEB86659FD93)
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: a fast, well-distributed uint64 -> uint64 hash"""
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * _MIX1
+    x = (x ^ (x >> np.uint64(27))) * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+
+def _splitmix64_int(x: int) -> int:
+    """Scalar twin of _splitmix64 on Python ints, for single-grid lookups"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _unit_interval(x: np.ndarray) -> np.ndarray:
+    """Map uint64 hashes to floats uniformly distributed in [0, 1)"""
+    return (x >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def drug_key(drug_name: str) -> int:
+    return zlib.crc32(drug_name.encode('utf-8'))
+
+
+def zip_key(zip_code: str) -> int:
+    return int(zip_code) if zip_code.isdigit() else zlib.crc32(zip_code.encode('utf-8'))
+
+
+class PricingGrid:
+    """Cost, copay and deductible arrays of shape (drugs, zips, plans, pharmacies)"""
+
+    def __init__(self, drug_names: Sequence[str], zip_codes: Sequence[str],
+                 plan_types: Sequence[PlanType], pharmacy_types: Sequence[PharmacyType],
+                 cost: np.ndarray, copay: np.ndarray, deductible: np.ndarray):
+        self.drug_names = list(drug_names)
+        self.zip_codes = list(zip_codes)
+        self.plan_types = plan_types
+        self.pharmacy_types = pharmacy_types
+        self.cost = cost
+        self.copay = copay
+        self.deductible = deductible
+        self._packed = None  # (labels, codes, values) for packed()
+
+    @property
+    def shape(self):
+        return self.cost.shape
+
+    def records(self, drug_index: int, zip_index: int) -> List[Dict]:
+        """Return one (drug, zip) grid in the API's list-of-dicts shape"""
+        cost = self.cost[drug_index, zip_index].tolist()
+        copay = self.copay[drug_index, zip_index].tolist()
+        deductible = self.deductible[drug_index, zip_index].tolist()
+
+        pricing_data = []
+        for p, plan in enumerate(self.plan_types):
+            for f, pharmacy in enumerate(self.pharmacy_types):
+                pricing_data.append({
+                    'plan_type': plan.name,
+                    'pharmacy_type': pharmacy.name,
+                    'cost': cost[p][f],
+                    'copay': copay[p][f],
+                    'deductible': deductible[p][f]
+                })
+        return pricing_data
+
+    def packed(self, drug_index: int, zip_index: int, labels: LabelCodes) -> PackedGrid:
+        """Return one (drug, zip) grid as a PackedGrid, in the same plan-major cell order"""
+        if self._packed is None or self._packed[0] is not labels:
+            codes = bytes([labels.code(plan.name) for plan in self.plan_types
+                           for _ in self.pharmacy_types]
+                          + [labels.code(pharmacy.name) for _ in self.plan_types
+                             for pharmacy in self.pharmacy_types])
+            # Every grid's cost, copay and deductible cells as one little-endian row
+            values = np.stack([self.cost, self.copay, self.deductible], axis=2)
+            values = values.reshape(values.shape[0], values.shape[1], -1).astype('<f8')
+            self._packed = labels, codes, values
+        _, codes, values = self._packed
+        return PackedGrid.pack(codes, values[drug_index, zip_index].tobytes(), labels)
+
+
+class PricingEngine:
+    """Seedable, vectorized generator of simulated pricing grids"""
+
+    def __init__(self, plan_types: Sequence[PlanType] = DEFAULT_PLAN_TYPES,
+                 pharmacy_types: Sequence[PharmacyType] = DEFAULT_PHARMACY_TYPES,
+                 seed: Optional[int] = None,
+                 base_cost_range=(50.0, 300.0), multiplier_range=(0.7, 1.3)):
+        self.plan_types = tuple(plan_types)
+        self.pharmacy_types = tuple(pharmacy_types)
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'little')
+        self.seed = np.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+        self.base_cost_range = base_cost_range
+        self.multiplier_range = multiplier_range
+
+        self._plan_factor = np.array([p.cost_factor for p in self.plan_types])[:, None]
+        self._pharmacy_factor = np.array([f.cost_factor for f in self.pharmacy_types])[None, :]
+        self._copay_rate = np.array([p.copay_rate for p in self.plan_types])[:, None]
+        self._deductible_rate = np.array([p.deductible_rate for p in self.plan_types])[:, None]
+        n_cells = len(self.plan_types) * len(self.pharmacy_types)
+        self._cell_salt = ((np.arange(1, n_cells + 1, dtype=np.uint64) * _MIX2)
+                           .reshape(len(self.plan_types), len(self.pharmacy_types)))
+
+    @property
+    def plan_names(self) -> List[str]:
+        return [plan.name for plan in self.plan_types]
+
+    @property
+    def pharmacy_names(self) -> List[str]:
+        return [pharmacy.name for pharmacy in self.pharmacy_types]
+
+    def grid(self, drug_names: Sequence[str], zip_codes: Sequence[str]) -> PricingGrid:
+        """Price every drug x ZIP x plan x pharmacy combination at once"""
+        drugs = np.fromiter((drug_key(d) for d in drug_names), dtype=np.uint64, count=len(drug_names))
+        zips = np.fromiter((zip_key(z) for z in zip_codes), dtype=np.uint64, count=len(zip_codes))
+
+        # One hash per (drug, zip) drives the base cost ...
+        keys = _splitmix64(self.seed ^ drugs[:, None]) ^ (zips[None, :] * _ZIP_STRIDE)
+        keys = _splitmix64(keys)
+        lo, hi = self.base_cost_range
+        base_cost = lo + (hi - lo) * _unit_interval(keys)
+
+        # ... and one per cell drives that plan/pharmacy's variation
+        cell_hash = _splitmix64(keys[:, :, None, None] ^ self._cell_salt)
+        mlo, mhi = self.multiplier_range
+        multiplier = mlo + (mhi - mlo) * _unit_interval(cell_hash)
+
+        cost = np.round(base_cost[:, :, None, None] * multiplier
+                        * self._plan_factor * self._pharmacy_factor, 2)
+        copay = np.round(cost * self._copay_rate, 2)
+        deductible = np.round(cost * self._deductible_rate, 2)
+
+        return PricingGrid(drug_names, zip_codes, self.plan_types, self.pharmacy_types,
+                           cost, copay, deductible)
+
+    def records(self, drug_name: str, zip_code: str) -> List[Dict]:
+        """Price a single (drug, zip) pair as a list of per-plan/pharmacy dicts
+
+        Uses scalar arithmetic that mirrors grid() operation for operation,
+        since NumPy's per-call overhead dominates for a single 3x3 grid.
+        The results are identical to ``grid([drug], [zip]).records(0, 0)``.
+        """
+        seed = int(self.seed)
+        key = _splitmix64_int(seed ^ drug_key(drug_name))
+        key = _splitmix64_int(key ^ ((zip_key(zip_code) * int(_ZIP_STRIDE)) & _MASK64))
+        lo, hi = self.base_cost_range
+        base_cost = lo + (hi - lo) * ((key >> 11) * (1.0 / (1 << 53)))
+        mlo, mhi = self.multiplier_range
+
+        pricing_data = []
+        cell = 0
+        for plan in self.plan_types:
+            for pharmacy in self.pharmacy_types:
+                cell += 1
+                cell_hash = _splitmix64_int(key ^ ((cell * int(_MIX2)) & _MASK64))
+                multiplier = mlo + (mhi - mlo) * ((cell_hash >> 11) * (1.0 / (1 << 53)))
+                # round(x * 100) / 100 is exactly what np.round(x, 2) computes
+                cost = round(base_cost * multiplier * plan.cost_factor * pharmacy.cost_factor * 100) / 100
+                pricing_data.append({
+                    'plan_type': plan.name,
+                    'pharmacy_type': pharmacy.name,
+                    'cost': cost,
+                    'copay': round(cost * plan.copay_rate * 100) / 100,
+                    'deductible': round(cost * plan.deductible_rate * 100) / 100
+                })
+        return pricing_data
@@ -0,0 +1,209 @@
+"""
+Token-bucket rate limiting for the Drug Pricing Transparency API
+
+UpstreamScheduler admits calls to OpenFDA within the configured quota:
+a per-second rate with a burst allowance, plus an optional daily quota.
+Interactive requests may use every token; batch and warm-up traffic
+(marked with ``upstream_priority(BATCH)``) only uses tokens above a
+reserve, so a background job can never starve users. A caller that
+would wait longer than its priority's queue timeout gets
+UpstreamSaturated at once instead of joining an unbounded queue, and a
+429 from OpenFDA pauses all callers for its Retry-After.
+
+ClientRateLimiter applies one token bucket per client address to the
+inbound /api/* routes.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from memory_cache import MISSING, TTLCache
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def upstream_priority(priority: str):
+    """Run the enclosed upstream calls (in this thread or task) at ``priority``"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    """The upstream priority of calls made here (set by upstream_priority)"""
+    return _priority.get()
+
+
+class UpstreamSaturated(Exception):
+    """Raised when the upstream quota cannot admit a call in time"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'Upstream quota exhausted; retry in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Tokens refill continuously at ``rate`` per second up to ``capacity``; not locked"""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, needed: float) -> float:
+        """Seconds until the bucket holds ``needed`` tokens (0 if it already does)"""
+        if self.tokens >= needed:
+            return 0.0
+        if needed > self.capacity:
+            return float('inf')
+        return (needed - self.tokens) / self.rate
+
+
+class UpstreamScheduler:
+    """Admission control for upstream calls: rate, burst, daily quota and priorities"""
+
+    def __init__(self, rate: float, burst: int, daily_quota: int = 0,
+                 batch_reserve: float = 0.5, interactive_timeout: float = 2.0,
+                 batch_timeout: float = 60.0, clock=time.monotonic):
+        self.enabled = rate > 0
+        self._buckets: List[TokenBucket] = []
+        if self.enabled:
+            self._buckets.append(TokenBucket(rate, max(1, burst), clock))
+            if daily_quota > 0:
+                self._buckets.append(TokenBucket(daily_quota / 86400, daily_quota, clock))
+        # Tokens batch calls must leave in the burst bucket for interactive ones;
+        # at most burst - 1, or a batch call could never be admitted
+        self.batch_floor = min(max(1, burst) * batch_reserve, max(1, burst) - 1)
+        self.timeouts = {INTERACTIVE: interactive_timeout, BATCH: batch_timeout}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def _try_acquire(self, priority: str) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        with self._lock:
+            now = self._clock()
+            if now < self._paused_until:
+                return self._paused_until - now
+            for bucket in self._buckets:
+                bucket.refill()
+            floor = self.batch_floor if priority == BATCH else 0.0
+            wait = max([self._buckets[0].wait_time(1 + floor)]
+                       + [bucket.wait_time(1) for bucket in self._buckets[1:]])
+            if wait == 0.0:
+                for bucket in self._buckets:
+                    bucket.tokens -= 1
+                self.admitted += 1
+            return wait
+
+    def _admit(self, priority: Optional[str], started: float) -> float:
+        """Seconds to sleep before trying again; raises if that would exceed the timeout"""
+        priority = priority or _priority.get()
+        wait = self._try_acquire(priority)
+        if wait == 0.0:
+            return 0.0
+        remaining = started + self.timeouts.get(priority, self.timeouts[INTERACTIVE]) - self._clock()
+        if wait > remaining:
+            with self._lock:
+                self.rejected += 1
+            raise UpstreamSaturated(wait)
+        return wait
+
+    def acquire(self, priority: Optional[str] = None):
+        """Block until the call is admitted, or raise UpstreamSaturated"""
+        if not self.enabled:
+            return
+        started = self._clock()
+        wait = self._admit(priority, started)
+        if wait:
+            with self._lock:
+                self.waited += 1
+        while wait:
+            time.sleep(wait)
+            wait = self._admit(priority, started)
+
+    async def acquire_async(self, priority: Optional[str] = None):
+        """Awaitable acquire() for the async client"""
+        if not self.enabled:
+            return
+        started = self._clock()
+        wait = self._admit(priority, started)
+        if wait:
+            with self._lock:
+                self.waited += 1
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._admit(priority, started)
+
+    def pause(self, seconds: float):
+        """Admit nothing for ``seconds``, e.g. after a 429 from the upstream"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.refill()
+            return {
+                'enabled': self.enabled,
+                'admitted': self.admitted,
+                'waited': self.waited,
+                'rejected': self.rejected,
+                'tokens': round(self._buckets[0].tokens, 2) if self._buckets else None,
+                'daily_tokens': round(self._buckets[1].tokens, 1) if len(self._buckets) > 1 else None,
+            }
+
+
+class ClientRateLimiter:
+    """One token bucket per client; idle clients are forgotten after their bucket refills"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100000, clock=time.monotonic):
+        self.enabled = rate > 0
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        # A bucket idle this long is full again, so dropping it changes nothing
+        self._buckets = TTLCache(max_clients, self.burst / rate if self.enabled else 1, clock=clock)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, client: str) -> float:
+        """Take a token for ``client`` and return 0, or the seconds until it may retry"""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is MISSING:
+                bucket = TokenBucket(self.rate, self.burst, self._clock)
+            bucket.refill()
+            wait = bucket.wait_time(1)
+            if wait == 0.0:
+                bucket.tokens -= 1
+            else:
+                self.limited += 1
+            self._buckets.set(client, bucket)
+            return wait
+
+    def stats(self) -> Dict:
+        return {'enabled': self.enabled, 'clients': len(self._buckets), 'limited': self.limited}
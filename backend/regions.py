@@ -0,0 +1,76 @@
+"""
+ZIP code to pricing region lookup for the Drug Pricing Transparency API
+
+Part D premiums and negotiated prices vary by plan region, not by ZIP
+code: the 50 states and DC fall into 34 prescription drug plan regions of
+one or more states each. Caching pricing per literal ZIP meant tens of
+thousands of keys per drug, each missing on its first request, for grids
+that are the same across a whole region.
+
+data/zip_regions.csv maps ranges of 5-digit ZIPs (USPS 3-digit prefixes,
+for the bundled table) to a state and a region key: R01-R34 for the PDP
+regions, PR, VI and GU for the territories and MIL for APO/FPO addresses.
+Later rows override earlier ones, so a ZIP split off from its prefix can
+be given its own row.
+
+RegionIndex expands the table into one byte per possible ZIP, indexed by
+the ZIP as an integer (100 KB), so a lookup is an int() and an array
+read. ZIPs the table doesn't cover are their own region.
+"""
+
+import csv
+import os
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+REGIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'zip_regions.csv')
+ZIP_SPACE = 100000
+
+# (first ZIP, last ZIP, region key), inclusive
+RegionRange = Tuple[int, int, str]
+
+
+class RegionIndex:
+    """Maps 5-digit ZIP codes to pricing region keys"""
+
+    def __init__(self, ranges: Iterable[RegionRange] = ()):
+        # Code 0 marks ZIPs outside the table
+        self.names: List[str] = ['']
+        codes = {}
+        self._codes = array('B', bytes(ZIP_SPACE))
+        for first, last, region in ranges:
+            if not 0 <= first <= last < ZIP_SPACE:
+                raise ValueError(f'Invalid ZIP range {first:05d}-{last:05d}')
+            if '|' in region or region.isdigit():
+                # '|' separates cache key parts; all-digit keys could collide with ZIPs
+                raise ValueError(f'Invalid region key: {region!r}')
+            code = codes.get(region)
+            if code is None:
+                if len(self.names) > 255:
+                    raise ValueError('More than 255 regions')
+                code = codes[region] = len(self.names)
+                self.names.append(region)
+            self._codes[first:last + 1] = array('B', [code]) * (last - first + 1)
+
+    def __len__(self) -> int:
+        """Number of distinct regions"""
+        return len(self.names) - 1
+
+    def region(self, zip_code: str) -> str:
+        """The region key for a ZIP code, or the ZIP itself if the table doesn't cover it"""
+        if len(zip_code) == 5 and zip_code.isdigit():
+            code = self._codes[int(zip_code)]
+            if code:
+                return self.names[code]
+        return zip_code
+
+    def coverage(self) -> int:
+        """Number of ZIP codes the table assigns to a region"""
+        return ZIP_SPACE - self._codes.count(0)
+
+
+def load_regions(path: Optional[str] = None) -> RegionIndex:
+    """Build a RegionIndex from a first_zip,last_zip,state,region CSV (the bundled table by default)"""
+    with open(path or REGIONS_PATH, newline='') as f:
+        return RegionIndex((int(row['first_zip']), int(row['last_zip']), row['region'])
+                           for row in csv.DictReader(f))
@@ -0,0 +1,234 @@
+"""
+Response encoding for the Drug Pricing Transparency API
+
+Shared by the Flask (app.py) and ASGI (asgi.py) front ends:
+
+* JSON is encoded compactly, with orjson when it is installed.
+* Bodies of at least COMPRESS_MIN_SIZE bytes are compressed with brotli
+  (when installed) or gzip, whichever the client's Accept-Encoding prefers
+  and we support; bulk NDJSON streams are compressed block by block.
+* Cacheable responses carry a strong ETag (a hash of the encoded body, so
+  identical cache entries always get the same tag) and a Cache-Control
+  max-age. A GET whose If-None-Match matches gets 304 Not Modified, with
+  no body to serialize onto the wire.
+* Results carrying ``retry_after`` (OpenFDA saturated or failing) are sent
+  as 503 with a Retry-After header; rate-limited clients get 429 the same way.
+* Pricing can be shaped column-wise: plan and pharmacy names once, then one
+  array per value field, instead of both names repeated in every record.
+"""
+
+import gzip
+import hashlib
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies fit in a packet either way
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # fast; higher qualities cost far more CPU per request
+NDJSON_BLOCK = 500  # bulk records per encoded chunk (one line in columnar shape)
+
+PRICING_KEYS = ('plan_type', 'pharmacy_type')
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def dumps(data) -> bytes:
+    """Encode JSON without whitespace"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return _encoder.encode(data).encode()
+
+
+def accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The best content coding we support that the client accepts, or None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if weights.get(coding, weights.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], coding: str) -> Iterator[bytes]:
+    """Compress a chunked body, flushing after each chunk so it streams"""
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip framing
+    for chunk in chunks:
+        out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison (RFC 9110 13.1.2), ignoring the content-coding suffix"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    base = tag.strip('"')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"').split('-', 1)[0] == base:
+            return True
+    return False
+
+
+def result_status(result) -> int:
+    """503 for a service result that asks the client to retry later, else 200"""
+    return 503 if isinstance(result, dict) and 'retry_after' in result else 200
+
+
+def encode_json(data, status: int = 200, method: str = 'GET', cacheable: bool = False,
+                max_age: int = 0, if_none_match: Optional[str] = None,
+                accept_encoding: Optional[str] = None,
+                compression: bool = True) -> Tuple[int, Dict[str, str], bytes]:
+    """Encode a JSON response as (status, headers, body), honoring If-None-Match"""
+    body = dumps(data)
+    headers = {'Content-Type': 'application/json'}
+    if status in (429, 503) and isinstance(data, dict) and 'retry_after' in data:
+        headers['Retry-After'] = str(data['retry_after'])
+    tag = None
+    if cacheable and status == 200:
+        tag = etag(body)
+        headers['ETag'] = tag
+        headers['Cache-Control'] = f'private, max-age={max_age}'
+        if method in ('GET', 'HEAD') and etag_matches(if_none_match, tag):
+            del headers['Content-Type']
+            return 304, headers, b''
+
+    if compression:
+        headers['Vary'] = 'Accept-Encoding'
+        coding = accepted_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_SIZE else None
+        if coding:
+            body = compress(body, coding)
+            headers['Content-Encoding'] = coding
+            if tag:
+                # Each encoding is a different representation, so a different strong tag
+                headers['ETag'] = f'{tag[:-1]}-{coding}"'
+    return status, headers, body
+
+
+def _value_fields(pricing: Iterable[Dict]) -> List[str]:
+    fields = {}
+    for record in pricing:
+        for field in record:
+            if field not in PRICING_KEYS:
+                fields[field] = None
+    return list(fields)
+
+
+def columnar_pricing(pricing: List[Dict], plans: Sequence[str], pharmacies: Sequence[str]) -> Dict:
+    """One (drug, zip) grid as plan/pharmacy names plus a plans x pharmacies array per field"""
+    plan_index = {name: i for i, name in enumerate(plans)}
+    pharmacy_index = {name: i for i, name in enumerate(pharmacies)}
+    fields = _value_fields(pricing)
+    columns = {field: [[None] * len(pharmacies) for _ in plans] for field in fields}
+    for record in pricing:
+        p = plan_index.get(record['plan_type'])
+        f = pharmacy_index.get(record['pharmacy_type'])
+        if p is None or f is None:
+            continue
+        for field in fields:
+            columns[field][p][f] = record.get(field)
+    return {'plans': list(plans), 'pharmacies': list(pharmacies), **columns}
+
+
+def _columnar_block(block: List[Dict], cells: Dict[Tuple[str, str], int]) -> Dict:
+    fields = _value_fields(r for record in block for r in record['pricing'])
+    encoded = {'drug_name': [], 'zip_code': [], **{field: [] for field in fields}}
+    columns = [encoded[field] for field in fields]
+    for record in block:
+        encoded['drug_name'].append(record['drug_name'])
+        encoded['zip_code'].append(record['zip_code'])
+        rows = [[None] * len(cells) for _ in fields]
+        for r in record['pricing']:
+            i = cells.get((r['plan_type'], r['pharmacy_type']))
+            if i is not None:
+                for row, field in zip(rows, fields):
+                    row[i] = r.get(field)
+        for column, row in zip(columns, rows):
+            column.append(row)
+    return encoded
+
+
+def ndjson_chunks(records: Iterable[Dict], columnar: bool = False, plans: Sequence[str] = (),
+                  pharmacies: Sequence[str] = ()) -> Iterator[bytes]:
+    """Encode bulk pricing records as NDJSON, NDJSON_BLOCK records per chunk
+
+    In the columnar shape the first line names the plans and pharmacies and
+    each following line holds one block as parallel arrays; the summary
+    record is passed through unchanged in either shape.
+    """
+    if columnar:
+        yield dumps({'plans': list(plans), 'pharmacies': list(pharmacies)}) + b'\n'
+    # (plan, pharmacy) -> index in the flattened, plan-major value arrays
+    cells = {(plan, pharmacy): p * len(pharmacies) + f
+             for p, plan in enumerate(plans) for f, pharmacy in enumerate(pharmacies)}
+
+    block = []
+
+    def flush() -> bytes:
+        if columnar:
+            chunk = dumps(_columnar_block(block, cells)) + b'\n'
+        else:
+            chunk = b''.join(dumps(record) + b'\n' for record in block)
+        block.clear()
+        return chunk
+
+    for record in records:
+        if 'summary' in record:
+            if block:
+                yield flush()
+            yield dumps(record) + b'\n'
+            continue
+        block.append(record)
+        if len(block) == NDJSON_BLOCK:
+            yield flush()
+    if block:
+        yield flush()
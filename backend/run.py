@@ -1,12 +1,45 @@
 #!/usr/bin/env python3
 """
 Drug Pricing Transparency Widget - Backend Server
+
+    python run.py            # threaded Flask development server
+    python run.py --async    # ASGI server (uvicorn) with non-blocking OpenFDA calls
+    python run.py --prod     # gunicorn with one worker process per core (gunicorn.conf.py)
 """
 
-from app import app
+import argparse
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drug Pricing Transparency API Server')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--async', dest='use_async', action='store_true')
+    mode.add_argument('--prod', action='store_true')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, help='worker processes for --prod (default: cores)')
+    args = parser.parse_args()
+
     print("Starting Drug Pricing Transparency API Server...")
-    print("API will be available at: http://localhost:5000")
-    print("Health check: http://localhost:5000/api/health")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    print(f"API will be available at: http://localhost:{args.port}")
+    print(f"Health check: http://localhost:{args.port}/api/health")
+    print(f"Readiness: http://localhost:{args.port}/api/ready")
+
+    if args.prod:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                   '--bind', f'{args.host}:{args.port}', 'app:app']
+        if args.workers:
+            command[5:5] = ['--workers', str(args.workers)]
+        os.chdir(BACKEND)
+        os.execv(sys.executable, command)
+    elif args.use_async:
+        import uvicorn
+        uvicorn.run('asgi:app', host=args.host, port=args.port)
+    else:
+        from app import create_app
+        # Initialize in the reloader's serving child, not in the file watcher
+        app = create_app(eager=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+        app.run(debug=True, host=args.host, port=args.port)
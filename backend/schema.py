@@ -0,0 +1,351 @@
+"""
+SQLite schema and migrations for the drug pricing cache
+
+The schema version is tracked with ``PRAGMA user_version``. Each entry in
+MIGRATIONS upgrades the database by exactly one version and runs inside a
+single transaction, so a database is always at a well-defined version.
+"""
+
+import sqlite3
+from itertools import groupby
+from typing import Callable, List, Tuple
+
+from packed_grid import LabelCodes, PackedGrid
+from regions import load_regions
+
+MIGRATION_BATCH = 5000  # grids packed per executemany in the v10 migration
+
+
+def _create_base_tables(conn: sqlite3.Connection):
+    """Version 1: the original cache tables"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drugs (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            generic_name TEXT,
+            brand_name TEXT,
+            ndc TEXT,
+            manufacturer TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pricing_cache (
+            id INTEGER PRIMARY KEY,
+            drug_name TEXT,
+            zip_code TEXT,
+            plan_type TEXT,
+            pharmacy_type TEXT,
+            cost REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _index_pricing_cache(conn: sqlite3.Connection):
+    """Version 2: unique (drug, zip, plan, pharmacy) key and lookup indexes"""
+    # Older databases accumulated one row per plan/pharmacy on every refresh.
+    # Keep only the newest row for each key so the unique index can be built.
+    conn.execute('''
+        DELETE FROM pricing_cache
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM pricing_cache
+            GROUP BY drug_name, zip_code, plan_type, pharmacy_type
+        )
+    ''')
+
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pricing_cache_key
+        ON pricing_cache (drug_name, zip_code, plan_type, pharmacy_type)
+    ''')
+
+    # Serves the per-request lookup, including the created_at freshness filter
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pricing_cache_lookup
+        ON pricing_cache (drug_name, zip_code, created_at)
+    ''')
+
+    # Serves TTL eviction, which deletes by age alone
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pricing_cache_created
+        ON pricing_cache (created_at)
+    ''')
+
+
+def _add_drug_catalog(conn: sqlite3.Connection):
+    """Version 3: mark bulk-ingested label rows and index generic names"""
+    # 'api' rows were cached from live OpenFDA lookups; 'bulk' rows come
+    # from the offline label download loaded by label_ingest.py
+    conn.execute("ALTER TABLE drugs ADD COLUMN source TEXT NOT NULL DEFAULT 'api'")
+
+    # Serves catalog-first generic alternative lookups
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_drugs_generic
+        ON drugs (generic_name COLLATE NOCASE)
+    ''')
+
+
+def _add_alternatives_graph(conn: sqlite3.Connection):
+    """Version 4: persisted generic alternatives graph (see alternatives.py)"""
+    # One row per normalized drug, brand or generic name, naming the group
+    # (normalized generic) and the member product that name resolves to
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drug_alternatives (
+            name_key TEXT PRIMARY KEY,
+            generic_key TEXT NOT NULL,
+            member TEXT NOT NULL,
+            mean_cost REAL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_drug_alternatives_generic
+        ON drug_alternatives (generic_key, member)
+    ''')
+
+    # Serves case-insensitive per-drug cost aggregation for savings estimates
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pricing_cache_name_nocase
+        ON pricing_cache (drug_name COLLATE NOCASE)
+    ''')
+
+
+def _add_pricing_access(conn: sqlite3.Connection):
+    """Version 5: per (drug, ZIP) request counts for cache warm-up (see cache_warmer.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pricing_access (
+            drug_name TEXT NOT NULL,
+            zip_code TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (drug_name, zip_code)
+        )
+    ''')
+
+    # Serves the top-N warm-up query and pruning of stale counts
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pricing_access_last
+        ON pricing_access (last_access)
+    ''')
+
+
+def _add_cache_events(conn: sqlite3.Connection):
+    """Version 6: cross-process cache invalidation log (see invalidation.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            origin INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cache_events_created
+        ON cache_events (created_at)
+    ''')
+
+
+def _add_cache_entries(conn: sqlite3.Connection):
+    """Version 7: JSON cache entries for backend namespaces without their own table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at TIMESTAMP,
+            PRIMARY KEY (namespace, key)
+        )
+    ''')
+
+    # Serves eviction of expired entries
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_expires
+        ON cache_entries (expires_at)
+    ''')
+
+
+def _add_pricing_shares(conn: sqlite3.Connection):
+    """Version 8: store copay and deductible alongside cost"""
+    # Rows cached before this version keep NULLs until they are regenerated
+    conn.execute('ALTER TABLE pricing_cache ADD COLUMN copay REAL')
+    conn.execute('ALTER TABLE pricing_cache ADD COLUMN deductible REAL')
+
+
+def _key_pricing_by_region(conn: sqlite3.Connection):
+    """Version 9: key pricing rows and access counts by pricing region instead of ZIP (see regions.py)"""
+    regions = load_regions()
+    conn.create_function('pricing_region', 1, regions.region, deterministic=True)
+
+    conn.execute('''
+        CREATE TABLE pricing_cache_by_region (
+            id INTEGER PRIMARY KEY,
+            drug_name TEXT,
+            region TEXT,
+            plan_type TEXT,
+            pharmacy_type TEXT,
+            cost REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            copay REAL,
+            deductible REAL
+        )
+    ''')
+
+    # ZIPs of one region collapse into one grid: keep each region's most
+    # recently written ZIP grid whole rather than mixing rows across ZIPs
+    conn.execute('''
+        WITH grids AS (
+            SELECT drug_name, zip_code, pricing_region(zip_code) AS region,
+                   MAX(created_at) AS written
+            FROM pricing_cache GROUP BY drug_name, zip_code
+        ), newest AS (
+            SELECT drug_name, zip_code, region, MAX(written)
+            FROM grids GROUP BY drug_name, region
+        )
+        INSERT INTO pricing_cache_by_region
+        (drug_name, region, plan_type, pharmacy_type, cost, created_at, copay, deductible)
+        SELECT p.drug_name, newest.region, p.plan_type, p.pharmacy_type, p.cost, p.created_at,
+               p.copay, p.deductible
+        FROM newest JOIN pricing_cache p
+        ON p.drug_name = newest.drug_name AND p.zip_code = newest.zip_code
+    ''')
+    conn.execute('DROP TABLE pricing_cache')
+    conn.execute('ALTER TABLE pricing_cache_by_region RENAME TO pricing_cache')
+
+    conn.execute('''
+        CREATE UNIQUE INDEX idx_pricing_cache_key
+        ON pricing_cache (drug_name, region, plan_type, pharmacy_type)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_pricing_cache_lookup
+        ON pricing_cache (drug_name, region, created_at)
+    ''')
+    conn.execute('CREATE INDEX idx_pricing_cache_created ON pricing_cache (created_at)')
+    conn.execute('CREATE INDEX idx_pricing_cache_name_nocase ON pricing_cache (drug_name COLLATE NOCASE)')
+
+    # Request counts of a region's ZIPs add up
+    conn.execute('''
+        CREATE TABLE pricing_access_by_region (
+            drug_name TEXT NOT NULL,
+            region TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (drug_name, region)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO pricing_access_by_region (drug_name, region, hits, last_access)
+        SELECT drug_name, pricing_region(zip_code), SUM(hits), MAX(last_access)
+        FROM pricing_access GROUP BY drug_name, pricing_region(zip_code)
+    ''')
+    conn.execute('DROP TABLE pricing_access')
+    conn.execute('ALTER TABLE pricing_access_by_region RENAME TO pricing_access')
+    conn.execute('CREATE INDEX idx_pricing_access_last ON pricing_access (last_access)')
+
+    # Pending invalidations name per-ZIP keys that no longer exist
+    conn.execute("DELETE FROM cache_events WHERE kind = 'pricing'")
+
+
+def _pack_pricing_grids(conn: sqlite3.Connection):
+    """Version 10: one row per (drug, region) pricing grid, packed into a blob (see packed_grid.py)"""
+    # Plan and pharmacy names, interned as one-byte codes inside the blobs
+    conn.execute('''
+        CREATE TABLE pricing_labels (
+            code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+    def assign(name: str) -> int:
+        conn.execute('INSERT OR IGNORE INTO pricing_labels (name) VALUES (?)', (name,))
+        return conn.execute('SELECT code FROM pricing_labels WHERE name = ?', (name,)).fetchone()[0]
+
+    # cells and mean_cost let mean_costs() aggregate without decoding blobs
+    conn.execute('''
+        CREATE TABLE pricing_grids (
+            drug_name TEXT NOT NULL,
+            region TEXT NOT NULL,
+            grid BLOB NOT NULL,
+            cells INTEGER NOT NULL,
+            mean_cost REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (drug_name, region)
+        ) WITHOUT ROWID
+    ''')
+
+    labels = LabelCodes(assign)
+    rows = conn.execute('''
+        SELECT drug_name, region, plan_type, pharmacy_type, cost, copay, deductible, created_at
+        FROM pricing_cache ORDER BY drug_name, region, id
+    ''')
+    batch = []
+    for (drug_name, region), cells in groupby(rows, key=lambda row: row[:2]):
+        cells = list(cells)
+        grid = PackedGrid.from_records([
+            {'plan_type': plan_type, 'pharmacy_type': pharmacy_type, 'cost': cost,
+             'copay': copay, 'deductible': deductible}
+            for _, _, plan_type, pharmacy_type, cost, copay, deductible, _ in cells], labels)
+        # A grid expires with its oldest row
+        batch.append((drug_name, region, grid.blob, len(grid), grid.mean_cost(),
+                      min(row[-1] for row in cells)))
+        if len(batch) >= MIGRATION_BATCH:
+            conn.executemany('INSERT INTO pricing_grids VALUES (?, ?, ?, ?, ?, ?)', batch)
+            batch.clear()
+    conn.executemany('INSERT INTO pricing_grids VALUES (?, ?, ?, ?, ?, ?)', batch)
+
+    conn.execute('DROP TABLE pricing_cache')
+    conn.execute('ALTER TABLE pricing_grids RENAME TO pricing_cache')
+
+    # Serves TTL eviction, which deletes by age alone
+    conn.execute('CREATE INDEX idx_pricing_cache_created ON pricing_cache (created_at)')
+    # Serves case-insensitive per-drug cost aggregation for savings estimates
+    conn.execute('CREATE INDEX idx_pricing_cache_name_nocase ON pricing_cache (drug_name COLLATE NOCASE)')
+
+
+# (version, description, upgrade function)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'create base cache tables', _create_base_tables),
+    (2, 'index pricing_cache', _index_pricing_cache),
+    (3, 'add bulk drug catalog columns', _add_drug_catalog),
+    (4, 'add generic alternatives graph', _add_alternatives_graph),
+    (5, 'add pricing access counts', _add_pricing_access),
+    (6, 'add cache invalidation log', _add_cache_events),
+    (7, 'add cache entries', _add_cache_entries),
+    (8, 'add pricing copay and deductible', _add_pricing_shares),
+    (9, 'key pricing by region', _key_pricing_by_region),
+    (10, 'pack pricing grids', _pack_pricing_grids),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply any pending migrations and return the resulting version"""
+    current = get_schema_version(conn)
+
+    for version, _, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+        # BEGIN IMMEDIATE takes the write lock up front so two processes
+        # starting at once cannot both run the same migration.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            upgrade(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+
+    return current
@@ -25,6 +25,20 @@ def test_health_check():
         print(f"❌ Health check failed: {e}")
         return False
 
+def test_readiness():
+    """Test the readiness endpoint"""
+    print("\nTesting readiness...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/ready")
+        if response.status_code == 200:
+            print("✅ Readiness check passed")
+        elif response.status_code == 503:
+            print(f"⚠️  Service not ready yet: {response.json().get('status')}")
+        else:
+            print(f"❌ Readiness check failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Readiness check failed: {e}")
+
 def test_drug_search():
     """Test drug search functionality"""
     print("\nTesting drug search...")
@@ -46,6 +60,23 @@ def test_drug_search():
         except Exception as e:
             print(f"❌ Drug search for '{drug}' failed: {e}")
 
+def test_suggestions():
+    """Test drug name suggestions"""
+    print("\nTesting drug suggestions...")
+    for query in ["Lipi", "Metfromin"]:
+        try:
+            response = requests.post(f"{API_BASE_URL}/suggest-drugs", 
+                                   json={"query": query, "limit": 5})
+            if response.status_code == 200:
+                data = response.json()
+                names = [s['name'] for s in data.get('suggestions', [])]
+                print(f"✅ Suggestions for '{query}' passed")
+                print(f"   Found: {names}")
+            else:
+                print(f"❌ Suggestions for '{query}' failed: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Suggestions for '{query}' failed: {e}")
+
 def test_pricing():
     """Test pricing functionality"""
     print("\nTesting pricing...")
@@ -91,6 +122,64 @@ def test_alternatives():
         except Exception as e:
             print(f"❌ Alternatives for '{drug}' failed: {e}")
 
+def test_drug_report():
+    """Test the combined drug report endpoint"""
+    print("\nTesting drug report...")
+    test_case = {"drug_name": "Lipitor", "zip_code": "10001"}
+    
+    try:
+        response = requests.post(f"{API_BASE_URL}/drug-report", json=test_case)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("drug") and data.get("pricing"):
+                print(f"✅ Drug report for '{test_case['drug_name']}' passed")
+                print(f"   Found {len(data['pricing'])} pricing options, "
+                      f"{len(data.get('alternatives') or [])} alternatives")
+                if data.get("partial"):
+                    print(f"   ⚠️  Partial result: {data['errors']}")
+            else:
+                print(f"⚠️  Drug report returned error: {data.get('error')}")
+        else:
+            print(f"❌ Drug report failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Drug report failed: {e}")
+
+def test_bulk_pricing():
+    """Test the streaming bulk pricing endpoint"""
+    print("\nTesting bulk pricing...")
+    payload = {"drug_names": ["Lipitor", "Metformin"], "zip_codes": ["10001", "90210"]}
+    
+    try:
+        response = requests.post(f"{API_BASE_URL}/bulk-pricing", json=payload, stream=True)
+        if response.status_code == 200:
+            records = [json.loads(line) for line in response.iter_lines() if line]
+            rows = [r for r in records if "pricing" in r]
+            print("✅ Bulk pricing passed")
+            print(f"   Received {len(rows)} drug x ZIP results, summary: {records[-1].get('summary')}")
+        else:
+            print(f"❌ Bulk pricing failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Bulk pricing failed: {e}")
+
+def test_metrics():
+    """Test the Prometheus metrics endpoint"""
+    print("\nTesting metrics...")
+    
+    try:
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        if response.status_code == 200:
+            stages = {line.split('stage="')[1].split('"')[0]
+                      for line in response.text.splitlines()
+                      if line.startswith("drug_pricing_stage_seconds_count")}
+            print("✅ Metrics passed")
+            print(f"   Stages timed: {', '.join(sorted(stages))}")
+        elif response.status_code == 404:
+            print("⚠️  Metrics are disabled (METRICS_ENABLED=false)")
+        else:
+            print(f"❌ Metrics failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Metrics failed: {e}")
+
 def main():
     """Run all tests"""
     print("🧪 Drug Pricing Transparency API Tests")
@@ -103,9 +192,14 @@ def main():
         sys.exit(1)
     
     # Run other tests
+    test_readiness()
     test_drug_search()
+    test_suggestions()
     test_pricing()
     test_alternatives()
+    test_drug_report()
+    test_bulk_pricing()
+    test_metrics()
     
     print("\n" + "=" * 50)
     print("✅ All tests completed!")
@@ -0,0 +1,50 @@
+"""
+Unit tests for the upstream scheduler in rate_limit.py
+
+Run with ``python -m pytest backend/test_rate_limit.py`` (pytest is in
+requirements-dev.txt).
+"""
+
+import pytest
+
+from rate_limit import BATCH, INTERACTIVE, UpstreamSaturated, UpstreamScheduler
+
+
+class FakeClock:
+    """A monotonic clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_batch_admitted_with_burst_of_one():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler(rate=1, burst=1, batch_timeout=0.0, clock=clock)
+
+    scheduler.acquire(BATCH)
+    # The bucket is empty: the next batch call is refused with the wait for
+    # one token, not an infinite one
+    with pytest.raises(UpstreamSaturated) as refused:
+        scheduler.acquire(BATCH)
+    assert refused.value.retry_after == pytest.approx(1.0)
+
+    clock.now += 1.0
+    scheduler.acquire(BATCH)
+    stats = scheduler.stats()
+    assert (stats['admitted'], stats['rejected']) == (2, 1)
+
+
+def test_batch_leaves_reserve_for_interactive():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler(rate=1, burst=4, batch_timeout=0.0, clock=clock)
+
+    scheduler.acquire(BATCH)
+    scheduler.acquire(BATCH)
+    with pytest.raises(UpstreamSaturated):
+        scheduler.acquire(BATCH)
+    scheduler.acquire(INTERACTIVE)
+    scheduler.acquire(INTERACTIVE)
+    assert scheduler.stats()['admitted'] == 4
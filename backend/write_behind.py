@@ -0,0 +1,190 @@
+"""
+Write-behind cache writes for the Drug Pricing Transparency API
+
+A cache miss used to store its result before responding: one SQLite
+transaction (and, with a shared backend, a network round trip) per miss,
+with concurrent misses queueing on the database write lock. Instead the
+request path hands its writes to a WriteBehindQueue and returns; a single
+writer thread drains the queue and applies everything that arrived within
+``interval`` seconds (at most ``batch_size`` items) in one batch.
+
+* Backpressure: when the queue is full, submit() blocks for up to
+  ``put_timeout`` seconds and then applies the write in the caller's
+  thread, so a slow disk slows requests down instead of losing writes.
+* Failed batches are retried ``max_retries`` times before their items are
+  counted as failed (they are only cache entries: a later miss rewrites
+  them).
+* flush() waits until everything submitted so far is written; stop()
+  flushes and ends the writer, and runs at interpreter exit.
+* While the writer is not running (before start(), after stop(), or when
+  disabled) writes are applied synchronously.
+
+Writes of one process become visible to others when their batch commits,
+at most ``interval`` seconds (plus the write itself) after submission.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# Write: (kind, payload); the apply function groups a batch by kind
+Write = Tuple[str, Any]
+
+
+class WriteBehindQueue:
+    """Bounded queue of writes applied in batches by one writer thread"""
+
+    def __init__(self, apply: Callable[[List[Write]], None], maxsize: int = 10000,
+                 batch_size: int = 500, interval: float = 0.05, put_timeout: float = 1.0,
+                 max_retries: int = 3, enabled: bool = True):
+        self.apply = apply
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.enabled = enabled
+
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.inline = 0
+        self.retries = 0
+        self.failed = 0
+        self.max_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # -- request path -------------------------------------------------------
+
+    def submit(self, kind: str, payload: Any):
+        """Queue a write, or apply it now if the writer is not running or stays full"""
+        with self._lock:
+            self.submitted += 1
+        if self.running:
+            try:
+                self._queue.put((kind, payload), timeout=self.put_timeout)
+                return
+            except queue.Full:
+                pass
+        with self._lock:
+            self.inline += 1
+        self._apply([(kind, payload)])
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until every write submitted so far has been applied; False on timeout"""
+        if not self.running:
+            self._drain()
+            return True
+        deadline = time.monotonic() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                done.wait(remaining)
+        return True
+
+    # -- writer -------------------------------------------------------------
+
+    def start(self):
+        """Start the writer thread (again, e.g. in a forked child)"""
+        if not self.enabled or self.running:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='cache-writer', daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def stop(self, timeout: float = 30.0) -> bool:
+        """Flush pending writes and stop the writer; False if the flush timed out"""
+        if not self.running:
+            self._drain()
+            return True
+        flushed = self.flush(timeout)
+        self._stopped = True
+        self._thread.join(timeout)
+        self._thread = None
+        return flushed
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # Gather whatever else arrives within the batching window
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _drain(self):
+        """Apply anything left queued by a writer that is no longer running"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            try:
+                self._apply(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _apply(self, batch: List[Write]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.apply(batch)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.failed += len(batch)
+                    return
+                with self._lock:
+                    self.retries += 1
+                time.sleep(0.05 * 2 ** attempt)
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'running': self.running,
+                'pending': self._queue.unfinished_tasks,
+                'submitted': self.submitted,
+                'written': self.written,
+                'batches': self.batches,
+                'max_batch': self.max_batch,
+                'inline': self.inline,
+                'retries': self.retries,
+                'failed': self.failed,
+            }
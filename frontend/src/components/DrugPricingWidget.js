@@ -26,30 +26,25 @@ const DrugPricingWidget = () => {
     setSearchData(formData);
 
     try {
-      // Search for drug information
-      const drugResponse = await axios.post(`${API_BASE_URL}/search-drug`, {
-        drug_name: formData.drugName
+      // Drug information, pricing and alternatives are fetched concurrently
+      // on the server and returned together. A GET lets the browser reuse
+      // and revalidate (ETag) the response for repeat searches.
+      const reportResponse = await axios.get(`${API_BASE_URL}/drug-report`, {
+        params: {
+          drug_name: formData.drugName,
+          zip_code: formData.zipCode
+        }
       });
 
-      if (drugResponse.data.error) {
-        throw new Error(drugResponse.data.error);
+      const report = reportResponse.data;
+      if (report.error) {
+        throw new Error(report.error);
       }
 
-      // Get pricing information
-      const pricingResponse = await axios.post(`${API_BASE_URL}/get-pricing`, {
-        drug_name: formData.drugName,
-        zip_code: formData.zipCode
-      });
-
-      // Get generic alternatives
-      const alternativesResponse = await axios.post(`${API_BASE_URL}/get-alternatives`, {
-        drug_name: formData.drugName
-      });
-
       setResults({
-        drugInfo: drugResponse.data,
-        pricing: pricingResponse.data,
-        alternatives: alternativesResponse.data,
+        drugInfo: report.drug,
+        pricing: report.pricing ? { pricing: report.pricing } : null,
+        alternatives: report.alternatives ? { alternatives: report.alternatives } : null,
         loading: false,
         error: null
       });
@@ -48,10 +48,12 @@ const GenericAlternatives = ({ alternatives }) => {
                 </div>
                 
                 <div className="flex items-center space-x-4 text-sm text-gray-600">
-                  <div className="flex items-center space-x-1">
-                    <TrendingDown className="w-4 h-4 text-success-600" />
-                    <span>Estimated {alternative.estimated_savings}% savings</span>
-                  </div>
+                  {alternative.estimated_savings != null && (
+                    <div className="flex items-center space-x-1">
+                      <TrendingDown className="w-4 h-4 text-success-600" />
+                      <span>Estimated {alternative.estimated_savings}% savings</span>
+                    </div>
+                  )}
                   
                   <div className="flex items-center space-x-1">
                     <Package className="w-4 h-4 text-gray-400" />
@@ -60,12 +62,14 @@ const GenericAlternatives = ({ alternatives }) => {
                 </div>
               </div>
               
-              <div className="text-right">
-                <div className="text-lg font-bold text-success-600">
-                  Save {alternative.estimated_savings}%
+              {alternative.estimated_savings != null && (
+                <div className="text-right">
+                  <div className="text-lg font-bold text-success-600">
+                    Save {alternative.estimated_savings}%
+                  </div>
+                  <div className="text-sm text-gray-500">Potential savings</div>
                 </div>
-                <div className="text-sm text-gray-500">Potential savings</div>
-              </div>
+              )}
             </div>
             
             {/* Action Button */}